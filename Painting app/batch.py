@@ -0,0 +1,166 @@
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image
+
+import paint_ops
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".gif", ".bmp", ".webp", ".tif", ".tiff")
+DEFAULT_BACKGROUND = "#25253a"  # The app's default canvas color
+JOBS_PER_WORKER = 4  # Jobs submitted ahead of each worker; the rest of the list waits its turn
+OPERATIONS = {
+    "rotate": "rotate:ANGLE            rotate counter-clockwise, scaled to fit the canvas (like Image > Rotate)",
+    "flip": "flip:horizontal|vertical  mirror the image (like Image > Flip)",
+    "resize": "resize:WIDTHxHEIGHT      resample to a new size (like Settings > Canvas Size)",
+    "background": "background:COLOR         canvas color under transparent pixels (like Settings > Canvas Color)",
+    "fill": "fill:X,Y,COLOR           bucket-fill the region at pixel X,Y (like the Fill tool)",
+}
+
+
+def parse_operation(spec):
+    """'resize:800x600' -> ('resize', (800, 600)). Raises ValueError on a malformed spec."""
+    name, _, arg = spec.partition(":")
+    if name == "rotate":
+        return name, (float(arg),)
+    if name == "flip":
+        if arg not in ("horizontal", "vertical"):
+            raise ValueError(f"flip expects horizontal or vertical, got {arg!r}")
+        return name, (arg,)
+    if name == "resize":
+        width, height = (int(v) for v in arg.lower().split("x"))
+        if width <= 0 or height <= 0:
+            raise ValueError("resize dimensions must be positive")
+        return name, (width, height)
+    if name == "background":
+        paint_ops.parse_color(arg)
+        return name, (arg,)
+    if name == "fill":
+        x, y, color = arg.split(",", 2)
+        paint_ops.parse_color(color)
+        return name, (int(x), int(y), color)
+    raise ValueError(f"Unknown operation {name!r}; expected one of {', '.join(OPERATIONS)}")
+
+
+def apply_operations(image, operations, background=DEFAULT_BACKGROUND):
+    """Runs the operations on an RGBA layer, as the app does, and returns it flattened onto the canvas color.
+
+    Corners exposed by a rotation stay transparent until then, so they end up
+    in the canvas color just like on screen and in a file saved from the app.
+    """
+    layer = image.convert("RGBA")
+    for name, args in operations:
+        if name == "rotate":
+            # The app keeps its canvas size, so the expanded rotation is scaled back into it
+            layer = paint_ops.resize_image(paint_ops.rotate_image(layer, *args), *layer.size)
+        elif name == "flip":
+            layer = paint_ops.flip_image(layer, *args)
+        elif name == "resize":
+            layer = paint_ops.resize_image(layer, *args)
+        elif name == "background":
+            background = args[0]
+        elif name == "fill":
+            # Like the Fill tool: the region is found on the flattened canvas and painted into the layer
+            x, y, color = args
+            flat = paint_ops.apply_background(layer, background)
+            if 0 <= x < flat.width and 0 <= y < flat.height and flat.getpixel((x, y)) != paint_ops.parse_color(color):
+                box, mask = paint_ops.region_mask(flat, x, y)
+                layer.paste(paint_ops.parse_color(color) + (255,), box, mask)
+    return paint_ops.apply_background(layer, background)
+
+
+def canvas_background():
+    """The canvas color the app last saved to paint_settings.json, or its default."""
+    try:
+        with open("paint_settings.json", "r") as f:
+            return json.load(f).get("canvas_bg", DEFAULT_BACKGROUND)
+    except (OSError, ValueError):
+        return DEFAULT_BACKGROUND
+
+
+def collect_inputs(patterns):
+    """Expands directories (their image files) and glob patterns into a sorted, de-duplicated path list."""
+    paths = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            candidates = (os.path.join(pattern, name) for name in os.listdir(pattern))
+        else:
+            candidates = glob.glob(pattern, recursive=True)
+        paths.update(p for p in candidates if os.path.isfile(p) and p.lower().endswith(IMAGE_EXTENSIONS))
+    return sorted(paths)
+
+
+def process_file(job):
+    """Worker entry point: load, transform and save one file. Returns (path, pixels, error)."""
+    path, operations, background, out_dir, out_format = job
+    try:
+        with Image.open(path) as source:
+            source.load()
+            image = apply_operations(source, operations, background)
+        root, extension = os.path.splitext(os.path.basename(path))
+        extension = f".{out_format}" if out_format else extension
+        image.save(os.path.join(out_dir, root + extension))
+        return path, image.width * image.height, None
+    except Exception as e:
+        return path, 0, str(e)
+
+
+def run_jobs(pool, jobs, window):
+    """Yields process_file results in input order, with at most window jobs submitted at a time."""
+    pending = deque()
+    for job in jobs:
+        pending.append(pool.submit(process_file, job))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Apply paint operations to many images without opening a window.",
+        epilog="operations:\n  " + "\n  ".join(OPERATIONS.values()),
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="+", help="image files, directories or glob patterns")
+    parser.add_argument("--op", action="append", default=[], dest="operations", metavar="OPERATION",
+                        help="operation to apply; repeat to apply several in order")
+    parser.add_argument("-o", "--out", required=True, help="output directory")
+    parser.add_argument("--format", help="output file extension (default: keep the input's)")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    args = parser.parse_args(argv)
+
+    try:
+        operations = [parse_operation(spec) for spec in args.operations]
+    except ValueError as e:
+        parser.error(str(e))
+    paths = collect_inputs(args.inputs)
+    if not paths:
+        parser.error("no input images found")
+    os.makedirs(args.out, exist_ok=True)
+    out_format = args.format.lstrip(".").lower() if args.format else None
+
+    start = time.perf_counter()
+    done = failed = pixels = 0
+    background = canvas_background()
+    jobs = ((path, operations, background, args.out, out_format) for path in paths)
+    window = JOBS_PER_WORKER * (args.workers or os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        for path, count, error in run_jobs(pool, jobs, window):
+            done += 1
+            pixels += count
+            if error:
+                failed += 1
+                print(f"FAILED {path}: {error}", file=sys.stderr)
+    elapsed = time.perf_counter() - start
+    print(f"{done - failed}/{done} images processed in {elapsed:.2f}s "
+          f"({done / elapsed:.1f} images/s, {pixels / elapsed / 1e6:.1f} MP/s), {failed} failed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
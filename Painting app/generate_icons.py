@@ -2,8 +2,15 @@ import pygame
 import os
 import asyncio
 import platform
-from pygame import Surface, draw, transform, font, gfxdraw # Import gfxdraw for antialiasing
+from pygame import Surface, draw, transform, font, gfxdraw, surfarray # Import gfxdraw for antialiasing
 import math
+import sys
+import time
+import json
+import hashlib
+import inspect
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 
 # Initialize Pygame
 pygame.init()
@@ -11,7 +18,11 @@ pygame.init()
 # Constants
 ICON_SIZE = 64 # Increased size for better detail
 BUTTON_ICON_SIZE = 32 # Size for buttons in the Tkinter app
-ICONS_DIR = "icons"
+ICONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "icons")
+CACHE_FILE = os.path.join(ICONS_DIR, ".icon_cache.json") # Content hashes of the last generated icons
+ATLAS_IMAGE = os.path.join(ICONS_DIR, "atlas.png") # All icons packed into one image for fast loading
+ATLAS_INDEX = os.path.join(ICONS_DIR, "atlas.json") # Name -> [x, y, width, height] inside the atlas
+ATLAS_MAX_WIDTH = 256
 
 # --- Enhanced Color Palette for Realism and 3D Effect ---
 COLORS = {
@@ -54,23 +65,23 @@ def draw_linear_gradient(surface, rect, start_color, end_color, orientation='ver
         return
     
     temp_surf = Surface((rect.width, rect.height), pygame.SRCALPHA)
-    start_rgb = pygame.Color(*start_color[:3])
-    end_rgb = pygame.Color(*end_color[:3])
+    start_rgb = np.array(start_color[:3], dtype=np.float64)
+    end_rgb = np.array(end_color[:3], dtype=np.float64)
     
+    # One colour per row (or column), interpolated in a single vectorized step
+    steps = rect.height if orientation == 'vertical' else rect.width
+    t = (np.arange(steps, dtype=np.float64) / steps)[:, None]
+    ramp = (start_rgb * (1 - t) + end_rgb * t).astype(np.uint8)
+    
+    rgb = surfarray.pixels3d(temp_surf)
+    alpha = surfarray.pixels_alpha(temp_surf)
     if orientation == 'vertical':
-        for y in range(rect.height):
-            t = y / rect.height
-            r = int(start_rgb.r * (1 - t) + end_rgb.r * t)
-            g = int(start_rgb.g * (1 - t) + end_rgb.g * t)
-            b = int(start_rgb.b * (1 - t) + end_rgb.b * t)
-            draw.line(temp_surf, (r, g, b), (0, y), (rect.width, y))
+        rgb[:, :, :] = ramp[None, :, :]
+        alpha[:, :] = 255
     elif orientation == 'horizontal':
-        for x in range(rect.width):
-            t = x / rect.width
-            r = int(start_rgb.r * (1 - t) + end_rgb.r * t)
-            g = int(start_rgb.g * (1 - t) + end_rgb.g * t)
-            b = int(start_color[2] * (1 - t) + end_rgb.b * t)
-            draw.line(temp_surf, (r, g, b), (x, 0), (x, rect.height))
+        rgb[:, :, :] = ramp[:, None, :]
+        alpha[:, :] = 255
+    del rgb, alpha # Release the surface lock before blitting
             
     surface.blit(temp_surf, rect.topleft)
 
@@ -80,24 +91,34 @@ def draw_radial_gradient(surface, center, radius, start_color, end_color):
         return
     
     temp_surf = Surface((radius * 2, radius * 2), pygame.SRCALPHA)
-    temp_rect = temp_surf.get_rect(center=(radius, radius))
+    width, height = temp_surf.get_size()
     
-    start_rgb = pygame.Color(*start_color[:3])
-    end_rgb = pygame.Color(*end_color[:3])
+    start_rgb = np.array(start_color[:3], dtype=np.float64)
+    end_rgb = np.array(end_color[:3], dtype=np.float64)
+
+    # Distance of every pixel from the centre, computed for the whole surface at once
+    xs = np.arange(width, dtype=np.float64)[:, None]
+    ys = np.arange(height, dtype=np.float64)[None, :]
+    dist = np.sqrt((xs - radius)**2 + (ys - radius)**2)
+    inside = dist <= radius
+    t = (dist / radius)[:, :, None]
+    colors = (start_rgb * (1 - t) + end_rgb * t).astype(np.uint8)
 
-    for x in range(temp_rect.width):
-        for y in range(temp_rect.height):
-            dist = math.sqrt((x - radius)**2 + (y - radius)**2)
-            if dist <= radius:
-                t = dist / radius
-                r = int(start_rgb.r * (1 - t) + end_rgb.r * t)
-                g = int(start_rgb.g * (1 - t) + end_rgb.g * t)
-                b = int(start_rgb.b * (1 - t) + end_rgb.b * t)
-                temp_surf.set_at((x, y), (r, g, b))
+    rgb = surfarray.pixels3d(temp_surf)
+    alpha = surfarray.pixels_alpha(temp_surf)
+    rgb[inside] = colors[inside]
+    alpha[inside] = 255
+    del rgb, alpha # Release the surface lock before blitting
     
     surface.blit(temp_surf, (center[0] - radius, center[1] - radius))
 
 
+def _box_blur_axis(channels, axis):
+    """Applies a 3-tap [1, 2, 1] blur along one axis, clamping at the edges."""
+    before = np.concatenate((channels.take([0], axis=axis), channels.take(range(channels.shape[axis] - 1), axis=axis)), axis=axis)
+    after = np.concatenate((channels.take(range(1, channels.shape[axis]), axis=axis), channels.take([-1], axis=axis)), axis=axis)
+    return (before + 2 * channels + after) / 4
+
 def draw_shadow_effect(surface, shape_surface, offset=(3, 3), blur_radius=5, shadow_color=COLORS["shadow_medium"]):
     """
     Draws a realistic drop shadow for a given shape.
@@ -113,10 +134,16 @@ def draw_shadow_effect(surface, shape_surface, offset=(3, 3), blur_radius=5, sha
     # Use the shape's alpha channel as a mask for the shadow
     shadow_surf.blit(shape_surface, (0, 0), None, pygame.BLEND_RGBA_MULT)
 
-    # Blur the shadow surface (simple box blur for Pygame)
+    # Blur the shadow in place with separable NumPy passes (one pass per unit of radius)
+    rgb = surfarray.pixels3d(shadow_surf)
+    alpha = surfarray.pixels_alpha(shadow_surf)
+    channels = np.dstack((rgb, alpha)).astype(np.float64)
     for _ in range(blur_radius):
-        shadow_surf = transform.smoothscale(shadow_surf, (shadow_surf.get_width() // 2, shadow_surf.get_height() // 2))
-        shadow_surf = transform.smoothscale(shadow_surf, (shape_surface.get_width(), shape_surface.get_height()))
+        channels = _box_blur_axis(_box_blur_axis(channels, 0), 1)
+    blurred = np.rint(channels).astype(np.uint8)
+    rgb[:, :, :] = blurred[:, :, :3]
+    alpha[:, :] = blurred[:, :, 3]
+    del rgb, alpha # Release the surface lock before blitting
 
     # Blit the blurred shadow onto the main surface with offset
     surface.blit(shadow_surf, (offset[0], offset[1]))
@@ -821,37 +848,134 @@ def save_icon(surface, name, target_size=None):
     except Exception as e:
         print(f"Error saving {name}.png: {e}")
 
-async def main():
-    icon_functions = {
-        "app_icon": create_app_icon,
-        "color_icon": create_color_icon,
-        "brush_icon": create_brush_icon,
-        "eraser_icon": create_eraser_icon,
-        "fill_icon": create_fill_bucket_icon, # Renamed from fill_bucket
-        "text_icon": create_text_icon,
-        "pipette_icon": create_pipette_icon, # Renamed from color_picker
-        "zoom_icon": create_zoom_icon, # Renamed from magnifier
-        "line_shape_icon": create_line_shape_icon, # Renamed from line
-        "rectangle_shape_icon": create_rectangle_shape_icon, # Renamed from rectangle
-        "circle_shape_icon": create_circle_shape_icon, # Renamed from circle
-        "triangle_shape_icon": create_triangle_shape_icon,
-        "star_shape_icon": create_star_shape_icon,
-        "selection_icon": create_selection_icon,
-        "image_icon": create_image_icon,
-        "layers_icon": create_layers_icon,
-        "save_icon": create_save_icon, # Added save icon
-        "clear_icon": create_clear_icon, # Added clear icon
-    }
-    
-    for name, func in icon_functions.items():
-        icon_surface = func()
-        # Resize button icons to BUTTON_ICON_SIZE, app_icon to ICON_SIZE
-        target_size = ICON_SIZE if name == "app_icon" else BUTTON_ICON_SIZE
-        save_icon(icon_surface, name, (target_size, target_size))
-        await asyncio.sleep(0.01) # Minimal delay for async compatibility
+ICON_FUNCTIONS = {
+    "app_icon": create_app_icon,
+    "color_icon": create_color_icon,
+    "brush_icon": create_brush_icon,
+    "eraser_icon": create_eraser_icon,
+    "fill_icon": create_fill_bucket_icon, # Renamed from fill_bucket
+    "text_icon": create_text_icon,
+    "pipette_icon": create_pipette_icon, # Renamed from color_picker
+    "zoom_icon": create_zoom_icon, # Renamed from magnifier
+    "line_shape_icon": create_line_shape_icon, # Renamed from line
+    "rectangle_shape_icon": create_rectangle_shape_icon, # Renamed from rectangle
+    "circle_shape_icon": create_circle_shape_icon, # Renamed from circle
+    "triangle_shape_icon": create_triangle_shape_icon,
+    "star_shape_icon": create_star_shape_icon,
+    "selection_icon": create_selection_icon,
+    "image_icon": create_image_icon,
+    "layers_icon": create_layers_icon,
+    "save_icon": create_save_icon, # Added save icon
+    "clear_icon": create_clear_icon, # Added clear icon
+}
+
+# Helpers shared by every icon; editing any of them invalidates the whole cache
+SHARED_HELPERS = [draw_linear_gradient, draw_radial_gradient, _box_blur_axis, draw_shadow_effect,
+                  draw_rounded_rect_pygame, get_font, save_icon]
+
+def icon_target_size(name):
+    """Button icons are saved at BUTTON_ICON_SIZE, the app icon at ICON_SIZE."""
+    size = ICON_SIZE if name == "app_icon" else BUTTON_ICON_SIZE
+    return (size, size)
+
+def icon_digest(name, shared_digest):
+    """Content hash of everything that influences one icon's pixels."""
+    hasher = hashlib.sha256(shared_digest.encode())
+    hasher.update(inspect.getsource(ICON_FUNCTIONS[name]).encode())
+    hasher.update(repr(icon_target_size(name)).encode())
+    return hasher.hexdigest()
+
+def shared_digest():
+    hasher = hashlib.sha256()
+    for helper in SHARED_HELPERS:
+        hasher.update(inspect.getsource(helper).encode())
+    hasher.update(repr(sorted(COLORS.items())).encode())
+    hasher.update(repr((ICON_SIZE, BUTTON_ICON_SIZE, pygame.version.ver, np.__version__)).encode())
+    return hasher.hexdigest()
+
+def load_cache():
+    try:
+        with open(CACHE_FILE, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_cache(cache):
+    try:
+        with open(CACHE_FILE, "w") as f:
+            json.dump(cache, f, indent=4, sort_keys=True)
+    except OSError as e:
+        print(f"Error saving icon cache: {e}")
+
+def render_icon(name):
+    """Draws and saves a single icon. Runs in a worker process, so it only takes the icon name."""
+    save_icon(ICON_FUNCTIONS[name](), name, icon_target_size(name))
+    return name
+
+def pack_atlas(sizes, max_width=ATLAS_MAX_WIDTH):
+    """Shelf-packs icon sizes into rows. Returns ({name: (x, y, w, h)}, (atlas_w, atlas_h))."""
+    boxes = {}
+    x = y = shelf_height = atlas_width = 0
+    for name, (w, h) in sorted(sizes.items(), key=lambda item: (-item[1][1], item[0])):
+        if x and x + w > max_width:
+            x, y = 0, y + shelf_height
+            shelf_height = 0
+        boxes[name] = (x, y, w, h)
+        x += w
+        shelf_height = max(shelf_height, h)
+        atlas_width = max(atlas_width, x)
+    return boxes, (atlas_width, y + shelf_height)
+
+def build_atlas():
+    """Packs every generated icon, at its final size, into ATLAS_IMAGE plus the ATLAS_INDEX offsets."""
+    surfaces = {}
+    for name in ICON_FUNCTIONS:
+        try:
+            surfaces[name] = pygame.image.load(os.path.join(ICONS_DIR, f"{name}.png"))
+        except Exception as e:
+            print(f"Error adding {name}.png to the atlas: {e}")
+    boxes, atlas_size = pack_atlas({name: surf.get_size() for name, surf in surfaces.items()})
+    atlas = Surface(atlas_size, pygame.SRCALPHA)
+    for name, (x, y, w, h) in boxes.items():
+        atlas.blit(surfaces[name], (x, y))
+    try:
+        pygame.image.save(atlas, ATLAS_IMAGE)
+        with open(ATLAS_INDEX, "w") as f:
+            json.dump({"size": list(atlas_size), "icons": {name: list(box) for name, box in boxes.items()}}, f, indent=4, sort_keys=True)
+        print(f"Generated {ATLAS_IMAGE} ({len(boxes)} icons, {atlas_size[0]}x{atlas_size[1]})")
+    except Exception as e:
+        print(f"Error saving icon atlas: {e}")
+
+async def main(force=False):
+    start_time = time.perf_counter()
+    shared = shared_digest()
+    cache = {} if force else load_cache()
+    digests = {name: icon_digest(name, shared) for name in ICON_FUNCTIONS}
+    stale = [name for name, digest in digests.items()
+             if cache.get(name) != digest or not os.path.exists(os.path.join(ICONS_DIR, f"{name}.png"))]
+    for name in ICON_FUNCTIONS:
+        if name not in stale:
+            print(f"Up to date {os.path.join(ICONS_DIR, f'{name}.png')}")
+
+    if len(stale) <= 1 or platform.system() == "Emscripten":
+        # Spinning up worker processes costs more than drawing a single icon
+        for name in stale:
+            render_icon(name)
+            await asyncio.sleep(0.01) # Minimal delay for async compatibility
+    else:
+        loop = asyncio.get_running_loop()
+        with ProcessPoolExecutor(max_workers=min(len(stale), os.cpu_count() or 1)) as pool:
+            await asyncio.gather(*(loop.run_in_executor(pool, render_icon, name) for name in stale))
+
+    if stale or not (os.path.exists(ATLAS_IMAGE) and os.path.exists(ATLAS_INDEX)):
+        build_atlas()
+
+    cache = {name: digests[name] for name in ICON_FUNCTIONS if name in stale or cache.get(name) == digests[name]}
+    save_cache(cache)
+    print(f"{len(stale)} of {len(ICON_FUNCTIONS)} icons regenerated in {time.perf_counter() - start_time:.2f}s")
 
 if platform.system() == "Emscripten":
     asyncio.ensure_future(main())
 else:
     if __name__ == "__main__":
-        asyncio.run(main())
+        asyncio.run(main(force="--force" in sys.argv))
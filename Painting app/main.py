@@ -1,7 +1,14 @@
+import time
+process_start = time.perf_counter()
+
+import sys
 import tkinter as tk
 from paint_core import PaintApp # Import PaintApp from the new paint_core.py file
 
 if __name__ == "__main__":
     root = tk.Tk()
     app = PaintApp(root)
+    if "--measure-startup" in sys.argv:
+        # Prints time to first interactive frame, then exits
+        app.report_startup_time(process_start)
     root.mainloop()
@@ -0,0 +1,101 @@
+import hashlib
+import io
+import os
+from collections import OrderedDict
+
+from PIL import Image
+
+
+class Asset:
+    """One imported file, decoded once however many times it is placed."""
+
+    __slots__ = ("key", "name", "image", "placements")
+
+    def __init__(self, key, name, image):
+        self.key = key  # Hash of the file's bytes
+        self.name = name
+        self.image = image  # Full-resolution RGBA
+        self.placements = 0
+
+
+class Placement:
+    """One placed instance of an asset: a document rectangle and the canvas item showing it."""
+
+    __slots__ = ("asset", "x", "y", "size", "item")
+
+    def __init__(self, asset, x, y, size):
+        self.asset = asset
+        self.x, self.y = x, y  # Document position of the top-left corner
+        self.size = size  # Document size; the asset is scaled to it
+        self.item = None
+
+    def box(self):
+        return (self.x, self.y, self.x + self.size[0], self.y + self.size[1])
+
+
+class AssetStore:
+    """Imported images by content, with resized proxies built on demand and evicted under a memory cap.
+
+    Importing a file whose bytes are already loaded reuses the decoded image.
+    image(asset, size) returns the asset at a size: the document size for
+    compositing, or that scaled by the zoom for display. Proxies are kept most
+    recently used last; past max_bytes the oldest go first, so sizes for zoom
+    levels no longer shown are the ones dropped. An asset is freed with its last
+    placement.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.assets = {}  # Content hash -> Asset
+        self._proxies = OrderedDict()  # (content hash, size) -> RGBA image
+        self.proxy_bytes = 0
+        self.decodes = 0
+
+    def load(self, path):
+        with open(path, "rb") as f:
+            data = f.read()
+        key = hashlib.blake2b(data, digest_size=16).hexdigest()
+        asset = self.assets.get(key)
+        if asset is None:
+            with Image.open(io.BytesIO(data)) as image:
+                asset = Asset(key, os.path.basename(path), image.convert("RGBA"))
+            self.decodes += 1
+            self.assets[key] = asset
+        return asset
+
+    def place(self, asset, x, y, size):
+        asset.placements += 1
+        return Placement(asset, x, y, size)
+
+    def release(self, placement):
+        asset = placement.asset
+        asset.placements -= 1
+        if asset.placements <= 0:
+            del self.assets[asset.key]
+            for key in [key for key in self._proxies if key[0] == asset.key]:
+                self._drop(key)
+
+    def image(self, asset, size):
+        size = (max(1, round(size[0])), max(1, round(size[1])))
+        if size == asset.image.size:
+            return asset.image
+        key = (asset.key, size)
+        proxy = self._proxies.get(key)
+        if proxy is not None:
+            self._proxies.move_to_end(key)
+            return proxy
+        proxy = asset.image.resize(size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+        self._proxies[key] = proxy
+        self.proxy_bytes += size[0] * size[1] * 4
+        while self.proxy_bytes > self.max_bytes and len(self._proxies) > 1:
+            self._drop(next(iter(self._proxies)))
+        return proxy
+
+    def _drop(self, key):
+        proxy = self._proxies.pop(key)
+        self.proxy_bytes -= proxy.width * proxy.height * 4
+
+    def stats(self):
+        return {"assets": len(self.assets), "decodes": self.decodes, "proxies": len(self._proxies),
+                "proxy_bytes": self.proxy_bytes,
+                "decoded_bytes": sum(a.image.width * a.image.height * 4 for a in self.assets.values())}
@@ -0,0 +1,80 @@
+import math
+
+import numpy as np
+from PIL import Image, ImageColor
+
+CAPS = ("round", "butt", "projecting")  # Tk capstyle names; "projecting" is a square cap
+
+
+def _cap_extension(cap, radius):
+    return radius if cap == "projecting" else 0.0
+
+
+def segment_box(x0, y0, x1, y1, radius):
+    """Integer pixel box (x1, y1, x2, y2) that a segment of the given radius can touch, caps included."""
+    pad = radius * math.sqrt(2) + 1  # A square cap reaches out diagonally
+    return (math.floor(min(x0, x1) - pad), math.floor(min(y0, y1) - pad),
+            math.ceil(max(x0, x1) + pad), math.ceil(max(y0, y1) + pad))
+
+
+def segment_coverage(x0, y0, x1, y1, radius, box, start_cap="round", end_cap="round"):
+    """Anti-aliased coverage (0..1 float32, shaped like box) of a thick segment over the pixels in box.
+
+    Coverage comes from the signed distance of each pixel center to the segment:
+    a capsule for round ends, a rectangle reaching past the end for butt and
+    projecting ends. One pixel of falloff gives the anti-aliasing.
+    """
+    left, top, right, bottom = box
+    px = np.arange(left, right, dtype=np.float32)[None, :] + 0.5 - x0
+    py = np.arange(top, bottom, dtype=np.float32)[:, None] + 0.5 - y0
+    length = math.hypot(x1 - x0, y1 - y0)
+    dx, dy = ((x1 - x0) / length, (y1 - y0) / length) if length else (1.0, 0.0)
+    along = px * dx + py * dy  # Distance along the segment from its start
+    across = np.abs(py * dx - px * dy) - radius  # Distance outside the segment's sides
+    distance = np.hypot(along - np.clip(along, 0, length), across + radius) - radius
+    if start_cap != "round":
+        distance = np.where(along < 0, np.maximum(-along - _cap_extension(start_cap, radius), across), distance)
+    if end_cap != "round":
+        distance = np.where(along > length, np.maximum(along - length - _cap_extension(end_cap, radius), across), distance)
+    return np.clip(0.5 - distance, 0, 1, dtype=np.float32)
+
+
+def add_segment(coverage, origin, x0, y0, x1, y1, radius, start_cap="round", end_cap="round"):
+    """Merges one segment into a coverage array whose top-left pixel is origin, touching only the segment's box.
+
+    Coverages combine with max, so overlapping segments of one stroke never darken
+    their joins. Returns the box that was updated, or None if the segment missed.
+    """
+    ox, oy = origin
+    height, width = coverage.shape
+    x_a, y_a, x_b, y_b = segment_box(x0, y0, x1, y1, radius)
+    box = (max(x_a, ox), max(y_a, oy), min(x_b, ox + width), min(y_b, oy + height))
+    if box[0] >= box[2] or box[1] >= box[3]:
+        return None
+    view = coverage[box[1] - oy:box[3] - oy, box[0] - ox:box[2] - ox]
+    np.maximum(view, segment_coverage(x0, y0, x1, y1, radius, box, start_cap, end_cap), out=view)
+    return box
+
+
+def stroke_coverage(points, width, cap, origin, size):
+    """Coverage of a polyline [(x, y), ...] with round joins and the given end caps, over size pixels at origin."""
+    coverage = np.zeros((size[1], size[0]), dtype=np.float32)
+    radius = width / 2
+    if len(points) == 1:
+        points = points * 2
+    last = len(points) - 2
+    for i in range(last + 1):
+        (x0, y0), (x1, y1) = points[i], points[i + 1]
+        add_segment(coverage, origin, x0, y0, x1, y1, radius,
+                    cap if i == 0 else "round", cap if i == last else "round")
+    return coverage
+
+
+def coverage_to_image(coverage, color):
+    """An RGBA image of color whose alpha is the coverage."""
+    rgba = ImageColor.getrgb(color)
+    pixels = np.empty(coverage.shape + (4,), dtype=np.uint8)
+    pixels[..., :3] = rgba[:3]
+    alpha = rgba[3] if len(rgba) == 4 else 255
+    pixels[..., 3] = np.rint(coverage * alpha).astype(np.uint8)
+    return Image.fromarray(pixels, "RGBA")
@@ -1,10 +1,50 @@
 import tkinter as tk
-from tkinter import colorchooser, filedialog, messagebox, simpledialog, ttk
-from PIL import Image, ImageDraw, ImageTk, ImageGrab
+from tkinter import messagebox, ttk
+from PIL import Image, ImageDraw, ImageTk
 import io
 import os
 import math
 import json
+import time
+import functools
+import queue
+import threading
+from collections import OrderedDict
+from paint_assets import AssetStore
+from paint_dirty import DirtyTracker
+from paint_governor import DEGRADATIONS, QualityGovernor
+from paint_history import HistoryCompressor, HistoryStep
+from paint_scheduler import PRIORITY_HIGH, IdleScheduler
+from paint_spatial import SpatialIndex
+from paint_spill import SpillStore
+from paint_stroke import StrokeBuilder
+from paint_vector import VectorLayer, VectorShape
+from paint_workspace import (TILE_SIZE as WORKSPACE_TILE_SIZE, WORKSPACE_FILE, Workspace, WorkspaceWriter,
+                             read_history, write_history, write_tiles)
+from paint_text import render_text
+import paint_ops
+
+# colorchooser, filedialog and simpledialog are imported where they are used,
+# keeping them off the startup path.
+
+ICONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "icons")
+ICON_ATLAS_IMAGE = os.path.join(ICONS_DIR, "atlas.png")
+ICON_ATLAS_INDEX = os.path.join(ICONS_DIR, "atlas.json")
+BUTTON_ICON_SIZE = 32
+BLIT_TILE_SIZE = 256  # Damaged display areas are copied to the canvas photo in tiles of this size
+
+# Triangle vertices as fractions of the drag box: bottom-left, bottom-right, top-middle
+TRIANGLE_UNIT_VERTICES = ((0.0, 1.0), (1.0, 1.0), (0.5, 0.0))
+
+@functools.lru_cache(maxsize=None)
+def unit_star_vertices(num_points=5, inner_ratio=0.4):
+    """Star vertex offsets for an outer radius of 1, alternating outer/inner and starting at the top."""
+    vertices = []
+    for i in range(num_points * 2):
+        radius = 1.0 if i % 2 == 0 else inner_ratio
+        angle = math.pi / num_points * i - math.pi / 2
+        vertices.append((radius * math.cos(angle), radius * math.sin(angle)))
+    return tuple(vertices)
 
 class PaintApp:
     def __init__(self, master):
@@ -16,6 +56,8 @@ class PaintApp:
         # --- Drawing Variables ---
         self.current_color = "black"
         self.fill_color = None
+        self.fill_pattern = None  # Pattern that fills use instead of fill_color, when one is chosen
+        self.pattern_cache = None  # Pre-tiled pattern blocks, built on the first pattern fill
         self.brush_size = 5
         self.brush_type = "round"
         self.last_x, self.last_y = None, None
@@ -23,9 +65,29 @@ class PaintApp:
         self.current_tool = "brush"
         self.current_shape = None
         self.active_item = None
+        self.preview_outline_item = None
+        self.preview_fill_item = None
+        self.stroke_builder = None  # Resamples the freehand stroke in progress
+        self.gradient_drag = None  # Region, stops and start point of the gradient being dragged
         self.zoom_level = 1.0
         self.history = []
         self.redo_stack = []
+        self.item_index = SpatialIndex()  # Bounding boxes of drawn items for hit-testing and region queries
+        self.vector_layer = VectorLayer()  # Editable shapes and text drawn since the canvas was last flattened
+        self.base_image = None  # Raster layer under the shapes, RGBA; transparent where the background shows
+        self.document_cache = None  # Flattened RGB document, brought up to date from "document" damage
+        self.pending_step = None  # HistoryStep collecting the damage of the edit in progress
+        self.placements = []  # Floating imported images, bottom to top, until they are flattened
+        self.placement_items = {}  # Canvas item -> Placement it shows
+        self.asset_photos = {}  # (asset key, display size) -> PhotoImage shared by the placements showing it
+        self.timeline = None  # Animation frames, created when the first frame is added
+        self.frame_index = 0
+        self.onion_item = self.onion_photo = None
+        self.color_stats = None  # Histograms of the document, counted from the first time the panel opens
+        self.stats_panel = None
+        self._refresh_scheduled = False
+        self.text_photo_cache = OrderedDict()  # (text, font, size, color) -> PhotoImage, most recent last
+        self.text_photos = {}  # Canvas item -> PhotoImage it shows, keeps the images alive
         self.clipboard = None
         self.font_name = "Inter"
         self.font_size = 14
@@ -63,20 +125,58 @@ class PaintApp:
             "default_brush_size": 5,
             "canvas_bg": "#25253a",
             "show_grid": False,
-            "show_ruler": False
+            "show_ruler": False,
+            "stroke_spacing": 2.0,
+            "stroke_tolerance": 0.75,
+            "history_ram_mb": 256,
+            "history_codec": "zlib",
+            "history_archive_codec": "lzma",
+            "history_archive_after": 20,
+            "fill_region_index": True,
+            "restore_workspace": True,
+            "frame_target_ms": 16,
+            "quality_degradations": list(DEGRADATIONS),
+            "gradient_kind": "linear",
+            "gradient_dither": True,
+            "gradient_stops": "",
+            "pattern_cache_mb": 16,
+            "asset_proxy_mb": 64
         }
         self.load_settings()
+        # Undo pixels beyond this budget are paged out to a memory-mapped scratch file
+        self.tile_store = SpillStore(int(self.settings.get("history_ram_mb", 256) * 1024 * 1024))
+        self.history_compressor = HistoryCompressor(self.tile_store)
+        # Imported files are decoded once per content; resized copies for the zoom are kept under a cap
+        self.assets = AssetStore(int(self.settings.get("asset_proxy_mb", 64) * 1024 * 1024))
+        # Drags, zoom spins and filter previews fall back to cheaper rendering when frames run slow
+        self.governor = QualityGovernor(self.master, self.settings.get("frame_target_ms", 16),
+                                        self.settings.get("quality_degradations", DEGRADATIONS))
+        # Background work runs here in short slices between input events, never inline in a handler
+        self.scheduler = IdleScheduler(self.master)
         
         # --- Load Icons ---
+        self.startup_timings = {}
+        phase_start = time.perf_counter()
         self.icons = {}
         self._load_icons()
         if self.icons.get("app_icon"):
             self.master.iconphoto(True, self.icons["app_icon"])
+        self.startup_timings["icons"] = time.perf_counter() - phase_start
 
         # Canvas dimensions
         self.canvas_width = 960
         self.canvas_height = 720
 
+        # Every edit reports the document rectangle it changes; each consumer drains its own copy
+        self.dirty = DirtyTracker(self.canvas_width, self.canvas_height)
+        self.dirty.register("display")  # Raster layer -> canvas photo
+        self.dirty.register("document")  # All layers -> document_cache
+        self.region_index = None  # Fill labels, built on the first fill
+        self.canvas_photo_image = self.canvas_photo_item = None  # Persistent display of the raster layer
+        self.blit_photo = None  # Scratch photo that carries damaged tiles into the display photo
+        self.workspace = None  # Workspace restored at startup; history patches are read from it on demand
+        self.pending_tiles = []  # Restored document tiles not pasted in yet
+
         # --- UI Elements with Scrollbar ---
         self.main_frame = ttk.Frame(master)
         self.main_frame.pack(fill=tk.BOTH, expand=True)
@@ -93,21 +193,32 @@ class PaintApp:
         self.status_bar = tk.Label(self.main_frame, text="Ready to create!", bd=1, relief=tk.FLAT, bg=self.themes[self.current_theme]["status_bar_bg"], fg=self.themes[self.current_theme]["status_bar_fg"], anchor=tk.W)
         self.status_bar.pack(side=tk.BOTTOM, fill=tk.X)
 
+        phase_start = time.perf_counter()
         self.create_widgets()
         self.bind_events()
+        self.startup_timings["widgets"] = time.perf_counter() - phase_start
         
         # Bind the window close event
         self.master.protocol("WM_DELETE_WINDOW", self.on_closing)
         
-        # Apply initial theme and settings
-        self.apply_theme(self.current_theme)
-        self.size_slider.set(self.brush_size)
+        # Apply initial theme and settings (nothing is written to disk during startup)
+        phase_start = time.perf_counter()
+        self.apply_theme(self.current_theme, persist=False)
         self.fill_var.set(self.fill_color is not None)
         self.toggle_fill()
         self.grid_var.set(self.show_grid)
         self.ruler_var.set(self.show_ruler)
         self.update_gridlines()
         self.update_rulers()
+        self.startup_timings["theme"] = time.perf_counter() - phase_start
+
+        phase_start = time.perf_counter()
+        if self.settings.get("restore_workspace", True):
+            try:
+                self.restore_workspace()
+            except Exception as e:
+                print(f"Error restoring workspace: {e}")
+        self.startup_timings["workspace"] = time.perf_counter() - phase_start
 
     def load_settings(self):
         try:
@@ -138,7 +249,7 @@ class PaintApp:
         except Exception as e:
             print(f"Error saving settings: {e}")
 
-    def apply_theme(self, theme_name):
+    def apply_theme(self, theme_name, persist=True):
         theme = self.themes[theme_name]
         self.master.configure(bg=theme["bg"])
         
@@ -166,41 +277,92 @@ class PaintApp:
 
         self.current_theme = theme_name
         self.settings["theme"] = theme_name
-        self.save_settings()
+        if persist:
+            self.save_settings()
 
     def create_widgets(self):
         self.control_frame = ttk.Frame(self.main_frame, relief="flat", padding=10)
         self.control_frame.pack(side=tk.TOP, fill=tk.X, pady=5)
 
+        # Variables shared by tab widgets and the rest of the app exist before any tab is built
+        self.tool_var = tk.StringVar(value=self.current_tool)
+        self.shape_var = tk.StringVar(value="")
+        self.brush_size_var = tk.DoubleVar(value=self.brush_size)
+        self.brush_type_var = tk.StringVar(value="round")
+        self.fill_var = tk.BooleanVar(value=False)
+        self.gradient_kind_var = tk.StringVar(value=self.settings.get("gradient_kind", "linear"))
+        self.gradient_dither_var = tk.BooleanVar(value=self.settings.get("gradient_dither", True))
+        self.gradient_stops_var = tk.StringVar(value=self.settings.get("gradient_stops", ""))
+        self.zoom_var = tk.StringVar(value="100%")
+        self.grid_var = tk.BooleanVar(value=self.show_grid)
+        self.ruler_var = tk.BooleanVar(value=self.show_ruler)
+        self.frame_label_var = tk.StringVar(value="Frame 1/1")
+        self.frame_duration_var = tk.IntVar(value=100)
+        self.onion_var = tk.BooleanVar(value=False)
+        self.tool_buttons = {}
+        self.shape_buttons = {}
+        self.current_color_display = None
+
         # --- Tabs with Modern Layout ---
-        notebook = ttk.Notebook(self.control_frame)
-        notebook.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        # Only the visible tab is populated at startup; the rest are built on first selection.
+        self.notebook = ttk.Notebook(self.control_frame)
+        self.notebook.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        self._tab_builders = {}
+        for title, builder in [("File", self._build_file_tab), ("Edit", self._build_edit_tab),
+                               ("Tools", self._build_tools_tab), ("Brush", self._build_brush_tab),
+                               ("Shapes", self._build_shapes_tab), ("Gradient", self._build_gradient_tab),
+                               ("Colors", self._build_colors_tab),
+                               ("Image", self._build_image_tab), ("Animation", self._build_animation_tab),
+                               ("View", self._build_view_tab),
+                               ("Settings", self._build_settings_tab)]:
+            tab_frame = ttk.LabelFrame(self.notebook, text=title, padding=5)
+            self.notebook.add(tab_frame, text=title)
+            self._tab_builders[str(tab_frame)] = builder
+        self._build_selected_tab()
+        self.notebook.bind("<<NotebookTabChanged>>", lambda e: self._build_selected_tab())
+
+        # Rulers
+        self.ruler_top = tk.Canvas(self.main_frame, height=20, bg=self.themes[self.current_theme]["control_frame_bg"], highlightthickness=0)
+        self.ruler_left = tk.Canvas(self.main_frame, width=20, bg=self.themes[self.current_theme]["control_frame_bg"], highlightthickness=0)
+        self.ruler_top.pack(side=tk.TOP, fill=tk.X)
+        self.ruler_left.pack(side=tk.LEFT, fill=tk.Y)
 
+        # Drawing Canvas with Scrollbar
+        self.canvas = tk.Canvas(self.canvas_frame, width=self.canvas_width, height=self.canvas_height, bd=2, relief="sunken", highlightbackground=self.themes[self.current_theme]["border_color"], highlightthickness=2, yscrollcommand=self.scrollbar.set)
+        self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.canvas.configure(bg=self.themes[self.current_theme]["canvas_bg"])
+        self.scrollbar.config(command=self.canvas.yview)
+        self._display_image_on_canvas(Image.new("RGBA", (self.canvas_width, self.canvas_height), (0, 0, 0, 0)))
+
+    def _build_selected_tab(self):
+        tab_name = self.notebook.select()
+        builder = self._tab_builders.pop(tab_name, None)
+        if builder:
+            builder(self.notebook.nametowidget(tab_name))
+
+    def _build_file_tab(self, file_frame):
         # File Tab (Horizontal Button Layout)
-        file_frame = ttk.LabelFrame(notebook, text="File", padding=5)
-        notebook.add(file_frame, text="File")
         button_frame = ttk.Frame(file_frame)
         button_frame.pack(fill=tk.X)
         ttk.Button(button_frame, text="New", command=self.clear_canvas, image=self.icons.get("clear_icon"), compound=tk.LEFT).pack(side=tk.LEFT, padx=2, pady=2)
         ttk.Button(button_frame, text="Open", command=self.import_image, image=self.icons.get("image_icon"), compound=tk.LEFT).pack(side=tk.LEFT, padx=2, pady=2)
         ttk.Button(button_frame, text="Save", command=self.save_canvas, image=self.icons.get("save_icon"), compound=tk.LEFT).pack(side=tk.LEFT, padx=2, pady=2)
+        ttk.Button(button_frame, text="Export SVG", command=self.export_svg).pack(side=tk.LEFT, padx=2, pady=2)
+        ttk.Button(button_frame, text="Export Set", command=self.export_set_dialog).pack(side=tk.LEFT, padx=2, pady=2)
 
-        # Edit Tab
-        edit_frame = ttk.LabelFrame(notebook, text="Edit", padding=5)
-        notebook.add(edit_frame, text="Edit")
+    def _build_edit_tab(self, edit_frame):
         ttk.Button(edit_frame, text="Undo", command=self.undo).pack(pady=5)
         ttk.Button(edit_frame, text="Redo", command=self.redo).pack(pady=5)
+        ttk.Button(edit_frame, text="History Memory", command=self.show_history_stats).pack(pady=5)
+        ttk.Button(edit_frame, text="Background Tasks", command=self.show_task_stats).pack(pady=5)
 
-        # Tools Tab
-        tools_frame = ttk.LabelFrame(notebook, text="Tools", padding=5)
-        notebook.add(tools_frame, text="Tools")
-        self.tool_var = tk.StringVar(value=self.current_tool)
-        self.tool_buttons = {}
+    def _build_tools_tab(self, tools_frame):
         tool_definitions = [
             ("brush", "Brush", self.icons.get("brush_icon")),
             ("eraser", "Eraser", self.icons.get("eraser_icon")),
             ("pencil", "Pencil", self.icons.get("pencil_icon")),
             ("fill", "Fill", self.icons.get("fill_icon")),
+            ("gradient", "Gradient", None),
             ("text", "Text", self.icons.get("text_icon")),
             ("pipette", "Color Picker", self.icons.get("pipette_icon")),
             ("zoom", "Zoom", self.icons.get("zoom_icon")),
@@ -211,26 +373,20 @@ class PaintApp:
                                command=lambda t=tool_name: self.select_tool(t))
             btn.pack(side=tk.LEFT, padx=5, pady=5)
             self.tool_buttons[tool_name] = btn
+        self.update_active_tool_button()
 
+    def _build_brush_tab(self, brush_frame):
         # Brush Options Tab
-        brush_frame = ttk.LabelFrame(notebook, text="Brush", padding=5)
-        notebook.add(brush_frame, text="Brush")
         self.size_slider = ttk.Scale(brush_frame, from_=1, to=50, orient=tk.HORIZONTAL,
-                                  command=self.change_brush_size, length=200)
-        self.size_slider.set(self.brush_size)
+                                  variable=self.brush_size_var, command=self.change_brush_size, length=200)
         self.size_slider.pack(pady=5)
-        self.brush_type_var = tk.StringVar(value="round")
         brush_types = ["round", "square", "airbrush"]
         brush_type_menu = ttk.Combobox(brush_frame, textvariable=self.brush_type_var, values=brush_types,
                                      state="readonly", width=10)
         brush_type_menu.pack(pady=5)
         brush_type_menu.bind("<<ComboboxSelected>>", lambda e: self.change_brush_type())
 
-        # Shapes Tab
-        shapes_frame = ttk.LabelFrame(notebook, text="Shapes", padding=5)
-        notebook.add(shapes_frame, text="Shapes")
-        self.shape_var = tk.StringVar(value="")
-        self.shape_buttons = {}
+    def _build_shapes_tab(self, shapes_frame):
         shape_definitions = [
             ("line", "Line", self.icons.get("line_shape_icon")),
             ("rectangle", "Rect", self.icons.get("rectangle_shape_icon")),
@@ -244,13 +400,25 @@ class PaintApp:
                                command=lambda s=shape_name: self.select_shape(s))
             btn.pack(side=tk.LEFT, padx=5, pady=5)
             self.shape_buttons[shape_name] = btn
-        self.fill_var = tk.BooleanVar(value=False)
         ttk.Checkbutton(shapes_frame, text="Fill", variable=self.fill_var,
                       command=self.toggle_fill).pack(pady=5)
+        self.update_active_tool_button()
 
-        # Colors Tab
-        colors_frame = ttk.LabelFrame(notebook, text="Colors", padding=5)
-        notebook.add(colors_frame, text="Colors")
+    def _build_gradient_tab(self, gradient_frame):
+        from paint_gradient import GRADIENT_KINDS
+        kind_menu = ttk.Combobox(gradient_frame, textvariable=self.gradient_kind_var, values=GRADIENT_KINDS,
+                                 state="readonly", width=8)
+        kind_menu.pack(side=tk.LEFT, padx=5, pady=5)
+        kind_menu.bind("<<ComboboxSelected>>", lambda e: self.change_gradient_options())
+        ttk.Checkbutton(gradient_frame, text="Dither", variable=self.gradient_dither_var,
+                        command=self.change_gradient_options).pack(side=tk.LEFT, padx=5, pady=5)
+        ttk.Label(gradient_frame, text="Stops:").pack(side=tk.LEFT, padx=(5, 0), pady=5)
+        stops_entry = ttk.Entry(gradient_frame, textvariable=self.gradient_stops_var, width=40)
+        stops_entry.pack(side=tk.LEFT, padx=5, pady=5)
+        stops_entry.bind("<Return>", lambda e: self.change_gradient_options())
+        stops_entry.bind("<FocusOut>", lambda e: self.change_gradient_options())
+
+    def _build_colors_tab(self, colors_frame):
         self.current_color_display = tk.Label(colors_frame, bg=self.current_color, width=4, height=2, relief="ridge", bd=2)
         self.current_color_display.pack(pady=5)
         ttk.Button(colors_frame, text="Pick Color", command=self.choose_color,
@@ -266,10 +434,13 @@ class PaintApp:
                           command=lambda c=color_hex: self.set_current_color(c),
                           relief="flat", bd=1, activebackground=color_hex)
             btn.grid(row=i // 8, column=i % 8, padx=2, pady=2)
+        pattern_frame = ttk.Frame(colors_frame)
+        pattern_frame.pack(pady=5)
+        ttk.Button(pattern_frame, text="Pattern...", command=self.load_fill_pattern).pack(side=tk.LEFT, padx=2)
+        ttk.Button(pattern_frame, text="Clipboard Pattern", command=self.clipboard_fill_pattern).pack(side=tk.LEFT, padx=2)
+        ttk.Button(pattern_frame, text="Solid Fill", command=lambda: self.set_fill_pattern(None)).pack(side=tk.LEFT, padx=2)
 
-        # Image Tab
-        image_frame = ttk.LabelFrame(notebook, text="Image", padding=5)
-        notebook.add(image_frame, text="Image")
+    def _build_image_tab(self, image_frame):
         ttk.Button(image_frame, text="Import", command=self.import_image,
                    image=self.icons.get("image_icon"), compound=tk.TOP).pack(pady=5)
         rotate_menu_btn = ttk.Menubutton(image_frame, text="Transform")
@@ -282,42 +453,48 @@ class PaintApp:
         rotate_menu_btn.menu.add_command(label="Flip Horizontal", command=lambda: self.flip_canvas("horizontal"))
         rotate_menu_btn.menu.add_command(label="Flip Vertical", command=lambda: self.flip_canvas("vertical"))
         rotate_menu_btn.pack(pady=5)
-
+        from paint_filters import FILTERS
+        filters_menu_btn = ttk.Menubutton(image_frame, text="Filters")
+        filters_menu_btn.menu = tk.Menu(filters_menu_btn, tearoff=0)
+        filters_menu_btn["menu"] = filters_menu_btn.menu
+        for filter_name, (label, _) in FILTERS.items():
+            filters_menu_btn.menu.add_command(label=f"{label}...", command=lambda n=filter_name: self.filter_dialog(n))
+        filters_menu_btn.pack(pady=5)
+
+    def _build_animation_tab(self, animation_frame):
+        ttk.Button(animation_frame, text="<", width=3, command=lambda: self.step_frame(-1)).pack(side=tk.LEFT, padx=2, pady=5)
+        ttk.Label(animation_frame, textvariable=self.frame_label_var, width=12, anchor=tk.CENTER).pack(side=tk.LEFT, padx=2, pady=5)
+        ttk.Button(animation_frame, text=">", width=3, command=lambda: self.step_frame(1)).pack(side=tk.LEFT, padx=2, pady=5)
+        ttk.Button(animation_frame, text="Add Frame", command=self.add_frame).pack(side=tk.LEFT, padx=2, pady=5)
+        ttk.Button(animation_frame, text="Delete Frame", command=self.delete_frame).pack(side=tk.LEFT, padx=2, pady=5)
+        ttk.Label(animation_frame, text="ms:").pack(side=tk.LEFT, padx=(5, 0), pady=5)
+        duration = ttk.Spinbox(animation_frame, from_=10, to=10000, increment=10, width=6,
+                               textvariable=self.frame_duration_var, command=self.change_frame_duration)
+        duration.pack(side=tk.LEFT, padx=2, pady=5)
+        duration.bind("<Return>", lambda e: self.change_frame_duration())
+        duration.bind("<FocusOut>", lambda e: self.change_frame_duration())
+        ttk.Checkbutton(animation_frame, text="Onion Skin", variable=self.onion_var,
+                        command=self.update_onion_skin).pack(side=tk.LEFT, padx=5, pady=5)
+        ttk.Button(animation_frame, text="Export Animation", command=self.export_animation).pack(side=tk.LEFT, padx=2, pady=5)
+
+    def _build_view_tab(self, view_frame):
         # View Tab (Updated Zoom Levels)
-        view_frame = ttk.LabelFrame(notebook, text="View", padding=5)
-        notebook.add(view_frame, text="View")
         zoom_levels = ["0%", "25%", "50%", "100%", "200%", "300%", "400%", "500%"]
-        self.zoom_var = tk.StringVar(value="100%")
         zoom_menu = ttk.Combobox(view_frame, textvariable=self.zoom_var, values=zoom_levels,
                                state="readonly", width=8)
         zoom_menu.pack(pady=5)
         zoom_menu.bind("<<ComboboxSelected>>", lambda e: self.set_zoom_level())
-        self.grid_var = tk.BooleanVar(value=self.show_grid)
         ttk.Checkbutton(view_frame, text="Gridlines", variable=self.grid_var,
                       command=self.toggle_gridlines).pack(pady=5)
-        self.ruler_var = tk.BooleanVar(value=self.show_ruler)
         ttk.Checkbutton(view_frame, text="Rulers", variable=self.ruler_var,
                       command=self.toggle_rulers).pack(pady=5)
         ttk.Button(view_frame, text="Fit to Screen", command=self.fit_to_screen).pack(pady=5)
+        ttk.Button(view_frame, text="Color Statistics", command=self.show_color_statistics).pack(pady=5)
 
-        # Settings Tab
-        settings_frame = ttk.LabelFrame(notebook, text="Settings", padding=5)
-        notebook.add(settings_frame, text="Settings")
+    def _build_settings_tab(self, settings_frame):
         ttk.Button(settings_frame, text="Canvas Size", command=self.resize_canvas).pack(pady=5)
         ttk.Button(settings_frame, text="Canvas Color", command=self.set_canvas_bg).pack(pady=5)
 
-        # Rulers
-        self.ruler_top = tk.Canvas(self.main_frame, height=20, bg=self.themes[self.current_theme]["control_frame_bg"], highlightthickness=0)
-        self.ruler_left = tk.Canvas(self.main_frame, width=20, bg=self.themes[self.current_theme]["control_frame_bg"], highlightthickness=0)
-        self.ruler_top.pack(side=tk.TOP, fill=tk.X)
-        self.ruler_left.pack(side=tk.LEFT, fill=tk.Y)
-
-        # Drawing Canvas with Scrollbar
-        self.canvas = tk.Canvas(self.canvas_frame, width=self.canvas_width, height=self.canvas_height, bd=2, relief="sunken", highlightbackground=self.themes[self.current_theme]["border_color"], highlightthickness=2, yscrollcommand=self.scrollbar.set)
-        self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        self.canvas.configure(bg=self.themes[self.current_theme]["canvas_bg"])
-        self.scrollbar.config(command=self.canvas.yview)
-
     def bind_events(self):
         self.canvas.bind("<Button-1>", self.on_mouse_down)
         self.canvas.bind("<B1-Motion>", self.on_mouse_drag)
@@ -333,24 +510,47 @@ class PaintApp:
                       "image_icon", "pencil_icon", "fill_icon", "text_icon", "pipette_icon", "zoom_icon",
                       "line_shape_icon", "rectangle_shape_icon", "circle_shape_icon", "triangle_shape_icon",
                       "star_shape_icon"]
-        icons_dir = "icons"
         
-        if not os.path.exists(icons_dir):
-            messagebox.showerror("Icon Error", f"The 'icons' directory was not found at '{icons_dir}'. Please run 'generate_icons.py' first.")
+        if not os.path.exists(ICONS_DIR):
+            messagebox.showerror("Icon Error", f"The 'icons' directory was not found at '{ICONS_DIR}'. Please run 'generate_icons.py' first.")
             return
 
-        for name in icon_names:
-            path = os.path.join(icons_dir, f"{name}.png")
+        # Fast path: one decode of the packed atlas, then crop each icon out of it
+        missing = self._load_icon_atlas(icon_names)
+
+        for name in missing:
+            path = os.path.join(ICONS_DIR, f"{name}.png")
             try:
                 img = Image.open(path)
-                if name != "app_icon":
-                    img = img.resize((32, 32), Image.Resampling.LANCZOS)
+                if name != "app_icon" and img.size != (BUTTON_ICON_SIZE, BUTTON_ICON_SIZE):
+                    img = img.resize((BUTTON_ICON_SIZE, BUTTON_ICON_SIZE), Image.Resampling.LANCZOS)
                 self.icons[name] = ImageTk.PhotoImage(img)
             except Exception as e:
                 print(f"Error loading icon {name}: {e}")
                 self.icons[name] = None
                 messagebox.showwarning("Icon Missing", f"Could not load icon: {name}.png. Please ensure 'generate_icons.py' ran successfully.")
 
+    def _load_icon_atlas(self, icon_names):
+        """Loads icons from the atlas built by generate_icons.py. Returns the names it could not provide."""
+        try:
+            with open(ICON_ATLAS_INDEX, "r") as f:
+                boxes = json.load(f)["icons"]
+            atlas = Image.open(ICON_ATLAS_IMAGE)
+            atlas.load()
+        except Exception as e:
+            print(f"Icon atlas unavailable, loading individual icons: {e}")
+            return list(icon_names)
+
+        missing = []
+        for name in icon_names:
+            box = boxes.get(name)
+            if box is None:
+                missing.append(name)
+                continue
+            x, y, w, h = box
+            self.icons[name] = ImageTk.PhotoImage(atlas.crop((x, y, x + w, y + h)))
+        return missing
+
     def select_tool(self, tool_name):
         self.current_tool = tool_name
         self.current_shape = None
@@ -380,13 +580,15 @@ class PaintApp:
 
     def set_current_color(self, color_hex):
         self.current_color = color_hex
-        self.current_color_display.config(bg=self.current_color)
+        if self.current_color_display is not None:
+            self.current_color_display.config(bg=self.current_color)
         if self.fill_var.get():
             self.fill_color = self.current_color
         self.status_bar_message(f"Color set to: {self.current_color}")
         self.canvas_modified = True  # Mark as modified when color changes
 
     def choose_color(self):
+        from tkinter import colorchooser
         color_code = colorchooser.askcolor(title="Choose Color", initialcolor=self.current_color)
         if color_code[1]:
             self.set_current_color(color_code[1])
@@ -411,32 +613,85 @@ class PaintApp:
         self.status_bar_message(f"Fill {'enabled' if self.fill_var.get() else 'disabled'}")
         self.canvas_modified = True  # Mark as modified when fill state changes
 
+    def change_gradient_options(self):
+        self.settings["gradient_kind"] = self.gradient_kind_var.get()
+        self.settings["gradient_dither"] = self.gradient_dither_var.get()
+        self.settings["gradient_stops"] = self.gradient_stops_var.get().strip()
+        self.save_settings()
+        self.status_bar_message(f"Gradient: {self.settings['gradient_kind']}")
+
+    def set_fill_pattern(self, image, name=""):
+        """Makes fills tile image (any mode) instead of using the solid fill color; None goes back to solid."""
+        if image is None:
+            self.fill_pattern = None
+            self.status_bar_message("Fill: solid color")
+            return
+        from paint_pattern import Pattern
+        self.fill_pattern = Pattern(image, name)
+        self.status_bar_message(f"Fill pattern: {name or 'image'} ({image.width}x{image.height})")
+
+    def load_fill_pattern(self):
+        from tkinter import filedialog
+        file_path = filedialog.askopenfilename(filetypes=[("Image files", "*.png;*.jpg;*.jpeg;*.gif;*.bmp"), ("All files", "*.*")])
+        if file_path:
+            try:
+                with Image.open(file_path) as image:
+                    self.set_fill_pattern(image, os.path.basename(file_path))
+            except Exception as e:
+                messagebox.showerror("Error", f"Failed to load pattern: {e}")
+
+    def clipboard_fill_pattern(self):
+        """Uses the app clipboard as the pattern, or an image on the system clipboard if that is empty."""
+        image = self.clipboard
+        if image is None:
+            try:
+                from PIL import ImageGrab
+                image = ImageGrab.grabclipboard()
+            except Exception:
+                image = None
+        if isinstance(image, Image.Image):
+            self.set_fill_pattern(image, "clipboard")
+        else:
+            self.status_bar_message("No image on the clipboard.")
+
+    def patterns(self):
+        if self.pattern_cache is None:
+            from paint_pattern import PatternCache
+            self.pattern_cache = PatternCache(int(self.settings.get("pattern_cache_mb", 16) * 1024 * 1024))
+        return self.pattern_cache
+
     def clear_canvas(self):
         if messagebox.askyesno("Clear Canvas", "Are you sure you want to clear the canvas?"):
-            self.history.append(self.get_canvas_image_data())
-            self.redo_stack.clear()
-            self.canvas.delete("all")
-            self.canvas_modified = True
+            self.begin_edit()
+            self.damage_all()
+            self._display_image_on_canvas(Image.new("RGBA", (self.canvas_width, self.canvas_height), (0, 0, 0, 0)))
+            self.end_edit()
             self.status_bar_message("Canvas cleared.")
             self.set_current_color("black")
-            self.size_slider.set(5)
+            self.brush_size_var.set(5)
+            self.change_brush_size(5)
             self.canvas.configure(bg=self.themes[self.current_theme]["canvas_bg"])
 
     def get_canvas_image_data(self):
-        self.master.update_idletasks()
-        if self.canvas_width <= 0 or self.canvas_height <= 0:
-            return Image.new("RGB", (self.canvas_width or 800, self.canvas_height or 600), self.canvas.cget("bg"))
-
-        x = self.canvas.winfo_rootx()
-        y = self.canvas.winfo_rooty()
-        try:
-            img = ImageGrab.grab(bbox=(x, y, x + self.canvas_width, y + self.canvas_height))
-            return img.convert("RGB")
-        except Exception as e:
-            print(f"Warning: Screenshot failed: {e}. Using blank image.")
-            return Image.new("RGB", (self.canvas_width, self.canvas_height), self.canvas.cget("bg"))
+        """The flattened document (background, raster, shapes, floating imports) as a new RGB image."""
+        return self.document_image().copy()
+
+    def document_image(self):
+        """The flattened document cache, brought up to date; read it, never modify it.
+
+        Only the rectangles damaged since the last call are re-composited.
+        """
+        background = self.canvas.cget("bg")
+        if self.document_cache is None or self.document_cache.size != self.base_image.size:
+            self.dirty.take("document")
+            self.document_cache = self.flatten_document(background).convert("RGB")
+        else:
+            for box in self.dirty.take("document"):
+                self.document_cache.paste(self.flatten_region(box, background).convert("RGB"), box[:2])
+        return self.document_cache
 
     def save_canvas(self):
+        from tkinter import filedialog
         try:
             file_path = filedialog.asksaveasfilename(defaultextension=".png", filetypes=[("PNG files", "*.png"), ("JPEG files", "*.jpg"), ("All files", "*.*")], initialfile="my_artwork.png")
             if not file_path:
@@ -451,33 +706,99 @@ class PaintApp:
         except Exception as e:
             messagebox.showerror("Save Error", f"Error saving: {e}")
 
+    def export_set_dialog(self):
+        import paint_export
+        dialog = tk.Toplevel(self.master)
+        dialog.title("Export Set")
+        dialog.transient(self.master)
+        dialog.grab_set()
+        frame = ttk.Frame(dialog, padding=10)
+        frame.pack(fill=tk.BOTH, expand=True)
+        ttk.Label(frame, text="Name:").grid(row=0, column=0, padx=5, pady=5, sticky=tk.W)
+        name_entry = ttk.Entry(frame)
+        name_entry.insert(0, "my_artwork")
+        name_entry.grid(row=0, column=1, columnspan=3, padx=5, pady=5, sticky=tk.EW)
+        ttk.Label(frame, text="Formats:").grid(row=1, column=0, padx=5, pady=5, sticky=tk.W)
+        format_vars = {}
+        for column, fmt in enumerate(paint_export.EXPORT_FORMATS, start=1):
+            format_vars[fmt] = tk.BooleanVar(value=fmt in paint_export.DEFAULT_FORMATS)
+            ttk.Checkbutton(frame, text=fmt.upper(), variable=format_vars[fmt]).grid(row=1, column=column, padx=5, pady=5)
+        ttk.Label(frame, text="Scales:").grid(row=2, column=0, padx=5, pady=5, sticky=tk.W)
+        scale_vars = {}
+        for column, scale in enumerate(paint_export.DEFAULT_SCALES, start=1):
+            scale_vars[scale] = tk.BooleanVar(value=True)
+            ttk.Checkbutton(frame, text=f"{scale:g}x", variable=scale_vars[scale]).grid(row=2, column=column, padx=5, pady=5)
+        thumbnail_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(frame, text="Thumbnail", variable=thumbnail_var).grid(row=3, column=1, padx=5, pady=5, sticky=tk.W)
+
+        def confirm():
+            formats = [fmt for fmt, var in format_vars.items() if var.get()]
+            scales = [scale for scale, var in scale_vars.items() if var.get()]
+            if not (formats and scales) and not thumbnail_var.get():
+                messagebox.showerror("Error", "Select at least one format and scale.", parent=dialog)
+                return
+            basename = name_entry.get().strip() or "my_artwork"
+            dialog.destroy()
+            self.export_set(basename, formats, scales, thumbnail_var.get())
+
+        ttk.Button(frame, text="Export...", command=confirm).grid(row=4, column=0, columnspan=4, pady=10)
+        dialog.wait_window(dialog)
+
+    def export_set(self, basename, formats, scales, thumbnail=True):
+        """Exports one snapshot of the canvas in several formats and scales without blocking the UI."""
+        from tkinter import filedialog
+        import paint_export
+        directory = filedialog.askdirectory(title="Export Set To")
+        if not directory:
+            self.status_bar_message("Export cancelled.")
+            return
+        snapshot = self.get_canvas_image_data()
+
+        def work():
+            start = time.perf_counter()
+            outputs = paint_export.export_set(snapshot, directory, basename, formats, scales, thumbnail)
+            report = paint_export.format_report(outputs, time.perf_counter() - start)
+            with open(os.path.join(directory, f"{basename}_export_report.txt"), "w") as f:
+                f.write(report + "\n")
+            return outputs
+
+        def done(outputs):
+            errors = sum(1 for r in outputs if r.error)
+            self.status_bar_message(f"Exported {len(outputs) - errors} files" + (f", {errors} failed" if errors else "")
+                                    + f"; report in {basename}_export_report.txt")
+
+        def failed(e):
+            messagebox.showerror("Export Error", f"Error exporting: {e}")
+
+        self.scheduler.submit(work, name="export set", on_done=done, on_error=failed)
+        self.status_bar_message("Exporting...")
+
     def import_image(self):
+        from tkinter import filedialog
         file_path = filedialog.askopenfilename(filetypes=[("Image files", "*.png;*.jpg;*.jpeg;*.gif;*.bmp"), ("All files", "*.*")])
         if not file_path:
             self.status_bar_message("Import cancelled.")
             return
         try:
-            self.history.append(self.get_canvas_image_data())
-            self.redo_stack.clear()
-            self.canvas_modified = True
-            pil_image = Image.open(file_path)
-            pil_image.thumbnail((self.canvas_width * 0.8, self.canvas_height * 0.8), Image.Resampling.LANCZOS)
-            self.imported_tk_image = ImageTk.PhotoImage(pil_image)
-            x = (self.canvas_width - pil_image.width) / 2
-            y = (self.canvas_height - pil_image.height) / 2
-            if hasattr(self, '_current_imported_canvas_item'):
-                self.canvas.delete(self._current_imported_canvas_item)
-            self._current_imported_canvas_item = self.canvas.create_image(x, y, image=self.imported_tk_image, anchor=tk.NW, tags="imported_image")
+            asset = self.assets.load(file_path)
+            # Placed at the center, fitted into 80% of the canvas
+            scale = min(1.0, self.canvas_width * 0.8 / asset.image.width, self.canvas_height * 0.8 / asset.image.height)
+            size = (max(1, round(asset.image.width * scale)), max(1, round(asset.image.height * scale)))
+            self.begin_edit()
+            placement = self.assets.place(asset, (self.canvas_width - size[0]) / 2, (self.canvas_height - size[1]) / 2, size)
+            self.damage(placement.box(), raster=False)
+            self.placements.append(placement)
+            self.draw_placement(placement)
+            self.end_edit()
+            self.tool_var.set("image")
+            self.select_tool("image")  # Drag to move it; each import is moved on its own
             self.status_bar_message(f"Imported {os.path.basename(file_path)}")
         except Exception as e:
             messagebox.showerror("Import Error", f"Failed to import: {e}")
 
     def undo(self):
         if self.history:
-            self.redo_stack.append(self.get_canvas_image_data())
-            last_state_img = self.history.pop()
-            self.canvas.delete("all")
-            self._display_image_on_canvas(last_state_img)
+            self.push_history(self.restore_step(self.history.pop()), self.redo_stack)
             self.canvas_modified = True
             self.status_bar_message("Undo performed.")
         else:
@@ -485,43 +806,357 @@ class PaintApp:
 
     def redo(self):
         if self.redo_stack:
-            self.history.append(self.get_canvas_image_data())
-            last_state_img = self.redo_stack.pop()
-            self.canvas.delete("all")
-            self._display_image_on_canvas(last_state_img)
+            self.push_history(self.restore_step(self.redo_stack.pop()))
             self.canvas_modified = True
             self.status_bar_message("Redo performed.")
         else:
             self.status_bar_message("Nothing to redo.")
 
     def _display_image_on_canvas(self, pil_image):
-        self.canvas.delete("all")
+        """Makes pil_image the whole raster layer, dropping every other canvas item.
+
+        The display photo and its canvas item are kept while the size stays the same;
+        the pixels reach it on the next idle refresh, not inside the caller's handler.
+        """
+        for item in self.canvas.find_all():
+            if item != self.canvas_photo_item:
+                self.canvas.delete(item)
+        self.item_index.clear()
+        self.vector_layer.clear()  # The image already contains the flattened shapes
+        self.text_photos.clear()
+        self.drop_placements()
         self.canvas.config(width=self.canvas_width, height=self.canvas_height)
-        self.canvas_photo_image = ImageTk.PhotoImage(pil_image.resize((self.canvas_width, self.canvas_height), Image.Resampling.LANCZOS))
-        self.canvas.create_image(0, 0, image=self.canvas_photo_image, anchor=tk.NW)
+        if pil_image.size != (self.canvas_width, self.canvas_height):
+            pil_image = pil_image.resize((self.canvas_width, self.canvas_height), Image.Resampling.LANCZOS)
+        self.base_image = pil_image.convert("RGBA")
+        if self.canvas_photo_image is None or (self.canvas_photo_image.width(), self.canvas_photo_image.height()) != self.base_image.size:
+            width, height = self.base_image.size
+            self.canvas_photo_image = ImageTk.PhotoImage("RGBA", (width, height), width=width, height=height)  # Blank
+            if self.canvas_photo_item is None:
+                self.canvas_photo_item = self.canvas.create_image(0, 0, image=self.canvas_photo_image, anchor=tk.NW)
+            else:
+                self.canvas.itemconfig(self.canvas_photo_item, image=self.canvas_photo_image)
+        self.dirty.resize(self.canvas_width, self.canvas_height)  # Leaves the whole display dirty
+        self.schedule_refresh()
         self.update_gridlines()
         self.update_rulers()
 
-    def rotate_canvas(self, angle):
-        self.history.append(self.get_canvas_image_data())
-        self.redo_stack.clear()
+    # --- Damage tracking and history ---
+    def begin_edit(self):
+        """Opens a history step. Damage reported until end_edit() saves the pixels it is about to overwrite."""
+        self.finish_restore()
+        self.end_edit()
+        self.pending_step = HistoryStep(self.base_image.size, self.tile_store)
         self.canvas_modified = True
-        current_img = self.get_canvas_image_data()
-        rotated_img = current_img.rotate(angle, expand=True, resample=Image.Resampling.BICUBIC)
-        self.canvas.delete("all")
+
+    def end_edit(self):
+        step, self.pending_step = self.pending_step, None
+        if step:
+            self.push_history(step)
+            for undone in self.redo_stack:
+                undone.release()
+            self.redo_stack.clear()
+
+    def push_history(self, step, stack=None):
+        """Adds a step to the undo stack (or stack) and queues it for background compression.
+
+        Once a step is history_archive_after steps deep it is recompressed with the
+        slower, denser archive codec.
+        """
+        stack = self.history if stack is None else stack
+        stack.append(step)
+        self.history_compressor.submit(step, self.settings.get("history_codec", "zlib"))
+        depth = self.settings.get("history_archive_after", 20)
+        if depth and len(stack) > depth:
+            self.history_compressor.submit(stack[-depth - 1], self.settings.get("history_archive_codec"))
+
+    def damage(self, box, raster=True):
+        """Reports a document rectangle that an edit is about to change. Call it before touching any pixels.
+
+        raster=False means only shapes or floating imports change; they are canvas items
+        of their own, so the canvas photo of the raster layer needs no refresh.
+        """
+        box = self.dirty.add(box, skip=() if raster else ("display",))
+        if box is not None:
+            if self.pending_step is not None:
+                self.pending_step.capture(box, self.flatten_region)
+            if raster:
+                self.schedule_refresh()
+        return box
+
+    def damage_all(self):
+        return self.damage((0, 0, self.canvas_width, self.canvas_height))
+
+    def schedule_refresh(self):
+        if not self._refresh_scheduled:
+            self._refresh_scheduled = True
+            self.master.after_idle(self.refresh_display)
+
+    def refresh_display(self):
+        """Copies the damaged parts of the raster layer into the canvas photo, in place.
+
+        A whole-frame update is one paste. Smaller damage goes through a reused
+        scratch photo a tile at a time, so no Tk image is created per refresh.
+        """
+        self._refresh_scheduled = False
+        for box in self.dirty.take("display"):
+            if box == (0, 0) + self.base_image.size:
+                self.canvas_photo_image.paste(self.base_image)
+                continue
+            if self.blit_photo is None:
+                self.blit_photo = ImageTk.PhotoImage("RGBA", (BLIT_TILE_SIZE,) * 2, width=BLIT_TILE_SIZE, height=BLIT_TILE_SIZE)
+            for y in range(box[1], box[3], BLIT_TILE_SIZE):
+                for x in range(box[0], box[2], BLIT_TILE_SIZE):
+                    tile = (x, y, min(x + BLIT_TILE_SIZE, box[2]), min(y + BLIT_TILE_SIZE, box[3]))
+                    self.blit_photo.paste(self.base_image.crop(tile))  # Lands at the scratch photo's origin
+                    self.canvas.tk.call(str(self.canvas_photo_image), "copy", str(self.blit_photo),
+                                        "-from", 0, 0, tile[2] - x, tile[3] - y,
+                                        "-to", x, y, "-compositingrule", "set")
+
+    def restore_step(self, step):
+        """Puts a history step's pixels back and returns the step that reverses it.
+
+        Shapes are flattened into the raster first, as undo has always done.
+        """
+        self.flatten_layers()
+        if step.size != self.base_image.size:
+            inverse = HistoryStep.snapshot(self.base_image, self.tile_store)
+            self.canvas_width, self.canvas_height = step.size
+            self._display_image_on_canvas(step.patches[0].image)
+            step.release()
+            return inverse
+        inverse = step.apply(self.base_image)
+        for patch in step.patches:
+            self.dirty.add(patch.box)
+        step.release()
+        self.schedule_refresh()
+        return inverse
+
+    def show_history_stats(self):
+        stats = self.tile_store.stats()
+        mb = 1024 * 1024
+        lookups = stats["hits"] + stats["misses"]
+        hit_rate = f"{stats['hits'] / lookups:.0%}" if lookups else "n/a"
+        self.status_bar_message(f"History: {stats['resident_bytes'] / mb:.1f} MB in RAM, "
+                                f"{stats['spilled_bytes'] / mb:.1f} MB on disk | "
+                                f"{stats['hits']} hits, {stats['misses']} misses ({hit_rate}), {stats['spills']} spills")
+
+    def show_task_stats(self):
+        stats = self.scheduler.stats()
+        tasks = ", ".join(f"{name}: {counters['completed']} done, {counters['seconds'] * 1000:.0f} ms "
+                          f"(longest {counters['longest'] * 1000:.1f} ms)"
+                          for name, counters in stats["tasks"].items())
+        self.status_bar_message(f"Background: {stats['queued']} queued, {stats['in_pool']} in pool | {tasks or 'no tasks yet'}")
+
+    def flatten_region(self, box, background=None):
+        """RGBA pixels of a document rectangle with every layer composited, over background if given."""
+        self.finish_restore()
+        left, top, right, bottom = box
+        region = Image.new("RGBA", (right - left, bottom - top), background or (0, 0, 0, 0))
+        region.alpha_composite(self.base_image.crop(box))
+        shapes, placements = self.layers_in_region(box)
+        self.vector_layer.composite_into(region, box, objects=shapes)
+        self.composite_placements(region, box, placements)
+        return region
+
+    def flatten_document(self, background=None):
+        return self.flatten_region((0, 0) + self.base_image.size, background)
+
+    def flatten_layers(self):
+        """Burns the shapes and the floating imports into the raster layer and drops their canvas items."""
+        self.finish_restore()
+        for obj in self.vector_layer:
+            self.dirty.add(obj.pixel_box(), ["display"])
+            if obj.item is not None:
+                self.canvas.delete(obj.item)
+                self.item_index.remove(obj.item)
+                self.text_photos.pop(obj.item, None)
+        self.vector_layer.composite_into(self.base_image, (0, 0) + self.base_image.size)
+        self.vector_layer.clear()
+        for placement in self.placements:
+            self.dirty.add(placement.box(), ["display"])
+        self.composite_placements(self.base_image, (0, 0) + self.base_image.size)
+        self.drop_placements()
+        self.schedule_refresh()
+
+    def composite_placements(self, target, target_box, placements=None):
+        """Alpha-composites the placed imports (or the given subset), bottom to top, onto target, which covers target_box."""
+        for placement in self.placements if placements is None else placements:
+            self._composite_at(target, target_box, self.assets.image(placement.asset, placement.size), placement.box())
+
+    def draw_placement(self, placement):
+        """Creates or updates the canvas item of a placed import, showing the asset's proxy for the current zoom."""
+        key = self.placement_photo_key(placement)
+        photo = self.asset_photos.get(key)
+        if photo is None:
+            photo = self.asset_photos[key] = ImageTk.PhotoImage(self.assets.image(placement.asset, key[1]))
+        x, y = self.document_to_canvas([placement.x, placement.y])
+        if placement.item is None:
+            placement.item = self.canvas.create_image(x, y, image=photo, anchor=tk.NW, tags="imported_image")
+            self.placement_items[placement.item] = placement
+        else:
+            self.canvas.coords(placement.item, x, y)
+            self.canvas.itemconfig(placement.item, image=photo)
+        self.index_item(placement.item)
+
+    def placement_photo_key(self, placement):
+        """(asset key, display size) of a placement at the current zoom."""
+        zoom = self.zoom_level or 1.0
+        return (placement.asset.key, (max(1, round(placement.size[0] * zoom)), max(1, round(placement.size[1] * zoom))))
+
+    def drop_placements(self):
+        """Removes every placed import from the canvas; their assets are freed once nothing shows them."""
+        for placement in self.placements:
+            self.canvas.delete(placement.item)
+            self.item_index.remove(placement.item)
+            self.assets.release(placement)
+        self.placements.clear()
+        self.placement_items.clear()
+        self.asset_photos.clear()
+
+    @staticmethod
+    def _composite_at(target, target_box, image, image_box):
+        """Alpha-composites image, placed at image_box in document space, onto target, which covers target_box."""
+        dx, dy = round(image_box[0]) - target_box[0], round(image_box[1]) - target_box[1]
+        if dx >= target.width or dy >= target.height or dx + image.width <= 0 or dy + image.height <= 0:
+            return
+        target.alpha_composite(image, (max(0, dx), max(0, dy)), (max(0, -dx), max(0, -dy)))
+
+    def rotate_canvas(self, angle):
+        self.begin_edit()
+        self.damage_all()
+        rotated_img = paint_ops.rotate_image(self.flatten_document(), angle)
         self._display_image_on_canvas(rotated_img)
+        self.end_edit()
         self.status_bar_message(f"Rotated {angle}°")
 
     def flip_canvas(self, direction):
-        self.history.append(self.get_canvas_image_data())
-        self.redo_stack.clear()
-        self.canvas_modified = True
-        current_img = self.get_canvas_image_data()
-        flipped_img = current_img.transpose(Image.FLIP_LEFT_RIGHT if direction == "horizontal" else Image.FLIP_TOP_BOTTOM)
-        self.canvas.delete("all")
+        self.begin_edit()
+        self.damage_all()
+        flipped_img = paint_ops.flip_image(self.flatten_document(), direction)
         self._display_image_on_canvas(flipped_img)
+        self.end_edit()
         self.status_bar_message(f"Flipped {direction}")
 
+    def filter_dialog(self, name):
+        """Filter parameters with a live preview on a small proxy; Apply filters the full canvas in the background."""
+        import paint_filters
+        label, parameters = paint_filters.FILTERS[name]
+        self.flatten_layers()
+        source = self.base_image.copy()
+        proxy, scale = paint_filters.make_proxy(source)
+        low_proxy, low_scale = paint_filters.make_proxy(proxy, paint_filters.PREVIEW_SIZE // 2)  # For slow machines
+        background = self.canvas.cget("bg")
+
+        dialog = tk.Toplevel(self.master)
+        dialog.title(label)
+        dialog.transient(self.master)
+        dialog.grab_set()
+        frame = ttk.Frame(dialog, padding=10)
+        frame.pack(fill=tk.BOTH, expand=True)
+        preview_label = tk.Label(frame, bg=background)
+        preview_label.grid(row=0, column=0, columnspan=2, padx=5, pady=5)
+        variables = {}
+        for row, (key, text, low, high, default) in enumerate(parameters, start=1):
+            ttk.Label(frame, text=f"{text}:").grid(row=row, column=0, padx=5, pady=5, sticky=tk.W)
+            variables[key] = tk.DoubleVar(value=default)
+            ttk.Scale(frame, from_=low, to=high, orient=tk.HORIZONTAL, length=200, variable=variables[key],
+                      command=lambda v: schedule_preview()).grid(row=row, column=1, padx=5, pady=5)
+        status = ttk.Label(frame, text="")
+        status.grid(row=len(parameters) + 1, column=0, columnspan=2, padx=5, pady=5)
+        cancel = threading.Event()
+        results = queue.Queue()
+        state = {"preview": None, "running": False}
+
+        def params():
+            return {key: var.get() for key, var in variables.items()}
+
+        def update_preview(full=False):
+            state["preview"] = None
+            if full and not dialog.winfo_exists():
+                return
+            if not full:
+                self.governor.interact("filter_preview")
+            if not full and self.governor.cheap("preview_resolution"):
+                image, image_scale = low_proxy, scale * low_scale
+                self.governor.defer("filter_preview", functools.partial(update_preview, full=True))
+            else:
+                image, image_scale = proxy, scale
+            filtered = paint_filters.apply_filter(image, name, paint_filters.scale_params(name, params(), image_scale))
+            if filtered.size != proxy.size:
+                filtered = filtered.resize(proxy.size, Image.Resampling.NEAREST)
+            shown = Image.new("RGBA", filtered.size, background)
+            shown.alpha_composite(filtered)
+            dialog.preview_photo = ImageTk.PhotoImage(shown)
+            preview_label.config(image=dialog.preview_photo)
+
+        def schedule_preview():
+            # Slider drags fire many events; only the last one within 50 ms is rendered
+            if state["preview"] is not None:
+                dialog.after_cancel(state["preview"])
+            state["preview"] = dialog.after(50, update_preview)
+
+        def apply():
+            state["running"] = True
+            apply_button.state(["disabled"])
+            chosen = params()
+
+            def work():
+                try:
+                    results.put(paint_filters.apply_tiled(source, name, chosen, cancel=cancel,
+                                                          progress=lambda done, total: results.put((done, total))))
+                except paint_filters.FilterCancelled:
+                    results.put(None)
+                except Exception as e:
+                    results.put(e)
+
+            threading.Thread(target=work, daemon=True).start()
+            status.config(text="Filtering...")
+            poll()
+
+        def poll():
+            while True:
+                try:
+                    item = results.get_nowait()
+                except queue.Empty:
+                    dialog.after(100, poll)
+                    return
+                if not isinstance(item, tuple):
+                    break
+                status.config(text=f"Filtering... {item[0]}/{item[1]} tiles")
+            dialog.destroy()
+            if item is None:
+                self.status_bar_message(f"{label} cancelled.")
+            elif isinstance(item, Exception):
+                messagebox.showerror("Filter Error", f"Error applying {label}: {item}")
+            else:
+                self.apply_filter_result(item, label)
+
+        def close():
+            if state["running"]:
+                cancel.set()  # poll() closes the dialog once the workers have stopped
+                status.config(text="Cancelling...")
+            else:
+                dialog.destroy()
+
+        buttons = ttk.Frame(frame)
+        buttons.grid(row=len(parameters) + 2, column=0, columnspan=2, pady=10)
+        apply_button = ttk.Button(buttons, text="Apply", command=apply)
+        apply_button.pack(side=tk.LEFT, padx=5)
+        ttk.Button(buttons, text="Cancel", command=close).pack(side=tk.LEFT, padx=5)
+        dialog.protocol("WM_DELETE_WINDOW", close)
+        update_preview(full=True)
+        dialog.wait_window(dialog)
+
+    def apply_filter_result(self, image, label):
+        """Swaps a filtered copy of the raster layer in as a single undo step."""
+        self.begin_edit()
+        self.flatten_layers()
+        self.damage_all()
+        self.base_image.paste(image)
+        self.end_edit()
+        self.status_bar_message(f"Applied {label}")
+
     def resize_canvas(self):
         dialog = tk.Toplevel(self.master)
         dialog.title("Resize Canvas")
@@ -546,24 +1181,25 @@ class PaintApp:
             if new_width <= 0 or new_height <= 0:
                 messagebox.showerror("Error", "Invalid dimensions.")
                 return
-            self.history.append(self.get_canvas_image_data())
-            self.redo_stack.clear()
-            self.canvas_modified = True
-            current_img = self.get_canvas_image_data()
-            resized_img = current_img.resize((new_width, new_height), Image.Resampling.LANCZOS)
+            self.begin_edit()
+            self.damage_all()
+            resized_img = paint_ops.resize_image(self.flatten_document(), new_width, new_height)
             self.canvas_width, self.canvas_height = new_width, new_height
             self.canvas.config(width=new_width, height=new_height)
             self._display_image_on_canvas(resized_img)
+            self.end_edit()
             dialog.destroy()
             self.status_bar_message(f"Resized to {new_width}x{new_height}")
         except ValueError:
             messagebox.showerror("Error", "Enter valid numbers.")
 
     def set_canvas_bg(self):
+        from tkinter import colorchooser
         color_code = colorchooser.askcolor(title="Choose Canvas Color", initialcolor=self.canvas.cget("bg"))
         if color_code[1]:
             self.themes["modern_dark"]["canvas_bg"] = color_code[1]
             self.canvas.config(bg=color_code[1])
+            self.dirty.add_all(skip=("display",))  # The background shows through the raster layer
             self.settings["canvas_bg"] = color_code[1]
             self.save_settings()
             self.canvas_modified = True
@@ -616,6 +1252,7 @@ class PaintApp:
 
     def zoom_wheel(self, event):
         if self.current_tool == "zoom" or (event.state & 0x4) or (event.state & 0x8):
+            self.governor.interact("zoom")
             factor = 1.1 if event.delta > 0 else 1/1.1
             self.apply_zoom(factor)
             self.zoom_var.set(f"{self.zoom_level*100:.0f}%")
@@ -627,6 +1264,21 @@ class PaintApp:
         center_y = self.canvas_height / 2
         self.canvas.scale("all", center_x, center_y, factor, factor)
         self.zoom_level = max(0.0, self.zoom_level * factor)  # Ensure zoom_level doesn't go negative
+        for obj in self.vector_layer:
+            self.draw_vector_object(obj)  # Re-render from the model so widths and fonts follow the zoom
+        previous, self.asset_photos = self.asset_photos, {}
+        for placement in self.placements:
+            key = self.placement_photo_key(placement)
+            if key in previous:
+                self.asset_photos[key] = previous[key]  # Still the right size; photos of other zooms go
+            self.draw_placement(placement)
+        self.reindex_items()
+        if self.governor.cheap("overlays"):
+            self.governor.defer("overlays", self.update_overlays)  # canvas.scale already moved the old ones
+        else:
+            self.update_overlays()
+
+    def update_overlays(self):
         self.update_gridlines()
         self.update_rulers()
 
@@ -642,14 +1294,13 @@ class PaintApp:
         new_height = max(100, self.master.winfo_height() - control_frame_height - status_bar_height - ruler_height - padding)
 
         if new_width > 0 and new_height > 0:
-            self.history.append(self.get_canvas_image_data())
-            self.redo_stack.clear()
-            self.canvas_modified = True
-            current_img = self.get_canvas_image_data()
-            resized_img = current_img.resize((new_width, new_height), Image.Resampling.LANCZOS)
+            self.begin_edit()
+            self.damage_all()
+            resized_img = paint_ops.resize_image(self.flatten_document(), new_width, new_height)
             self.canvas_width, self.canvas_height = new_width, new_height
             self.canvas.config(width=new_width, height=new_height)
             self._display_image_on_canvas(resized_img)
+            self.end_edit()
             self.status_bar_message(f"Fitted to screen: {new_width}x{new_height}")
         else:
             self.status_bar_message("Unable to fit to screen.")
@@ -658,11 +1309,10 @@ class PaintApp:
         self.start_x, self.start_y = event.x, event.y
         self.last_x, self.last_y = event.x, event.y
         self.active_item = None
+        self.stroke_builder = None
         
         if self.current_tool not in ["zoom", "pipette"]:
-            self.history.append(self.get_canvas_image_data())
-            self.redo_stack.clear()
-            self.canvas_modified = True
+            self.begin_edit()
 
         if self.current_tool == "text":
             self.create_text_input(event.x, event.y)
@@ -670,11 +1320,17 @@ class PaintApp:
             self.pick_color_from_canvas(event.x, event.y)
         elif self.current_tool == "fill" and self.fill_color:
             self.fill_area(event.x, event.y)  # Ensure fill_color is set
+        elif self.current_tool == "gradient":
+            self.start_gradient(event.x, event.y)
+        elif self.current_tool in ["brush", "pencil", "eraser"]:
+            self.stroke_builder = StrokeBuilder(event.x, event.y, self.settings.get("stroke_spacing", 2.0),
+                                                self.settings.get("stroke_tolerance", 0.75))
         elif self.current_tool == "image":
-            item = self.canvas.find_closest(event.x, event.y)
-            if item and "imported_image" in self.canvas.gettags(item[0]):
-                self.active_item = item[0]
-                self.status_bar_message("Moving imported image.")
+            for item in self.items_at(event.x, event.y):
+                if item in self.placement_items:
+                    self.active_item = item
+                    self.status_bar_message("Moving imported image.")
+                    break
         
         self.update_status_bar(event)
 
@@ -682,76 +1338,135 @@ class PaintApp:
         if self.last_x is None or self.last_y is None:
             return
 
-        if self.current_tool in ["brush", "pencil", "eraser"]:
-            style = tk.ROUND if self.brush_type == "round" else tk.BUTT
-            width = self.brush_size if self.current_tool != "pencil" else 1
-            color = self.current_color if self.current_tool != "eraser" else self.canvas.cget("bg")
-            self.canvas.create_line(self.last_x, self.last_y, event.x, event.y,
-                                  width=width, fill=color, capstyle=style, smooth=tk.TRUE)
-            self.canvas_modified = True  # Mark as modified when drawing
+        if self.current_tool in ["brush", "pencil", "eraser"] and self.stroke_builder:
+            # Draw through evenly spaced points so fast strokes stay smooth; the live
+            # segments are replaced by one simplified stroke on mouse up
+            previous = self.stroke_builder.points[-1]
+            fresh = self.stroke_builder.add(event.x, event.y)
+            if fresh:
+                style, width, color = self.stroke_style()
+                self.canvas.create_line(previous, *fresh, width=width, fill=color,
+                                        capstyle=style, smooth=tk.TRUE, tags="temp_stroke")
+                self.canvas_modified = True  # Mark as modified when drawing
         elif self.current_tool == "shape" and self.current_shape:
-            self.canvas.delete("temp_shape_preview")
-            self.canvas.delete("temp_fill_preview")
-            x1, y1 = self.start_x, self.start_y
-            x2, y2 = event.x, event.y
-            outline_color = self.current_color
-            fill_color_preview = self.fill_color if self.fill_var.get() else ""
-            if self.current_shape == "line":
-                self.canvas.create_line(x1, y1, x2, y2, width=self.brush_size, fill=outline_color, dash=(2, 2), tags="temp_shape_preview")
-            elif self.current_shape == "rectangle":
-                self.canvas.create_rectangle(x1, y1, x2, y2, outline=outline_color, width=self.brush_size, dash=(2, 2), tags="temp_shape_preview")
-                if fill_color_preview:
-                    self.canvas.create_rectangle(x1, y1, x2, y2, fill=fill_color_preview, outline="", tags="temp_fill_preview")
-            elif self.current_shape == "circle":
-                self.canvas.create_oval(x1, y1, x2, y2, outline=outline_color, width=self.brush_size, dash=(2, 2), tags="temp_shape_preview")
-                if fill_color_preview:
-                    self.canvas.create_oval(x1, y1, x2, y2, fill=fill_color_preview, outline="", tags="temp_fill_preview")
-            elif self.current_shape == "triangle":
-                mid_x = (x1 + x2) / 2
-                points = [x1, y2, x2, y2, mid_x, y1]
-                self.canvas.create_polygon(points, outline=outline_color, width=self.brush_size, dash=(2, 2), tags="temp_shape_preview")
-                if fill_color_preview:
-                    self.canvas.create_polygon(points, fill=fill_color_preview, outline="", tags="temp_fill_preview")
-            elif self.current_shape == "star":
-                points = self.calculate_star_points(x1, y1, x2, y2)
-                self.canvas.create_polygon(points, outline=outline_color, width=self.brush_size, dash=(2, 2), tags="temp_shape_preview")
-                if fill_color_preview:
-                    self.canvas.create_polygon(points, fill=fill_color_preview, outline="", tags="temp_fill_preview")
+            self.governor.interact("shape")
+            self.update_shape_preview(self.start_x, self.start_y, event.x, event.y)
+        elif self.current_tool == "gradient" and self.gradient_drag:
+            self.governor.interact("gradient")
+            end = tuple(self.canvas_to_document([event.x, event.y]))
+            if self.governor.cheap("preview_resolution"):
+                self.paint_gradient(end, full=False)
+                self.governor.defer("gradient", functools.partial(self.paint_gradient, end))
+            else:
+                self.paint_gradient(end)
         elif self.current_tool == "image" and self.active_item:
             dx = event.x - self.last_x
             dy = event.y - self.last_y
+            placement = self.placement_items[self.active_item]
+            zoom = self.zoom_level or 1.0
+            self.damage(placement.box(), raster=False)
+            placement.x += dx / zoom
+            placement.y += dy / zoom
+            self.damage(placement.box(), raster=False)
             self.canvas.move(self.active_item, dx, dy)
+            self.item_index.move(self.active_item, dx, dy)
             self.canvas_modified = True  # Mark as modified when moving image
 
         self.last_x, self.last_y = event.x, event.y
         self.update_status_bar(event)
 
     def on_mouse_up(self, event):
-        self.canvas.delete("temp_shape_preview")
-        self.canvas.delete("temp_fill_preview")
+        self.clear_shape_preview()
         if self.current_tool == "shape" and self.current_shape:
             x1, y1 = self.start_x, self.start_y
             x2, y2 = event.x, event.y
             outline_color = self.current_color
             fill_color_final = self.fill_color if self.fill_var.get() else ""
-            if self.current_shape == "line":
-                self.canvas.create_line(x1, y1, x2, y2, width=self.brush_size, fill=outline_color, capstyle=tk.ROUND)
-            elif self.current_shape == "rectangle":
-                self.canvas.create_rectangle(x1, y1, x2, y2, outline=outline_color, width=self.brush_size, fill=fill_color_final)
-            elif self.current_shape == "circle":
-                self.canvas.create_oval(x1, y1, x2, y2, outline=outline_color, width=self.brush_size, fill=fill_color_final)
-            elif self.current_shape == "triangle":
-                mid_x = (x1 + x2) / 2
-                points = [x1, y2, x2, y2, mid_x, y1]
-                self.canvas.create_polygon(points, outline=outline_color, width=self.brush_size, fill=fill_color_final)
-            elif self.current_shape == "star":
-                points = self.calculate_star_points(x1, y1, x2, y2)
-                self.canvas.create_polygon(points, outline=outline_color, width=self.brush_size, fill=fill_color_final)
+            points = self.canvas_to_document(self.shape_points(self.current_shape, x1, y1, x2, y2))
+            if fill_color_final and self.fill_pattern is not None and self.current_shape != "line":
+                self.fill_shape_with_pattern(self.current_shape, points)
+                fill_color_final = ""  # The outline stays an editable shape above the pattern pixels
+            self.add_vector_object(VectorShape(self.current_shape, points, outline=outline_color,
+                                               fill=fill_color_final, width=self.brush_size))
             self.canvas_modified = True  # Mark as modified when shape is drawn
+        elif self.stroke_builder:
+            self.finish_stroke()
+        elif self.gradient_drag:
+            self.finish_gradient(tuple(self.canvas_to_document([event.x, event.y])))
+        self.end_edit()
         self.last_x, self.last_y = None, None
         self.active_item = None
         self.update_status_bar(event)
 
+    def stroke_style(self):
+        """(capstyle, width, color) of a brush, pencil or eraser stroke with the current settings."""
+        style = {"round": tk.ROUND, "square": tk.PROJECTING}.get(self.brush_type, tk.BUTT)
+        width = self.brush_size if self.current_tool != "pencil" else 1
+        color = self.current_color if self.current_tool != "eraser" else self.canvas.cget("bg")
+        return style, width, color
+
+    def finish_stroke(self):
+        """Swaps the live stroke segments for one retained stroke holding the simplified points."""
+        builder, self.stroke_builder = self.stroke_builder, None
+        self.canvas.delete("temp_stroke")
+        points = builder.finish()
+        if len(points) < 2:
+            return
+        style, width, color = self.stroke_style()
+        flat = self.canvas_to_document([v for point in points for v in point])
+        self.add_vector_object(VectorShape("stroke", flat, outline=color, width=width, cap=style))
+
+    def shape_points(self, shape, x1, y1, x2, y2):
+        """Flat coordinate list for a shape dragged from (x1, y1) to (x2, y2)."""
+        if shape == "triangle":
+            points = []
+            for ux, uy in TRIANGLE_UNIT_VERTICES:
+                points.append(x1 + (x2 - x1) * ux)
+                points.append(y1 + (y2 - y1) * uy)
+            return points
+        if shape == "star":
+            return self.calculate_star_points(x1, y1, x2, y2)
+        return [x1, y1, x2, y2]
+
+    def update_shape_preview(self, x1, y1, x2, y2):
+        """Rubber-bands the current shape. Items are created on the first drag event and only moved after that."""
+        points = self.shape_points(self.current_shape, x1, y1, x2, y2)
+        if self.preview_outline_item is not None:
+            self.canvas.coords(self.preview_outline_item, *points)
+            if self.preview_fill_item is None:
+                return
+            if self.governor.cheap("overlays"):
+                # The fill is the costly part to redraw; it comes back once the drag pauses
+                self.canvas.itemconfig(self.preview_fill_item, state=tk.HIDDEN)
+                self.governor.defer("shape_fill", functools.partial(self.show_fill_preview, points))
+            else:
+                self.show_fill_preview(points)
+            return
+
+        outline_color = self.current_color
+        fill_color_preview = self.fill_color if self.fill_var.get() else ""
+        if self.current_shape == "line":
+            self.preview_outline_item = self.canvas.create_line(points, width=self.brush_size, fill=outline_color, dash=(2, 2), tags="temp_shape_preview")
+            return
+        create_item = {"rectangle": self.canvas.create_rectangle,
+                       "circle": self.canvas.create_oval,
+                       "triangle": self.canvas.create_polygon,
+                       "star": self.canvas.create_polygon}[self.current_shape]
+        self.preview_outline_item = create_item(points, outline=outline_color, fill="", width=self.brush_size, dash=(2, 2), tags="temp_shape_preview")
+        if fill_color_preview:
+            self.preview_fill_item = create_item(points, fill=fill_color_preview, outline="", tags="temp_fill_preview")
+
+    def show_fill_preview(self, points):
+        if self.preview_fill_item is not None:
+            self.canvas.coords(self.preview_fill_item, *points)
+            self.canvas.itemconfig(self.preview_fill_item, state=tk.NORMAL)
+
+    def clear_shape_preview(self):
+        self.canvas.delete("temp_shape_preview")
+        self.canvas.delete("temp_fill_preview")
+        self.preview_outline_item = None
+        self.preview_fill_item = None
+
     def on_right_click(self, event):
         if self.current_tool == "zoom":
             self.apply_zoom(1/1.2)
@@ -767,21 +1482,20 @@ class PaintApp:
 
     def copy_to_clipboard(self, x, y):
         self.clipboard = self.get_canvas_image_data()
-        self.history.append(self.get_canvas_image_data())
-        self.redo_stack.clear()
         self.canvas_modified = True
 
     def paste_from_clipboard(self, x, y):
         if self.clipboard:
-            self.history.append(self.get_canvas_image_data())
-            self.redo_stack.clear()
-            self.canvas_modified = True
-            pasted_img = self.clipboard.copy()
-            pasted_tk_image = ImageTk.PhotoImage(pasted_img)
-            self.canvas.create_image(x, y, image=pasted_tk_image, anchor=tk.NW)
+            self.begin_edit()
+            self.flatten_layers()  # The pasted pixels land on top of everything drawn so far
+            x, y = (round(v) for v in self.canvas_to_document([x, y]))
+            self.damage((x, y, x + self.clipboard.width, y + self.clipboard.height))
+            self.base_image.paste(self.clipboard.convert("RGBA"), (x, y))
+            self.end_edit()
             self.status_bar_message("Pasted image")
 
     def create_text_input(self, x, y):
+        from tkinter import simpledialog
         text_input = simpledialog.askstring("Text Input", "Enter text:")
         if text_input:
             font_dialog = tk.Toplevel(self.master)
@@ -799,17 +1513,16 @@ class PaintApp:
 
     def _apply_text(self, x, y, text, size, dialog):
         self.font_size = size
-        self.canvas.create_text(x, y, text=text, fill=self.current_color,
-                              font=(self.font_name, self.font_size, "bold"), anchor=tk.NW)
+        self.add_vector_object(VectorShape("text", self.canvas_to_document([x, y]), outline=self.current_color,
+                                           text=text, font_name=self.font_name, font_size=self.font_size))
         dialog.destroy()
         self.canvas_modified = True
         self.status_bar_message(f"Text added at ({x}, {y})")
 
     def pick_color_from_canvas(self, x, y):
         try:
-            img = self.get_canvas_image_data().convert("RGB")
-            img_x = int(x / self.zoom_level)
-            img_y = int(y / self.zoom_level)
+            img = self.document_image()
+            img_x, img_y = (int(v) for v in self.canvas_to_document([x, y]))
             if 0 <= img_x < img.width and 0 <= img_y < img.height:
                 rgb_color = img.getpixel((img_x, img_y))
                 hex_color = '#%02x%02x%02x' % rgb_color
@@ -823,48 +1536,464 @@ class PaintApp:
         if not self.fill_color:
             self.status_bar_message("Enable 'Fill' to use this tool.")
             return
-        self.history.append(self.get_canvas_image_data())
-        self.redo_stack.clear()
-        self.canvas_modified = True
-        img = self.get_canvas_image_data().convert("RGB")
-        pixels = img.load()
-        start_pixel_x = int(start_x / self.zoom_level)
-        start_pixel_y = int(start_y / self.zoom_level)
+        self.flatten_layers()  # The fill follows what is visible, so shapes become pixels first
+        img = self.document_image()
+        start_pixel_x, start_pixel_y = (int(v) for v in self.canvas_to_document([start_x, start_y]))
         if not (0 <= start_pixel_x < img.width and 0 <= start_pixel_y < img.height):
             self.status_bar_message("Click inside canvas.")
             return
-        target_color = pixels[start_pixel_x, start_pixel_y]
-        replacement_color_rgb = tuple(int(self.fill_color.lstrip('#')[i:i+2], 16) for i in (0, 2, 4))
-        if target_color == replacement_color_rgb:
+        if self.fill_pattern is None and img.getpixel((start_pixel_x, start_pixel_y)) == paint_ops.parse_color(self.fill_color):
             self.status_bar_message("Already filled with this color.")
             return
-        q = [(start_pixel_x, start_pixel_y)]
-        visited = set()
-        while q:
-            x, y = q.pop(0)
-            if (x, y) in visited or not (0 <= x < img.width and 0 <= y < img.height):
-                continue
-            visited.add((x, y))
-            if pixels[x, y] == target_color:
-                pixels[x, y] = replacement_color_rgb
-                q.extend([(x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)])
-        self.canvas.delete("all")
-        self._display_image_on_canvas(img)
+        box, mask = self.same_color_region(img, start_pixel_x, start_pixel_y)
+        self.damage(box)
+        if self.fill_pattern is not None:
+            self.patterns().fill(self.base_image, self.fill_pattern, box, mask)
+        else:
+            self.base_image.paste(paint_ops.parse_color(self.fill_color) + (255,), box, mask)
         self.status_bar_message("Area filled.")
 
+    def fill_shape_with_pattern(self, kind, points):
+        """Paints the inside of a shape (document points) with the fill pattern, into the raster layer."""
+        self.flatten_layers()  # Like the bucket, the pattern lands on top of everything drawn so far
+        (x, y), coverage = VectorShape(kind, points, outline="", fill="#ffffff", width=self.brush_size).rasterize()
+        box = self.damage((x, y, x + coverage.width, y + coverage.height))
+        if box is None:
+            return
+        mask = coverage.getchannel("A").crop((box[0] - x, box[1] - y, box[2] - x, box[3] - y))
+        self.patterns().fill(self.base_image, self.fill_pattern, box, mask)
+
+    def same_color_region(self, img, x, y):
+        """Box and mask of the same-color region around (x, y) of the flattened document img."""
+        if self.settings.get("fill_region_index", True):
+            return self.fill_region(img, x, y)
+        return paint_ops.region_mask(img, x, y)
+
+    def fill_region(self, img, x, y):
+        """Box and mask of the same-color region around (x, y), from the cached region index.
+
+        The index is labelled once and afterwards relabelled only in tiles that were
+        damaged since the last fill, so repeated fills skip the flood traversal.
+        """
+        if self.region_index is None:
+            from paint_regions import RegionIndex
+            self.region_index = RegionIndex()
+            self.dirty.register("regions")  # Starts fully dirty, so the first fill labels everything
+        self.region_index.update(img, self.dirty.take("regions"))
+        box, mask = self.region_index.region(x, y)
+        return box, Image.fromarray(mask)  # A bool array becomes a mode "1" mask
+
+    def gradient_stops(self):
+        """Color stops from the Gradient tab; left blank, the current color fading to transparent."""
+        from paint_gradient import parse_stops
+        text = self.gradient_stops_var.get().strip()
+        if text:
+            return parse_stops(text)
+        rgb = paint_ops.parse_color(self.current_color)
+        return [(0.0, rgb + (255,)), (1.0, rgb + (0,))]
+
+    def start_gradient(self, x, y):
+        """Picks the pixels a gradient drag will fill: the same-color region under (x, y), as the fill tool does."""
+        self.flatten_layers()
+        img = self.document_image()
+        pixel_x, pixel_y = (int(v) for v in self.canvas_to_document([x, y]))
+        if not (0 <= pixel_x < img.width and 0 <= pixel_y < img.height):
+            self.status_bar_message("Click inside canvas.")
+            return
+        try:
+            stops = self.gradient_stops()
+        except ValueError as e:
+            self.status_bar_message(f"Gradient stops: {e}")
+            return
+        box, mask = self.same_color_region(img, pixel_x, pixel_y)
+        self.gradient_drag = {"box": box, "mask": mask, "stops": stops,
+                              "start": tuple(self.canvas_to_document([x, y])), "damaged": False}
+
+    def paint_gradient(self, end, full=True):
+        """Renders the dragged gradient into its region of the raster layer.
+
+        Only the region's bounding box is computed. Without full it is rendered at
+        half resolution and undithered, for drag frames that run slow.
+        """
+        drag = self.gradient_drag
+        if drag is None:
+            return  # A deferred refinement that arrived after the drag ended
+        from paint_gradient import render_gradient
+        box, start, kind = drag["box"], drag["start"], self.gradient_kind_var.get()
+        if full:
+            image = render_gradient(kind, box, start, end, drag["stops"], self.gradient_dither_var.get())
+        else:
+            half = (box[0] // 2, box[1] // 2, -(-box[2] // 2), -(-box[3] // 2))
+            image = render_gradient(kind, half, (start[0] / 2, start[1] / 2), (end[0] / 2, end[1] / 2),
+                                    drag["stops"], dither=False)
+            image = image.resize((image.width * 2, image.height * 2), Image.Resampling.NEAREST)
+            dx, dy = box[0] - half[0] * 2, box[1] - half[1] * 2
+            image = image.crop((dx, dy, dx + box[2] - box[0], dy + box[3] - box[1]))
+        if not drag["damaged"]:
+            self.damage(box)  # Captures the undo step once, before the first frame
+            drag["damaged"] = True
+        else:
+            # Every consumer hears of each frame; the histogram or document cache may have read the last one
+            self.dirty.add(box)
+            self.schedule_refresh()
+        self.base_image.paste(image, box[:2], drag["mask"])
+
+    def finish_gradient(self, end):
+        if end != self.gradient_drag["start"]:
+            self.paint_gradient(end)
+            self.status_bar_message("Gradient applied.")
+        self.gradient_drag = None
+
+    # --- Color Statistics ---
+    def update_color_statistics(self):
+        """Recounts the document tiles damaged since the last call. Returns False if there were none."""
+        if self.color_stats is None:
+            from paint_histogram import ColorStatistics
+            self.color_stats = ColorStatistics()
+            self.dirty.register("histogram")  # Starts fully dirty, so the first update counts everything
+        if not self.dirty.pending("histogram"):
+            return False
+        self.color_stats.update(self.document_image(), self.dirty.take("histogram"))
+        return True
+
+    def show_color_statistics(self):
+        """A panel with the R, G and B histograms and the dominant colors, following edits as they happen."""
+        from paint_histogram import UPDATE_MS
+        if self.stats_panel is not None and self.stats_panel.winfo_exists():
+            self.stats_panel.lift()
+            return
+        theme = self.themes[self.current_theme]
+        dialog = self.stats_panel = tk.Toplevel(self.master)
+        dialog.title("Color Statistics")
+        dialog.transient(self.master)
+        frame = ttk.Frame(dialog, padding=10)
+        frame.pack(fill=tk.BOTH, expand=True)
+        band = 60  # Height of each channel's plot
+        plot = tk.Canvas(frame, width=256, height=band * 3, bg=theme["control_frame_bg"], highlightthickness=0)
+        plot.pack(pady=5)
+        lines = [plot.create_line(0, 0, 0, 0, fill=color) for color in ("#ff4040", "#40d040", "#4080ff")]
+        swatch_frame = ttk.Frame(frame)
+        swatch_frame.pack(pady=5)
+        swatches = []
+        for i in range(8):
+            swatch = tk.Label(swatch_frame, width=3, height=1, relief="ridge", bd=1)
+            swatch.grid(row=0, column=i, padx=2)
+            share = ttk.Label(swatch_frame, text="", width=6, anchor=tk.CENTER)
+            share.grid(row=1, column=i, padx=2)
+            swatches.append((swatch, share))
+        summary = ttk.Label(frame, text="")
+        summary.pack(pady=5)
+        x = list(range(256))
+
+        def redraw():
+            stats = self.color_stats
+            heights = stats.channels ** 0.5  # Square root, so a large flat background leaves the rest visible
+            peak = heights.max() or 1
+            for channel, line in enumerate(lines):
+                bottom = band * (channel + 1)
+                ys = (bottom - heights[channel] * ((band - 2) / peak)).tolist()
+                plot.coords(line, *[v for point in zip(x, ys) for v in point])
+            colors = stats.dominant_colors(len(swatches))
+            for i, (swatch, share) in enumerate(swatches):
+                if i < len(colors):
+                    swatch.config(bg=colors[i][0])
+                    share.config(text=f"{colors[i][1]:.1%}")
+                else:
+                    swatch.config(bg=theme["control_frame_bg"])
+                    share.config(text="")
+            r, g, b = stats.mean()
+            summary.config(text=f"Mean R {r:.0f}  G {g:.0f}  B {b:.0f}  |  {stats.pixels} pixels")
+
+        def refresh():
+            if not dialog.winfo_exists():
+                return
+            if self.update_color_statistics():
+                redraw()
+            dialog.after(UPDATE_MS, refresh)
+
+        self.update_color_statistics()
+        redraw()
+        dialog.after(UPDATE_MS, refresh)
+
+    # --- Animation ---
+    def ensure_timeline(self):
+        """The animation timeline, started from the current canvas as its first frame if there is none yet."""
+        if self.timeline is None:
+            from paint_frames import FrameTimeline
+            self.flatten_layers()
+            self.timeline = FrameTimeline.from_image(self.base_image)
+            self.timeline[0].duration = self.frame_duration()
+            self.frame_index = 0
+            self.dirty.register("frames")
+            self.dirty.take("frames")  # The frame was just stored whole
+        return self.timeline
+
+    def sync_frame(self):
+        """Stores the current frame back into the timeline; only tiles damaged since it was shown are re-read.
+
+        Shapes and imports are flattened first, as they are not kept per frame.
+        """
+        self.end_edit()
+        self.flatten_layers()
+        frame = self.timeline[self.frame_index]
+        self.timeline.store(self.frame_index, self.base_image, self.dirty.take("frames"))
+        frame.history, frame.redo = self.history, self.redo_stack
+
+    def show_frame(self, index):
+        self.sync_frame()
+        self._load_frame(self.timeline[self.frame_index], index)
+
+    def _load_frame(self, shown, index):
+        """Swaps the raster from frame shown to frame index, rewriting only the tiles the two do not share."""
+        from paint_frames import changed_tiles
+        target = self.timeline[index]
+        self.frame_index = index
+        if target.size != shown.size:
+            self.canvas_width, self.canvas_height = target.size
+            self._display_image_on_canvas(target.image())
+        else:
+            for box in changed_tiles(shown, target):
+                self.dirty.add(box)
+                tile = target.tiles.get(box[:2])
+                self.base_image.paste(tile if tile is not None else (0, 0, 0, 0), box)
+            self.schedule_refresh()
+        self.dirty.take("frames")  # Loading a frame is not an edit of it
+        self.history, self.redo_stack = target.history, target.redo  # Each frame has its own undo
+        self.update_frame_controls()
+        self.update_onion_skin()
+
+    def step_frame(self, delta):
+        timeline = self.ensure_timeline()
+        if len(timeline) > 1:
+            self.show_frame((self.frame_index + delta) % len(timeline))
+        else:
+            self.status_bar_message("Add a frame to start an animation.")
+
+    def add_frame(self):
+        """Inserts a copy of the current frame after it and shows it; the two share every tile until edited."""
+        self.ensure_timeline()
+        self.sync_frame()
+        self.show_frame(self.timeline.duplicate(self.frame_index))
+        self.status_bar_message(f"Added frame {self.frame_index + 1}")
+
+    def delete_frame(self):
+        if self.timeline is None or len(self.timeline) < 2:
+            self.status_bar_message("An animation needs at least one frame.")
+            return
+        self.sync_frame()
+        removed = self.timeline[self.frame_index]
+        self.timeline.remove(self.frame_index)
+        for step in removed.history + removed.redo:
+            step.release()
+        self._load_frame(removed, min(self.frame_index, len(self.timeline) - 1))
+        self.status_bar_message(f"Deleted frame; now on frame {self.frame_index + 1}")
+
+    def frame_duration(self):
+        try:
+            return max(10, int(self.frame_duration_var.get()))
+        except (tk.TclError, ValueError):
+            return 100
+
+    def change_frame_duration(self):
+        if self.timeline is not None:
+            self.timeline[self.frame_index].duration = self.frame_duration()
+
+    def update_frame_controls(self):
+        self.frame_label_var.set(f"Frame {self.frame_index + 1}/{len(self.timeline)}")
+        self.frame_duration_var.set(self.timeline[self.frame_index].duration)
+
+    def update_onion_skin(self):
+        """Shows the previous frame faintly over the current one, scaled up from its cached small copy."""
+        from paint_frames import ONION_OPACITY
+        if self.onion_item is not None:
+            self.canvas.delete(self.onion_item)
+            self.onion_item = self.onion_photo = None
+        if not self.onion_var.get() or self.timeline is None or self.frame_index == 0:
+            return
+        overlay = self.timeline[self.frame_index - 1].thumbnail().resize(self.base_image.size, Image.Resampling.BILINEAR)
+        overlay.putalpha(overlay.getchannel("A").point(lambda v: round(v * ONION_OPACITY)))
+        self.onion_photo = ImageTk.PhotoImage(overlay)
+        self.onion_item = self.canvas.create_image(*self.canvas.coords(self.canvas_photo_item), image=self.onion_photo,
+                                                   anchor=tk.NW, tags="onion_skin")
+        self.canvas.tag_raise(self.onion_item, self.canvas_photo_item)  # Right above the raster, under the shapes
+
+    def export_animation(self):
+        """Writes the frames as an animated GIF, PNG or WebP in the background."""
+        from tkinter import filedialog
+        from paint_frames import export_animation
+        timeline = self.ensure_timeline()
+        self.sync_frame()
+        file_path = filedialog.asksaveasfilename(defaultextension=".gif",
+                                                 filetypes=[("Animated GIF", "*.gif"), ("Animated PNG", "*.png"),
+                                                            ("Animated WebP", "*.webp")])
+        if not file_path:
+            self.status_bar_message("Export cancelled.")
+            return
+        snapshot = timeline.snapshot()
+
+        def done(_):
+            self.status_bar_message(f"Exported {len(snapshot)} frames to {os.path.basename(file_path)}")
+
+        def failed(e):
+            messagebox.showerror("Export Error", f"Error exporting animation: {e}")
+
+        self.scheduler.submit(export_animation, snapshot, file_path, self.canvas.cget("bg"),
+                              name="export animation", on_done=done, on_error=failed)
+        self.status_bar_message("Exporting animation...")
+
+    def canvas_to_document(self, points):
+        """Maps flat canvas coordinates to document coordinates (zoom 1.0), inverting apply_zoom."""
+        zoom = self.zoom_level or 1.0
+        center = (self.canvas_width / 2, self.canvas_height / 2)
+        return [(v - center[i % 2]) / zoom + center[i % 2] for i, v in enumerate(points)]
+
+    def document_to_canvas(self, points):
+        zoom = self.zoom_level or 1.0
+        center = (self.canvas_width / 2, self.canvas_height / 2)
+        return [(v - center[i % 2]) * zoom + center[i % 2] for i, v in enumerate(points)]
+
+    def add_vector_object(self, obj):
+        self.damage(obj.pixel_box(), raster=False)
+        self.vector_layer.add(obj)
+        self.draw_vector_object(obj)
+        return obj
+
+    def draw_vector_object(self, obj):
+        """Creates or updates the canvas item that shows a vector object at the current zoom."""
+        points = self.document_to_canvas(obj.points)
+        zoom = self.zoom_level or 1.0
+        width = max(1, obj.width * zoom)
+        if obj.item is not None:
+            self.canvas.coords(obj.item, *points)
+            if obj.kind == "text":
+                self.text_photos[obj.item] = self.text_photo(obj, zoom)
+                self.canvas.itemconfig(obj.item, image=self.text_photos[obj.item])
+            elif obj.kind in ("line", "stroke"):
+                self.canvas.itemconfig(obj.item, fill=obj.outline, width=width)
+            else:
+                self.canvas.itemconfig(obj.item, outline=obj.outline, fill=obj.fill, width=width)
+        elif obj.kind == "text":
+            # Text is shown as its Pillow raster, so the screen and saved files match on every machine
+            photo = self.text_photo(obj, zoom)
+            item = self.canvas.create_image(points, image=photo, anchor=tk.NW)
+            self.text_photos[item] = photo
+            self.vector_layer.bind_item(obj, item)
+        elif obj.kind == "line":
+            self.vector_layer.bind_item(obj, self.canvas.create_line(points, width=width, fill=obj.outline, capstyle=tk.ROUND))
+        elif obj.kind == "stroke":
+            self.vector_layer.bind_item(obj, self.canvas.create_line(points, width=width, fill=obj.outline,
+                                                                     capstyle=obj.cap, joinstyle=tk.ROUND, smooth=tk.TRUE))
+        else:
+            create_item = {"rectangle": self.canvas.create_rectangle,
+                           "circle": self.canvas.create_oval}.get(obj.kind, self.canvas.create_polygon)
+            self.vector_layer.bind_item(obj, create_item(points, outline=obj.outline, width=width, fill=obj.fill))
+        self.index_item(obj.item)
+
+    def text_photo(self, obj, zoom):
+        """PhotoImage of a text object's cached glyph run, shared by every label with the same look."""
+        key = (obj.text, obj.font_name, max(1, round(obj.font_size * zoom)), obj.outline)
+        photo = self.text_photo_cache.get(key)
+        if photo is None and self.governor.cheap("nearest_zoom"):
+            # Mid-spin: stretch the 100% glyph run rather than load the font at yet another size
+            run = render_text(obj.text, obj.font_name, obj.font_size, obj.outline)
+            self.governor.defer("text", self.redraw_text_objects)
+            return ImageTk.PhotoImage(run.resize((max(1, round(run.width * zoom)), max(1, round(run.height * zoom))),
+                                                 Image.Resampling.NEAREST))
+        if photo is None:
+            photo = ImageTk.PhotoImage(render_text(*key))
+            self.text_photo_cache[key] = photo
+            if len(self.text_photo_cache) > 128:
+                self.text_photo_cache.popitem(last=False)
+        else:
+            self.text_photo_cache.move_to_end(key)
+        return photo
+
+    def redraw_text_objects(self):
+        for obj in self.vector_layer:
+            if obj.kind == "text":
+                self.draw_vector_object(obj)
+
+    def edit_vector_object(self, obj, points=None, **style):
+        """Changes a retained shape's geometry (document coordinates) and/or style and redraws it in place."""
+        changed = obj.copy()
+        if points is not None:
+            changed.set_geometry(points)
+        if style:
+            changed.set_style(**style)
+        self.damage(obj.pixel_box(), raster=False)
+        self.damage(changed.pixel_box(), raster=False)
+        if points is not None:
+            obj.set_geometry(points)
+        if style:
+            obj.set_style(**style)
+        self.draw_vector_object(obj)
+        self.canvas_modified = True
+
+    def export_svg(self):
+        from tkinter import filedialog
+        file_path = filedialog.asksaveasfilename(defaultextension=".svg", filetypes=[("SVG files", "*.svg"), ("All files", "*.*")], initialfile="my_artwork.svg")
+        if not file_path:
+            self.status_bar_message("Export cancelled.")
+            return
+        try:
+            self.finish_restore()
+            svg = self.vector_layer.to_svg(self.canvas_width, self.canvas_height,
+                                           background=self.canvas.cget("bg"),
+                                           base_image=self.base_image if self.base_image.getbbox() else None)
+            with open(file_path, "w", encoding="utf-8") as f:
+                f.write(svg)
+            self.status_bar_message(f"Exported {len(self.vector_layer)} shapes to {os.path.basename(file_path)}")
+        except Exception as e:
+            messagebox.showerror("Export Error", f"Error exporting SVG: {e}")
+
+    def index_item(self, item):
+        """Registers a canvas item's current bounding box in the spatial index and returns the item."""
+        bbox = self.canvas.bbox(item)
+        if bbox:
+            self.item_index.insert(item, bbox)
+        return item
+
+    def reindex_items(self):
+        """Refreshes every indexed bbox after a canvas-wide transform such as zoom."""
+        for item in self.item_index.items():
+            bbox = self.canvas.bbox(item)
+            if bbox:
+                self.item_index.insert(item, bbox)
+            else:
+                self.item_index.remove(item)
+
+    def items_at(self, x, y):
+        """Drawn items under a canvas point, topmost first."""
+        return list(reversed(self.item_index.query_point(x, y)))
+
+    def items_in_rect(self, x1, y1, x2, y2):
+        """Drawn items whose bounding box intersects a canvas rectangle, bottom to top."""
+        return self.item_index.query_rect((x1, y1, x2, y2))
+
+    def layers_in_region(self, box):
+        """(shapes, placed imports) whose canvas items may cover a document rectangle, each bottom to top.
+
+        Answered from the spatial index, so a small region never walks every object.
+        """
+        x1, y1, x2, y2 = self.document_to_canvas(box)
+        pad = 2  # Tk's bboxes and the rasters round stroke edges differently
+        shapes, placements = [], []
+        for item in self.items_in_rect(x1 - pad, y1 - pad, x2 + pad, y2 + pad):
+            obj = self.vector_layer.find_by_item(item)
+            if obj is not None:
+                shapes.append(obj)
+            elif item in self.placement_items:
+                placements.append(self.placement_items[item])
+        return shapes, placements
+
     def calculate_star_points(self, x1, y1, x2, y2, num_points=5):
         cx = (x1 + x2) / 2
         cy = (y1 + y2) / 2
         outer_radius = max(abs(x2 - x1), abs(y2 - y1)) / 2 or 5
-        inner_radius = outer_radius * 0.4
         points = []
-        for i in range(num_points * 2):
-            radius = outer_radius if i % 2 == 0 else inner_radius
-            angle = math.pi / num_points * i - math.pi / 2
-            x = cx + radius * math.cos(angle)
-            y = cy + radius * math.sin(angle)
-            points.append(x)
-            points.append(y)
+        for ux, uy in unit_star_vertices(num_points):
+            points.append(cx + outer_radius * ux)
+            points.append(cy + outer_radius * uy)
         return points
 
     def update_status_bar(self, event):
@@ -877,17 +2006,160 @@ class PaintApp:
         self.status_bar.config(text=message)
         self.master.after(2000, lambda: self.update_status_bar(None))
 
+    def report_startup_time(self, process_start, exit_after=True):
+        """Prints the time from process_start to the first interactive frame, with a per-phase breakdown."""
+        def report():
+            self.master.update_idletasks()
+            total = time.perf_counter() - process_start
+            phases = ", ".join(f"{name} {seconds * 1000:.1f} ms ({seconds / total:.0%})"
+                               for name, seconds in self.startup_timings.items())
+            print(f"Startup: {total * 1000:.1f} ms to first interactive frame [{phases}]")
+            if exit_after:
+                self.master.destroy()
+        # Timers fire once mainloop is running; the idle callback then runs after the initial redraw.
+        self.master.after(0, lambda: self.master.after_idle(report))
+
     def on_closing(self):
         if self.canvas_modified:
             response = messagebox.askyesnocancel("Save Changes?", "Unsaved changes. Save?")
             if response is True:
                 self.save_canvas()
                 if not self.canvas_modified:
-                    self.master.destroy()
+                    self.close_window()
             elif response is False:
-                self.master.destroy()
+                self.close_window()
+        else:
+            self.close_window()
+
+    def close_window(self):
+        self.scheduler.shutdown()
+        if self.settings.get("restore_workspace", True):
+            try:
+                self.save_workspace()
+            except Exception as e:
+                print(f"Error saving workspace: {e}")
+        self.master.destroy()
+
+    # --- Workspace snapshot ---
+    def save_workspace(self, path=WORKSPACE_FILE):
+        """Persists the document, shapes, history and view state so the next launch resumes where this one ended.
+
+        Floating imports are burnt into the saved tiles. History patches keep the
+        compressed form they already have in the tile store.
+        """
+        self.finish_restore()
+        self.end_edit()
+        codec = self.settings.get("history_codec") or "zlib"
+        document = self.base_image.copy()
+        self.composite_placements(document, (0, 0) + document.size)
+        writer = WorkspaceWriter(path + ".tmp")
+        try:
+            header = {
+                "size": list(document.size),
+                "tile_size": WORKSPACE_TILE_SIZE,
+                "tiles": write_tiles(writer, document, codec, WORKSPACE_TILE_SIZE),
+                "vectors": [obj.to_dict() for obj in self.vector_layer],
+                "history": write_history(writer, self.history, self.tile_store, codec),
+                "redo": write_history(writer, self.redo_stack, self.tile_store, codec),
+                "view": {
+                    "zoom": self.zoom_level,
+                    "scroll": self.canvas.yview()[0],
+                    "tool": self.current_tool,
+                    "shape": self.current_shape,
+                    "brush_size": self.brush_size,
+                    "brush_type": self.brush_type,
+                    "color": self.current_color,
+                    "fill": bool(self.fill_var.get()),
+                    "modified": self.canvas_modified,
+                },
+            }
+            writer.finish(header)
+        except Exception:
+            writer.abort()
+            raise
+        # Restored patches still point into the old file; copy them out before replacing it
+        self.tile_store.detach_mapped()
+        if self.workspace is not None:
+            self.workspace.close()
+            self.workspace = None
+        os.replace(path + ".tmp", path)
+
+    def restore_workspace(self, path=WORKSPACE_FILE):
+        """Reopens the workspace saved on exit. Returns False if there was none or it could not be read.
+
+        The visible tiles are decoded right away and the rest on idle; history
+        patches stay in the mapped file until an undo needs them.
+        """
+        if not os.path.exists(path):
+            return False
+        try:
+            workspace = Workspace(path)
+        except Exception as e:
+            print(f"Error loading workspace: {e}")
+            return False
+        header, view = workspace.header, workspace.header["view"]
+        self.workspace = workspace
+        self.canvas_width, self.canvas_height = header["size"]
+        self._display_image_on_canvas(Image.new("RGBA", tuple(header["size"]), (0, 0, 0, 0)))
+        visible = self.visible_document_box()
+        self.pending_tiles = workspace.tiles_by_distance(visible)
+        tile_size = header["tile_size"]
+        shown = sum(1 for x, y, _ in self.pending_tiles
+                    if x < visible[2] and y < visible[3] and x + tile_size > visible[0] and y + tile_size > visible[1])
+        self.load_pending_tiles(count=shown)
+        self.scheduler.add(self._restore_tiles(), "restore tiles", PRIORITY_HIGH)
+        for data in header["vectors"]:
+            self.add_vector_object(VectorShape.from_dict(data))
+        self.history = read_history(workspace, header["history"], self.tile_store)
+        self.redo_stack = read_history(workspace, header["redo"], self.tile_store)
+        if view["shape"]:
+            self.shape_var.set(view["shape"])
+            self.select_shape(view["shape"])
         else:
-            self.master.destroy()
+            self.tool_var.set(view["tool"])
+            self.select_tool(view["tool"])
+        self.brush_size = view["brush_size"]
+        self.brush_size_var.set(self.brush_size)
+        self.brush_type = view["brush_type"]
+        self.brush_type_var.set(self.brush_type)
+        self.fill_var.set(view["fill"])
+        self.set_current_color(view["color"])
+        self.toggle_fill()
+        if view["zoom"] != 1.0:
+            self.apply_zoom(view["zoom"])
+        self.canvas.yview_moveto(view["scroll"])
+        self.canvas_modified = view["modified"]
+        self.status_bar_message("Restored the previous session.")
+        return True
+
+    def visible_document_box(self):
+        """Document rectangle currently scrolled into view."""
+        x, y = self.canvas.canvasx(0), self.canvas.canvasy(0)
+        width = self.canvas.winfo_width() if self.canvas.winfo_width() > 1 else self.canvas_width  # Not mapped yet
+        height = self.canvas.winfo_height() if self.canvas.winfo_height() > 1 else self.canvas_height
+        return tuple(self.canvas_to_document([x, y, x + width, y + height]))
+
+    def load_pending_tiles(self, count=None):
+        """Pastes restored tiles into the document: count of them, or all that are left."""
+        loaded = 0
+        while self.pending_tiles and (count is None or loaded < count):
+            x, y, blob = self.pending_tiles.pop(0)
+            tile = self.workspace.read_tile(blob)
+            # Not damage(): loading is not an edit and must not land in a history step
+            self.dirty.add((x, y, x + tile.width, y + tile.height))
+            self.base_image.paste(tile, (x, y))
+            loaded += 1
+        self.schedule_refresh()
+
+    def _restore_tiles(self):
+        while self.pending_tiles:
+            self.load_pending_tiles(count=1)
+            yield
+
+    def finish_restore(self):
+        """Loads any restored tiles still pending, before the document is edited or read."""
+        if self.pending_tiles:
+            self.load_pending_tiles()
 
 if __name__ == "__main__":
     root = tk.Tk()
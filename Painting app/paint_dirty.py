@@ -0,0 +1,137 @@
+import math
+
+# Rectangles are (x1, y1, x2, y2) in document pixels with exclusive right/bottom edges,
+# the same convention as Pillow crop and paste boxes.
+
+
+def clip_rect(rect, width, height):
+    """Rounds a rectangle outwards to whole pixels and clips it to the document. Returns None if empty."""
+    x1, y1 = max(0, math.floor(rect[0])), max(0, math.floor(rect[1]))
+    x2, y2 = min(width, math.ceil(rect[2])), min(height, math.ceil(rect[3]))
+    if x1 >= x2 or y1 >= y2:
+        return None
+    return (x1, y1, x2, y2)
+
+
+def rect_union(a, b):
+    return (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+
+
+def rects_touch(a, b):
+    """True if two rectangles overlap or share an edge."""
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+def rect_contains(outer, inner):
+    return outer[0] <= inner[0] and outer[1] <= inner[1] and outer[2] >= inner[2] and outer[3] >= inner[3]
+
+
+def subtract_rects(rect, others):
+    """Splits rect into pieces that no rectangle in others overlaps."""
+    pieces = [rect]
+    for ox1, oy1, ox2, oy2 in others:
+        remaining = []
+        for x1, y1, x2, y2 in pieces:
+            if ox1 >= x2 or ox2 <= x1 or oy1 >= y2 or oy2 <= y1:
+                remaining.append((x1, y1, x2, y2))
+                continue
+            if y1 < oy1:
+                remaining.append((x1, y1, x2, oy1))  # Band above
+            if oy2 < y2:
+                remaining.append((x1, oy2, x2, y2))  # Band below
+            top, bottom = max(y1, oy1), min(y2, oy2)
+            if x1 < ox1:
+                remaining.append((x1, top, ox1, bottom))  # Left of the overlap
+            if ox2 < x2:
+                remaining.append((ox2, top, x2, bottom))  # Right of the overlap
+        pieces = remaining
+    return pieces
+
+
+class DirtyRegion:
+    """A set of damaged rectangles. Overlapping or adjacent rectangles are merged as they arrive."""
+
+    def __init__(self, max_rects=32):
+        self.max_rects = max_rects  # Past this many, collapse to one bounding box; per-rect overhead would dominate
+        self.rects = []
+
+    def __bool__(self):
+        return bool(self.rects)
+
+    def __iter__(self):
+        return iter(self.rects)
+
+    def add(self, rect):
+        if any(rect_contains(other, rect) for other in self.rects):
+            return  # Drags re-report the same box every frame; it is already dirty
+        merged = True
+        while merged:
+            merged = False
+            for i, other in enumerate(self.rects):
+                if rects_touch(rect, other):
+                    rect = rect_union(rect, self.rects.pop(i))
+                    merged = True
+                    break
+        self.rects.append(rect)
+        if len(self.rects) > self.max_rects:
+            self.rects = [self.bbox()]
+
+    def bbox(self):
+        if not self.rects:
+            return None
+        box = self.rects[0]
+        for rect in self.rects[1:]:
+            box = rect_union(box, rect)
+        return box
+
+    def clear(self):
+        self.rects = []
+
+
+class DirtyTracker:
+    """Collects damage rectangles from every operation and hands them to named consumers.
+
+    Each consumer (display refresh, the flattened document cache, ...) drains its own
+    DirtyRegion at its own pace, so one consumer catching up never hides damage from another.
+    """
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.regions = {}
+
+    def register(self, name):
+        """Adds a consumer. It starts with the whole document dirty."""
+        region = self.regions[name] = DirtyRegion()
+        region.add((0, 0, self.width, self.height))
+        return region
+
+    def add(self, rect, consumers=None, skip=()):
+        """Reports damage to every consumer, or only to the named ones. Returns the clipped rect or None."""
+        rect = clip_rect(rect, self.width, self.height)
+        if rect is None:
+            return None
+        for name in consumers or self.regions:
+            if name not in skip:
+                self.regions[name].add(rect)
+        return rect
+
+    def add_all(self, consumers=None, skip=()):
+        return self.add((0, 0, self.width, self.height), consumers, skip)
+
+    def resize(self, width, height):
+        """The document changed size; every consumer has to redo everything."""
+        self.width, self.height = width, height
+        for region in self.regions.values():
+            region.clear()
+        self.add_all()
+
+    def pending(self, name):
+        return bool(self.regions[name])
+
+    def take(self, name):
+        """Returns and forgets the damaged rectangles of one consumer."""
+        region = self.regions[name]
+        rects = region.rects
+        region.clear()
+        return rects
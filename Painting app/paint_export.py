@@ -0,0 +1,130 @@
+import io
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from PIL import Image
+
+# Output format name -> (Pillow format, file extension, encoder options)
+EXPORT_FORMATS = {
+    "png": ("PNG", "png", {"optimize": False, "compress_level": 6}),
+    "webp": ("WEBP", "webp", {"quality": 90, "method": 4}),
+    "jpeg": ("JPEG", "jpg", {"quality": 90, "optimize": True}),
+}
+DEFAULT_FORMATS = ("png", "webp", "jpeg")
+DEFAULT_SCALES = (1.0, 0.5, 0.25)
+THUMBNAIL_SIZE = (256, 256)
+
+
+class ExportResult:
+    __slots__ = ("path", "format", "scale", "size", "bytes", "seconds", "error")
+
+    def __init__(self, path, format, scale, size, bytes=0, seconds=0.0, error=None):
+        self.path = path
+        self.format = format
+        self.scale = scale
+        self.size = size
+        self.bytes = bytes
+        self.seconds = seconds
+        self.error = error
+
+
+def build_pyramid(image, scales):
+    """Returns {scale: image}, building each level from the next larger one instead of from the original.
+
+    Exact integer steps (the common 1x -> 0.5x -> 0.25x chain) use Image.reduce, other steps LANCZOS.
+    """
+    pyramid = {}
+    previous_scale, previous = 1.0, image
+    for scale in sorted(set(scales), reverse=True):
+        if scale == previous_scale:
+            pyramid[scale] = previous
+            continue
+        step = previous_scale / scale
+        if abs(step - round(step)) < 1e-9 and round(step) > 1:
+            level = previous.reduce(round(step))
+        else:
+            size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+            level = previous.resize(size, Image.Resampling.LANCZOS)
+        pyramid[scale] = level
+        previous_scale, previous = scale, level
+    return pyramid
+
+
+def encode_image(image, format_name):
+    """Encodes an image to bytes in one of EXPORT_FORMATS. Runs in a worker process."""
+    pil_format, _, options = EXPORT_FORMATS[format_name]
+    if pil_format == "JPEG" and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    buffer = io.BytesIO()
+    image.save(buffer, format=pil_format, **options)
+    return buffer.getvalue()
+
+
+def _encode_job(image, format_name, path):
+    start = time.perf_counter()
+    data = encode_image(image, format_name)
+    with open(path, "wb") as f:
+        f.write(data)
+    return len(data), time.perf_counter() - start
+
+
+def output_path(directory, basename, format_name, scale=None):
+    extension = EXPORT_FORMATS[format_name][1]
+    suffix = "_thumb" if scale is None else ("" if scale == 1.0 else f"@{scale:g}x")
+    return os.path.join(directory, f"{basename}{suffix}.{extension}")
+
+
+def export_set(image, directory, basename, formats=DEFAULT_FORMATS, scales=DEFAULT_SCALES,
+               thumbnail=True, max_workers=None):
+    """Writes every (format, scale) combination of one image snapshot, plus an optional PNG thumbnail.
+
+    Downscales come from a shared pyramid and encodes run in a process pool. At most
+    max_workers jobs are in flight, so only that many level copies are ever pickled
+    to workers at once. Returns a list of ExportResult in submission order.
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    pyramid = build_pyramid(image, scales)
+    jobs = [(pyramid[scale], fmt, scale) for scale in sorted(pyramid, reverse=True) for fmt in formats]
+    if thumbnail:
+        thumb = min(list(pyramid.values()) or [image], key=lambda level: level.width * level.height).copy()
+        if thumb.width < THUMBNAIL_SIZE[0] and thumb.height < THUMBNAIL_SIZE[1]:
+            thumb = image.copy()  # Every level is smaller than the thumbnail box; start from full size
+        thumb.thumbnail(THUMBNAIL_SIZE, Image.Resampling.LANCZOS)
+        jobs.append((thumb, "png", None))
+
+    results = [ExportResult(output_path(directory, basename, fmt, scale), fmt, scale, level.size)
+               for level, fmt, scale in jobs]
+    pending = {}
+    # Workers are spawned rather than forked so the pool is safe to start from a GUI process
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        for index, (level, fmt, _) in enumerate(jobs):
+            if len(pending) >= max_workers:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    _collect(future, results[pending.pop(future)])
+            pending[pool.submit(_encode_job, level, fmt, results[index].path)] = index
+        for future in list(pending):
+            _collect(future, results[pending.pop(future)])
+    return results
+
+
+def _collect(future, result):
+    try:
+        result.bytes, result.seconds = future.result()
+    except Exception as e:
+        result.error = str(e)
+
+
+def format_report(results, wall_seconds):
+    lines = [f"{'output':<40} {'size':>11} {'bytes':>10} {'encode':>9}"]
+    for r in results:
+        name = os.path.basename(r.path)
+        if r.error:
+            lines.append(f"{name:<40} FAILED: {r.error}")
+        else:
+            lines.append(f"{name:<40} {r.size[0]:>5}x{r.size[1]:<5} {r.bytes:>10} {r.seconds * 1000:>7.1f}ms")
+    total_bytes = sum(r.bytes for r in results)
+    lines.append(f"{len(results)} outputs, {total_bytes} bytes, {wall_seconds:.2f}s wall time")
+    return "\n".join(lines)
@@ -0,0 +1,141 @@
+import math
+import multiprocessing
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
+
+import numpy as np
+from PIL import Image, ImageFilter
+
+# Filter name -> (menu label, [(parameter, label, minimum, maximum, default), ...])
+FILTERS = {
+    "gaussian_blur": ("Gaussian Blur", [("radius", "Radius", 0.5, 50.0, 4.0)]),
+    "unsharp_mask": ("Unsharp Mask", [("radius", "Radius", 0.5, 20.0, 2.0),
+                                      ("percent", "Amount (%)", 10, 500, 150),
+                                      ("threshold", "Threshold", 0, 50, 3)]),
+    "median": ("Median", [("size", "Size", 3, 15, 3)]),
+    "find_edges": ("Find Edges", []),
+}
+TILE_SIZE = 512
+POOL_THRESHOLD = 2048 * 2048  # Smaller images are filtered in one call; a process pool costs more than it saves
+PREVIEW_SIZE = 360  # Longest side of the live preview proxy
+
+
+class FilterCancelled(Exception):
+    pass
+
+
+def default_params(name):
+    return {key: default for key, _, _, _, default in FILTERS[name][1]}
+
+
+def make_filter(name, params):
+    if name == "gaussian_blur":
+        return ImageFilter.GaussianBlur(params["radius"])
+    if name == "unsharp_mask":
+        return ImageFilter.UnsharpMask(params["radius"], int(params["percent"]), int(params["threshold"]))
+    if name == "median":
+        return ImageFilter.MedianFilter(int(params["size"]) // 2 * 2 + 1)  # Median sizes must be odd
+    if name == "find_edges":
+        return ImageFilter.FIND_EDGES
+    raise ValueError(f"Unknown filter: {name}")
+
+
+def halo(name, params):
+    """How far, in pixels, one output pixel of the filter reads around itself."""
+    if name in ("gaussian_blur", "unsharp_mask"):
+        return math.ceil(params["radius"] * 3) + 2
+    if name == "median":
+        return int(params["size"]) // 2 + 1
+    return 1
+
+
+def scale_params(name, params, scale):
+    """Parameters for a copy of the image scaled by scale, so a preview proxy looks like the full result."""
+    scaled = dict(params)
+    if "radius" in scaled:
+        scaled["radius"] = max(0.1, params["radius"] * scale)
+    if name == "median":
+        scaled["size"] = max(3, round(params["size"] * scale))
+    return scaled
+
+
+def make_proxy(image, size=PREVIEW_SIZE):
+    """Returns (downscaled copy, scale) for previewing a filter at interactive speed."""
+    scale = min(1.0, size / max(image.size))
+    if scale == 1.0:
+        return image.copy(), scale
+    proxy_size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+    return image.resize(proxy_size, Image.Resampling.BILINEAR), scale
+
+
+def apply_filter(image, name, params):
+    """Filters an RGBA image in one call. Premultiplied alpha keeps transparent pixels from bleeding dark fringes."""
+    return image.convert("RGBa").filter(make_filter(name, params)).convert("RGBA")
+
+
+def tile_boxes(width, height, tile_size=TILE_SIZE):
+    return [(x, y, min(x + tile_size, width), min(y + tile_size, height))
+            for y in range(0, height, tile_size) for x in range(0, width, tile_size)]
+
+
+def _filter_tile(source_name, target_name, shape, box, margin, name, params):
+    """Worker entry point: filters one tile plus its halo from shared memory and writes the tile back."""
+    source_memory = shared_memory.SharedMemory(name=source_name)
+    target_memory = shared_memory.SharedMemory(name=target_name)
+    try:
+        source = np.ndarray(shape, dtype=np.uint8, buffer=source_memory.buf)
+        target = np.ndarray(shape, dtype=np.uint8, buffer=target_memory.buf)
+        x1, y1, x2, y2 = box
+        hx1, hy1 = max(0, x1 - margin), max(0, y1 - margin)
+        hx2, hy2 = min(shape[1], x2 + margin), min(shape[0], y2 + margin)
+        tile = apply_filter(Image.fromarray(source[hy1:hy2, hx1:hx2], "RGBA"), name, params)
+        target[y1:y2, x1:x2] = np.asarray(tile)[y1 - hy1:y2 - hy1, x1 - hx1:x2 - hx1]
+        del source, target  # Views must go before the shared memory can close
+    finally:
+        source_memory.close()
+        target_memory.close()
+
+
+def apply_tiled(image, name, params, max_workers=None, cancel=None, progress=None, tile_size=TILE_SIZE):
+    """Filters an RGBA image over overlapping tiles in a process pool and returns the result.
+
+    The source and result live in shared memory, so workers only receive tile
+    coordinates. cancel is a threading.Event checked between tiles (raises
+    FilterCancelled); progress(done, total) is called from the calling thread.
+    """
+    if image.width * image.height < POOL_THRESHOLD:
+        result = apply_filter(image, name, params)
+        if progress:
+            progress(1, 1)
+        return result
+    shape = (image.height, image.width, 4)
+    margin = halo(name, params)
+    boxes = tile_boxes(image.width, image.height, tile_size)
+    source_memory = shared_memory.SharedMemory(create=True, size=image.width * image.height * 4)
+    target_memory = shared_memory.SharedMemory(create=True, size=source_memory.size)
+    try:
+        np.ndarray(shape, dtype=np.uint8, buffer=source_memory.buf)[:] = np.asarray(image)
+        # Spawned rather than forked workers, so the pool is safe to start from a GUI process
+        with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count() or 1,
+                                 mp_context=multiprocessing.get_context("spawn")) as pool:
+            pending = {pool.submit(_filter_tile, source_memory.name, target_memory.name, shape, box, margin, name, params)
+                       for box in boxes}
+            done_count = 0
+            while pending:
+                done, pending = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+                for future in done:
+                    future.result()
+                    done_count += 1
+                if progress and done:
+                    progress(done_count, len(boxes))
+                if cancel is not None and cancel.is_set():
+                    pool.shutdown(wait=True, cancel_futures=True)
+                    raise FilterCancelled()
+        return Image.fromarray(np.ndarray(shape, dtype=np.uint8, buffer=target_memory.buf).copy(), "RGBA")
+    finally:
+        source_memory.close()
+        source_memory.unlink()
+        target_memory.close()
+        target_memory.unlink()
+
@@ -0,0 +1,258 @@
+import io
+import os
+import struct
+import zlib
+
+from PIL import GifImagePlugin, Image, ImageChops
+
+TILE_SIZE = 256
+DEFAULT_DURATION_MS = 100
+ONION_SCALE = 0.5  # Onion skins are drawn from frames cached at this scale
+ONION_OPACITY = 0.35
+ANIMATION_FORMATS = {".gif": "GIF", ".png": "PNG", ".apng": "PNG", ".webp": "WEBP"}
+
+
+class Frame:
+    """One animation frame: its raster as tiles, plus its own undo and redo stacks.
+
+    Tiles are never modified once stored, so frames share every tile they have
+    in common; a tile missing from the dict is fully transparent.
+    """
+
+    __slots__ = ("size", "tiles", "duration", "history", "redo", "version", "_thumbnail")
+
+    def __init__(self, size, tiles=None, duration=DEFAULT_DURATION_MS):
+        self.size = size
+        self.tiles = dict(tiles or {})  # (x, y) of the tile's top-left -> RGBA image
+        self.duration = duration
+        self.history = []
+        self.redo = []
+        self.version = 0
+        self._thumbnail = None  # (version, image)
+
+    def image(self):
+        image = Image.new("RGBA", self.size, (0, 0, 0, 0))
+        for (x, y), tile in self.tiles.items():
+            image.paste(tile, (x, y))
+        return image
+
+    def thumbnail(self, scale=ONION_SCALE):
+        """The frame downscaled, cached until the frame changes."""
+        if self._thumbnail is None or self._thumbnail[0] != self.version:
+            size = (max(1, round(self.size[0] * scale)), max(1, round(self.size[1] * scale)))
+            self._thumbnail = (self.version, self.image().resize(size, Image.Resampling.BILINEAR))
+        return self._thumbnail[1]
+
+
+def tile_boxes(size, rects, tile_size=TILE_SIZE):
+    """The tile boxes of an image of size that any of rects (x1, y1, x2, y2) touches."""
+    width, height = size
+    boxes = set()
+    for x1, y1, x2, y2 in rects:
+        for y in range(int(y1) // tile_size * tile_size, min(height, int(y2 + 0.999)), tile_size):
+            for x in range(int(x1) // tile_size * tile_size, min(width, int(x2 + 0.999)), tile_size):
+                boxes.add((x, y, min(x + tile_size, width), min(y + tile_size, height)))
+    return sorted(boxes, key=lambda box: (box[1], box[0]))
+
+
+def changed_tiles(a, b):
+    """Boxes of the tiles that differ between two frames of the same size; shared tiles are skipped unread."""
+    tile_size = TILE_SIZE
+    boxes = []
+    for key in a.tiles.keys() | b.tiles.keys():
+        if a.tiles.get(key) is not b.tiles.get(key):
+            x, y = key
+            boxes.append((x, y, min(x + tile_size, a.size[0]), min(y + tile_size, a.size[1])))
+    return boxes
+
+
+class FrameTimeline:
+    """The frames of an animation, each stored copy-on-write against the others."""
+
+    def __init__(self, frames):
+        self.frames = frames
+
+    @classmethod
+    def from_image(cls, image):
+        timeline = cls([Frame(image.size)])
+        timeline.store(0, image)
+        return timeline
+
+    def snapshot(self):
+        """A copy that later edits do not touch, for exporting in the background; all tiles stay shared."""
+        return FrameTimeline([Frame(frame.size, frame.tiles, frame.duration) for frame in self.frames])
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __getitem__(self, index):
+        return self.frames[index]
+
+    def store(self, index, image, rects=None):
+        """Saves image as frame index, re-reading only the tiles that rects (None: all) touch.
+
+        A re-read tile whose pixels did not change keeps the object it had, so it
+        stays shared with the frames it came from.
+        """
+        frame = self.frames[index]
+        if image.size != frame.size:
+            frame.size, frame.tiles, rects = image.size, {}, None
+        if rects is None:
+            rects = [(0, 0) + image.size]
+        changed = False
+        for box in tile_boxes(image.size, rects):
+            tile = image.crop(box)
+            old = frame.tiles.get(box[:2])
+            if tile.getbbox() is None:
+                changed |= frame.tiles.pop(box[:2], None) is not None
+            elif old is None or old.tobytes() != tile.tobytes():
+                frame.tiles[box[:2]] = tile
+                changed = True
+        if changed:
+            frame.version += 1
+        return changed
+
+    def duplicate(self, index):
+        """Inserts a copy of frame index after it, sharing all of its tiles, and returns the new index."""
+        source = self.frames[index]
+        self.frames.insert(index + 1, Frame(source.size, source.tiles, source.duration))
+        return index + 1
+
+    def remove(self, index):
+        del self.frames[index]
+
+
+def _flatten(frame, size, background):
+    """A frame over the background color as RGB, at the animation's size."""
+    flat = Image.new("RGBA", size, background)
+    flat.alpha_composite(frame.image().crop((0, 0) + size))
+    return flat.convert("RGB")
+
+
+def frame_deltas(timeline, background):
+    """Yields (canvas, box, duration) per frame: the box is what changed since the previous frame, None if nothing.
+
+    canvas is one RGB image updated in place from frame to frame, so crop what
+    is needed before asking for the next. Only tiles the frame does not share
+    with the previous one are read and compared.
+    """
+    size = timeline.frames[0].size
+    canvas, previous = None, None
+    for frame in timeline.frames:
+        if previous is None or frame.size != previous.size:
+            canvas = _flatten(frame, size, background)
+            yield canvas, (0, 0) + size, frame.duration
+            previous = frame
+            continue
+        boxes = [box for box in changed_tiles(previous, frame) if box[0] < size[0] and box[1] < size[1]]
+        box = None
+        if boxes:
+            union = (min(b[0] for b in boxes), min(b[1] for b in boxes),
+                     min(size[0], max(b[2] for b in boxes)), min(size[1], max(b[3] for b in boxes)))
+            before = canvas.crop(union)
+            for tile_box in boxes:
+                flat = Image.new("RGBA", (tile_box[2] - tile_box[0], tile_box[3] - tile_box[1]), background)
+                tile = frame.tiles.get(tile_box[:2])
+                if tile is not None:
+                    flat.alpha_composite(tile)
+                canvas.paste(flat.convert("RGB"), tile_box[:2])
+            inner = ImageChops.difference(before, canvas.crop(union)).getbbox()
+            if inner is not None:
+                box = (union[0] + inner[0], union[1] + inner[1], union[0] + inner[2], union[1] + inner[3])
+        yield canvas, box, frame.duration
+        previous = frame
+
+
+def _distinct_frames(deltas):
+    """Folds frames that change nothing into the duration of the one before: yields (image, offset, duration)."""
+    pending = None
+    for canvas, box, duration in deltas:
+        if box is None:
+            if pending is not None:
+                pending[2] += duration
+            continue
+        if pending is not None:
+            yield tuple(pending)
+        pending = [canvas.crop(box), box[:2], duration]
+    if pending is not None:
+        yield tuple(pending)
+
+
+def _write_gif(fp, deltas, loop):
+    for i, (image, offset, duration) in enumerate(_distinct_frames(deltas)):
+        frame = image.quantize(256)  # Each frame gets its own palette, sized to what it shows
+        if i == 0:
+            header, _ = GifImagePlugin.getheader(frame.copy(), info={"loop": loop})
+            for chunk in header:
+                fp.write(chunk)
+        for chunk in GifImagePlugin.getdata(frame, offset, duration=duration, disposal=1, include_color_table=True):
+            fp.write(chunk)
+    fp.write(b";")
+
+
+def _png_chunk(kind, data):
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+
+def _png_chunks(image):
+    """(type, data) of the chunks Pillow writes for an RGB image."""
+    buffer = io.BytesIO()
+    image.save(buffer, "PNG")
+    data, position, chunks = buffer.getvalue(), 8, []
+    while position < len(data):
+        length, kind = struct.unpack(">I4s", data[position:position + 8])
+        chunks.append((kind, data[position + 8:position + 8 + length]))
+        position += length + 12
+    return chunks
+
+
+def _write_apng(fp, deltas, loop):
+    fp.write(b"\x89PNG\r\n\x1a\n")
+    sequence, count, actl = 0, 0, None
+    for image, (x, y), duration in _distinct_frames(deltas):
+        chunks = _png_chunks(image)
+        if count == 0:
+            fp.write(_png_chunk(b"IHDR", chunks[0][1]))
+            actl = fp.tell()
+            fp.write(_png_chunk(b"acTL", struct.pack(">II", 0, loop)))  # Frame count is filled in at the end
+        fctl = struct.pack(">IIIIIHHBB", sequence, image.width, image.height, x, y, min(duration, 65535), 1000, 0, 0)
+        fp.write(_png_chunk(b"fcTL", fctl))
+        sequence += 1
+        for kind, data in chunks:
+            if kind != b"IDAT":
+                continue
+            if count == 0:
+                fp.write(_png_chunk(b"IDAT", data))  # The first frame doubles as the still image
+            else:
+                fp.write(_png_chunk(b"fdAT", struct.pack(">I", sequence) + data))
+                sequence += 1
+        count += 1
+    fp.write(_png_chunk(b"IEND", b""))
+    fp.seek(actl)
+    fp.write(_png_chunk(b"acTL", struct.pack(">II", count, loop)))
+
+
+def _write_webp(fp, deltas, loop):
+    # libwebp finds each frame's changed rectangle itself, but it takes whole frames
+    frames, durations = [], []
+    for canvas, box, duration in deltas:
+        if box is None and frames:
+            durations[-1] += duration
+            continue
+        frames.append(canvas.copy())
+        durations.append(duration)
+    frames[0].save(fp, "WEBP", save_all=True, append_images=frames[1:], duration=durations, loop=loop, lossless=True)
+
+
+def export_animation(timeline, path, background, loop=0):
+    """Writes the timeline as an animated GIF, APNG or WebP, chosen by the file extension.
+
+    Every frame after the first holds only the rectangle that changed since the
+    frame before, and frames that change nothing lengthen the previous one.
+    """
+    kind = ANIMATION_FORMATS.get(os.path.splitext(path)[1].lower())
+    if kind is None:
+        raise ValueError(f"Unsupported animation format: {path}")
+    writer = {"GIF": _write_gif, "PNG": _write_apng, "WEBP": _write_webp}[kind]
+    with open(path, "wb") as fp:
+        writer(fp, frame_deltas(timeline, background), loop)
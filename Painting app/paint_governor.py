@@ -0,0 +1,68 @@
+import time
+
+DEGRADATIONS = ("nearest_zoom", "preview_resolution", "overlays")
+DEFAULT_TARGET_MS = 16.0  # About 60 frames per second
+SETTLE_MS = 200  # Input quiet for this long ends the interaction and refines to full quality
+SMOOTHING = 0.3  # Weight of the newest frame in the running frame time
+
+
+class QualityGovernor:
+    """Trades render quality for frame rate while the user is dragging, spinning or sliding.
+
+    Handlers call interact(name) as each input event arrives. The governor times
+    the frame from there until the idle pass after it, redraw included, is over,
+    and keeps a smoothed frame time per interaction. While an interaction is
+    running and its frames are slower than the target, cheap(degradation) is
+    true for every enabled degradation. Work skipped that way is handed to defer() and runs
+    once the input has been quiet for SETTLE_MS.
+    """
+
+    def __init__(self, master, target_ms=DEFAULT_TARGET_MS, degradations=DEGRADATIONS):
+        self.master = master
+        self.target = target_ms / 1000
+        self.degradations = set(degradations)
+        self.frame_times = {}  # Interaction -> smoothed seconds per frame
+        self.active = None
+        self._frame_start = None
+        self._settle_job = None
+        self._deferred = {}  # Key -> callback run when the interaction settles
+
+    def interact(self, name):
+        """Marks one input event of an interaction; call it before doing the event's work."""
+        if self.active != name:
+            self.settle()
+            self.active = name
+        if self._frame_start is None:
+            self._frame_start = time.perf_counter()
+            # Idle callbacks run in order, and redraws queued after this one would
+            # still be pending; the timer fires only once that idle pass is over
+            self.master.after_idle(lambda: self.master.after(0, self._frame_done, name))
+        if self._settle_job is not None:
+            self.master.after_cancel(self._settle_job)
+        self._settle_job = self.master.after(SETTLE_MS, self.settle)
+
+    def cheap(self, degradation):
+        """Whether to take the cheap path for degradation right now."""
+        if self.active is None or degradation not in self.degradations:
+            return False
+        return self.frame_times.get(self.active, 0.0) > self.target
+
+    def defer(self, key, callback):
+        """Runs callback when the current interaction settles; a later callback with the same key replaces it."""
+        self._deferred[key] = callback
+
+    def settle(self):
+        """Ends the current interaction and runs the deferred full-quality work."""
+        if self._settle_job is not None:
+            self.master.after_cancel(self._settle_job)
+            self._settle_job = None
+        self.active = None
+        deferred, self._deferred = self._deferred, {}
+        for callback in deferred.values():
+            callback()
+
+    def _frame_done(self, name):
+        elapsed = time.perf_counter() - self._frame_start
+        self._frame_start = None
+        previous = self.frame_times.get(name)
+        self.frame_times[name] = elapsed if previous is None else previous + SMOOTHING * (elapsed - previous)
@@ -0,0 +1,78 @@
+import numpy as np
+
+TILE_SIZE = 256
+COLOR_BITS = 4  # Bits per channel kept when counting colors for the dominant-color list
+UPDATE_MS = 250  # How often an open statistics panel catches up with the damage
+
+
+class ColorStatistics:
+    """Per-channel histograms and color counts of an RGB image, kept up to date from damaged rectangles.
+
+    Counts are kept per tile as well as in total. When a tile is damaged its old
+    counts are subtracted from the totals and its new ones added, so an update
+    costs the damaged tiles only, never the whole image.
+    """
+
+    def __init__(self, tile_size=TILE_SIZE):
+        self.tile_size = tile_size
+        self.size = None
+        self.channels = np.zeros((3, 256), dtype=np.int64)  # R, G, B
+        self.colors = np.zeros(1 << (3 * COLOR_BITS), dtype=np.int64)
+        self.pixels = 0
+        self._tiles = {}  # (x, y) -> (channel counts, color counts)
+
+    def update(self, image, rects=None):
+        """Recounts the tiles that rects touch (all of them for None, or when the image changed size)."""
+        if image.size != self.size:
+            self.size = image.size
+            self.channels[:] = 0
+            self.colors[:] = 0
+            self._tiles.clear()
+            rects = None
+        if rects is None:
+            rects = [(0, 0) + image.size]
+        width, height = image.size
+        step = self.tile_size
+        touched = set()
+        for x1, y1, x2, y2 in rects:
+            for y in range(max(0, int(y1)) // step * step, min(height, int(np.ceil(y2))), step):
+                for x in range(max(0, int(x1)) // step * step, min(width, int(np.ceil(x2))), step):
+                    touched.add((x, y))
+        for x, y in touched:
+            channels, colors = self._count(image.crop((x, y, min(x + step, width), min(y + step, height))))
+            old = self._tiles.get((x, y))
+            if old is not None:
+                self.channels -= old[0]
+                self.colors -= old[1]
+            self.channels += channels
+            self.colors += colors
+            self._tiles[(x, y)] = (channels, colors)
+        self.pixels = width * height
+        return len(touched)
+
+    @staticmethod
+    def _count(tile):
+        channels = np.array(tile.histogram(), dtype=np.int64).reshape(3, 256)
+        pixels = (np.asarray(tile) >> (8 - COLOR_BITS)).astype(np.int32)
+        keys = (pixels[..., 0] << (2 * COLOR_BITS)) | (pixels[..., 1] << COLOR_BITS) | pixels[..., 2]
+        return channels, np.bincount(keys.ravel(), minlength=1 << (3 * COLOR_BITS))
+
+    def dominant_colors(self, count=8):
+        """[(hex color, share of the pixels), ...], most common first, with colors rounded to COLOR_BITS a channel."""
+        if not self.pixels:
+            return []
+        top = np.argsort(self.colors)[::-1][:count]
+        levels = (1 << COLOR_BITS) - 1
+
+        def channel(key, shift):
+            return ((int(key) >> shift) & levels) * 255 // levels
+
+        return [("#%02x%02x%02x" % (channel(key, 2 * COLOR_BITS), channel(key, COLOR_BITS), channel(key, 0)),
+                 int(self.colors[key]) / self.pixels)
+                for key in top if self.colors[key]]
+
+    def mean(self):
+        """Mean (r, g, b)."""
+        if not self.pixels:
+            return (0.0, 0.0, 0.0)
+        return tuple(float(v) for v in (self.channels * np.arange(256)).sum(axis=1) / self.pixels)
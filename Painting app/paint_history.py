@@ -0,0 +1,119 @@
+import queue
+import threading
+
+from paint_dirty import subtract_rects
+
+
+class Patch:
+    """Pixels of one document rectangle as they were before an edit.
+
+    With a store (a SpillStore) the pixels live there and may be paged out to disk
+    while the patch sits in the undo stack; image pages them back in.
+    """
+
+    __slots__ = ("box", "_image", "_store", "_key")
+
+    def __init__(self, box, image, store=None):
+        self.box = box
+        self._store = store
+        if store is None:
+            self._image, self._key = image, None
+        else:
+            self._image, self._key = None, store.put(image)
+
+    @classmethod
+    def stored(cls, box, store, key):
+        """A patch whose pixels are already in store under key."""
+        patch = cls.__new__(cls)
+        patch.box, patch._image, patch._store, patch._key = box, None, store, key
+        return patch
+
+    @property
+    def key(self):
+        return self._key
+
+    @property
+    def image(self):
+        return self._image if self._store is None else self._store.get(self._key)
+
+    def release(self):
+        if self._store is not None:
+            self._store.discard(self._key)
+
+
+class HistoryStep:
+    """One undoable edit: the raster patches it overwrote, in capture order.
+
+    size is the document size the patches belong to. Restoring a step recorded
+    at a different size (rotate with expand, resize) swaps the whole document.
+    """
+
+    __slots__ = ("size", "patches", "store")
+
+    def __init__(self, size, store=None):
+        self.size = size
+        self.patches = []
+        self.store = store
+
+    def __bool__(self):
+        return bool(self.patches)
+
+    @classmethod
+    def snapshot(cls, image, store=None):
+        """A step holding the whole image, for restoring across a change of document size."""
+        step = cls(image.size, store)
+        step.patches.append(Patch((0, 0) + image.size, image.copy(), store))
+        return step
+
+    def capture(self, box, source):
+        """Saves the parts of box not already saved by this step. source(box) returns those pixels."""
+        for piece in subtract_rects(box, [patch.box for patch in self.patches]):
+            self.patches.append(Patch(piece, source(piece), self.store))
+
+    def apply(self, image):
+        """Pastes the patches back into image (in place) and returns the step that redoes the edit."""
+        inverse = HistoryStep(image.size, self.store)
+        for patch in reversed(self.patches):
+            inverse.patches.append(Patch(patch.box, image.crop(patch.box), self.store))
+            image.paste(patch.image, patch.box[:2])
+        return inverse
+
+    def release(self):
+        """Frees the patches' pixels once the step has left the undo and redo stacks."""
+        for patch in self.patches:
+            patch.release()
+        self.patches = []
+
+
+class HistoryCompressor:
+    """Compresses the patches of history steps on a daemon thread, so pushing a step never waits on a codec.
+
+    It keeps its own single worker rather than using the idle scheduler's pool:
+    a step's archive pass must land after its first pass, and two pool threads
+    compressing the same key would leave whichever finished last. There is no
+    result to hand back to the Tk thread either.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._queue = queue.Queue()
+        self._thread = None
+
+    def submit(self, step, codec):
+        """Queues every stored patch of step for compression with one of paint_spill.CODECS."""
+        keys = [patch.key for patch in step.patches if patch.key is not None]
+        if not keys or not codec:
+            return
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="history-compressor", daemon=True)
+            self._thread.start()
+        self._queue.put((keys, codec))
+
+    def _run(self):
+        while True:
+            keys, codec = self._queue.get()
+            for key in keys:
+                try:
+                    self.store.compress(key, codec)
+                except Exception as e:
+                    print(f"History compression failed: {e}")  # The tile simply stays uncompressed
@@ -0,0 +1,60 @@
+from PIL import Image, ImageChops, ImageColor, ImageDraw
+
+# Pure image operations shared by the interactive app (PaintApp) and the headless batch CLI,
+# so both produce the same pixels for the same input.
+
+
+def parse_color(color):
+    """Tk-style color ('#rrggbb' or a name like 'black') to an RGB tuple."""
+    return ImageColor.getrgb(color)[:3]
+
+
+def rotate_image(image, angle):
+    return image.rotate(angle, expand=True, resample=Image.Resampling.BICUBIC)
+
+
+def flip_image(image, direction):
+    return image.transpose(Image.FLIP_LEFT_RIGHT if direction == "horizontal" else Image.FLIP_TOP_BOTTOM)
+
+
+def resize_image(image, width, height):
+    return image.resize((width, height), Image.Resampling.LANCZOS)
+
+
+def apply_background(image, color):
+    """Flattens any transparency onto a solid background color and returns an RGB image."""
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        rgba = image.convert("RGBA")
+        background = Image.new("RGBA", rgba.size, parse_color(color) + (255,))
+        return Image.alpha_composite(background, rgba).convert("RGB")
+    return image.convert("RGB")
+
+
+def flood_fill(image, x, y, color):
+    """Fills the 4-connected region of exactly matching color around (x, y), in place.
+
+    image must be RGB. Returns the bounding box of the changed pixels, or None if (x, y)
+    is outside the image or already has the fill color.
+    """
+    if not (0 <= x < image.width and 0 <= y < image.height):
+        return None
+    replacement = parse_color(color)
+    if image.getpixel((x, y)) == replacement:
+        return None
+    original = image.copy()
+    ImageDraw.floodfill(image, (x, y), replacement, thresh=0)
+    return ImageChops.difference(original, image).getbbox()
+
+
+def region_mask(image, x, y):
+    """Box and L mask of the 4-connected region of exactly (x, y)'s color in an RGB image."""
+    filled = image.copy()
+    marker = '#%02x%02x%02x' % tuple(255 - v for v in image.getpixel((x, y)))  # Any color but the region's
+    box = flood_fill(filled, x, y, marker)
+    return box, changed_mask(image.crop(box), filled.crop(box))
+
+
+def changed_mask(before, after):
+    """L mask that is 255 wherever two same-sized images differ."""
+    difference = ImageChops.difference(before, after).point(lambda v: 255 if v else 0)
+    return difference.convert("L").point(lambda v: 255 if v else 0)
@@ -0,0 +1,83 @@
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image
+
+BLOCK_SIZE = 256  # Patterns are pre-tiled into blocks on this grid of the document
+
+
+class Pattern:
+    """An RGBA fill pattern, repeated from the document origin."""
+
+    __slots__ = ("image", "name", "key")
+
+    def __init__(self, image, name=""):
+        self.image = image.convert("RGBA")
+        self.name = name
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(repr(self.image.size).encode("ascii"))
+        digest.update(self.image.tobytes())
+        self.key = digest.hexdigest()  # Same pixels, same cached blocks, wherever the pattern came from
+
+
+class PatternCache:
+    """Pre-tiled BLOCK_SIZE blocks of patterns, keyed by pattern and phase; least recently used go first.
+
+    Blocks sit on a fixed grid of the document, so a block's phase (its origin
+    modulo the pattern size) is all that tells two of them apart: a pattern that
+    divides the grid needs a single block however large the fills get.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._blocks = OrderedDict()  # (pattern key, phase x, phase y) -> RGBA block
+        self.resident_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def block(self, pattern, phase):
+        key = (pattern.key,) + phase
+        block = self._blocks.get(key)
+        if block is not None:
+            self.hits += 1
+            self._blocks.move_to_end(key)
+            return block
+        self.misses += 1
+        block = self._tile(pattern, phase)
+        self._blocks[key] = block
+        self.resident_bytes += BLOCK_SIZE * BLOCK_SIZE * 4
+        while self.resident_bytes > self.max_bytes and len(self._blocks) > 1:
+            self._blocks.popitem(last=False)
+            self.resident_bytes -= BLOCK_SIZE * BLOCK_SIZE * 4
+        return block
+
+    @staticmethod
+    def _tile(pattern, phase):
+        pixels = np.asarray(pattern.image)
+        height, width = pixels.shape[:2]
+        x, y = phase
+        reps = (-(-(BLOCK_SIZE + y) // height), -(-(BLOCK_SIZE + x) // width), 1)
+        return Image.fromarray(np.ascontiguousarray(np.tile(pixels, reps)[y:y + BLOCK_SIZE, x:x + BLOCK_SIZE]), "RGBA")
+
+    def fill(self, target, pattern, box, mask=None):
+        """Pastes the pattern into box of target (document coordinates) through mask, which covers box.
+
+        One masked paste per grid block the box touches; no pixel is visited twice.
+        """
+        left, top, right, bottom = box
+        width, height = pattern.image.size
+        for y in range(top - top % BLOCK_SIZE, bottom, BLOCK_SIZE):
+            for x in range(left - left % BLOCK_SIZE, right, BLOCK_SIZE):
+                block = self.block(pattern, (x % width, y % height))
+                part = (max(x, left), max(y, top), min(x + BLOCK_SIZE, right), min(y + BLOCK_SIZE, bottom))
+                source = block.crop((part[0] - x, part[1] - y, part[2] - x, part[3] - y))
+                if mask is None:
+                    target.paste(source, part[:2])
+                else:
+                    target.paste(source, part[:2], mask.crop((part[0] - left, part[1] - top,
+                                                              part[2] - left, part[3] - top)))
+
+    def clear(self):
+        self._blocks.clear()
+        self.resident_bytes = 0
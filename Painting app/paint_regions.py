@@ -0,0 +1,161 @@
+import numpy as np
+
+TILE_SIZE = 256
+
+
+def pack_rgb(pixels):
+    """(H, W, 3) uint8 array -> (H, W) uint32 array with one value per color."""
+    pixels = pixels.astype(np.uint32)
+    return (pixels[..., 0] << 16) | (pixels[..., 1] << 8) | pixels[..., 2]
+
+
+def connect(count, a, b):
+    """Union-find over count nodes joined by the pairs (a[i], b[i]), vectorized.
+
+    Returns each node's root, the smallest node in its set. Roots hook onto the
+    smaller root of every pair, then pointer jumping flattens the forest; this
+    repeats until no pair spans two sets.
+    """
+    parent = np.arange(count, dtype=np.int64)
+    while len(a):
+        root_a, root_b = parent[a], parent[b]
+        split = root_a != root_b
+        if not split.any():
+            break
+        a, b, root_a, root_b = a[split], b[split], root_a[split], root_b[split]
+        low = np.minimum(root_a, root_b)
+        np.minimum.at(parent, root_a, low)
+        np.minimum.at(parent, root_b, low)
+        while True:
+            grand = parent[parent]
+            if np.array_equal(grand, parent):
+                break
+            parent = grand
+    return parent
+
+
+def label_fragments(keys, tile_size=TILE_SIZE):
+    """Labels the 4-connected same-value components of keys, split at tile boundaries.
+
+    Works on whole rows of runs at once: runs of equal values along each row are
+    the nodes, vertically touching runs of the same value are the edges.
+    Returns (labels as an int64 array shaped like keys, number of labels).
+    """
+    height, width = keys.shape
+    starts = np.ones((height, width), dtype=bool)
+    starts[:, 1:] = keys[:, 1:] != keys[:, :-1]
+    starts[:, ::tile_size] = True
+    runs = np.cumsum(starts, axis=None).reshape(height, width) - 1
+    same = keys[1:] == keys[:-1]
+    same[tile_size - 1::tile_size] = False  # No links across horizontal tile boundaries
+    pairs = np.unique(runs[1:][same] * np.int64(runs[-1, -1] + 1) + runs[:-1][same])
+    run_count = runs[-1, -1] + 1
+    roots = connect(run_count, pairs // run_count, pairs % run_count)
+    _, compact = np.unique(roots, return_inverse=True)
+    return compact.reshape(-1)[runs], int(compact.max()) + 1
+
+
+class RegionIndex:
+    """Same-color connected regions of an image, for fills that are a lookup instead of a traversal.
+
+    Regions are labelled as fragments that never cross a tile boundary, then
+    stitched across tile edges on demand. update() relabels only the tiles that
+    intersect the changed rectangles; the stitch is redone only after a change.
+    """
+
+    def __init__(self, tile_size=TILE_SIZE):
+        self.tile_size = tile_size
+        self.keys = None  # Packed color per pixel
+        self.fragments = None  # Fragment label per pixel
+        self.fragment_tile = None  # Tile index per fragment label
+        self.next_label = 0
+        self.live_labels = 0
+        self._tile_counts = None
+        self._roots = None  # Region root per fragment, None until stitched
+
+    def _tile_box(self, index):
+        columns = -(-self.keys.shape[1] // self.tile_size)
+        x1, y1 = (index % columns) * self.tile_size, (index // columns) * self.tile_size
+        return (x1, y1, min(x1 + self.tile_size, self.keys.shape[1]), min(y1 + self.tile_size, self.keys.shape[0]))
+
+    def _tiles_in(self, rect):
+        columns = -(-self.keys.shape[1] // self.tile_size)
+        x1, y1, x2, y2 = rect
+        return {ty * columns + tx
+                for ty in range(y1 // self.tile_size, (y2 - 1) // self.tile_size + 1)
+                for tx in range(x1 // self.tile_size, (x2 - 1) // self.tile_size + 1)}
+
+    def rebuild(self, image):
+        """Labels a whole RGB image in one pass."""
+        self.keys = pack_rgb(np.asarray(image))
+        self.fragments, self.next_label = label_fragments(self.keys, self.tile_size)
+        height, width = self.keys.shape
+        columns, rows = -(-width // self.tile_size), -(-height // self.tile_size)
+        _, first = np.unique(self.fragments, return_index=True)
+        first_y, first_x = np.divmod(first, width)
+        self.fragment_tile = (first_y // self.tile_size) * columns + first_x // self.tile_size
+        self._tile_counts = np.bincount(self.fragment_tile, minlength=columns * rows)
+        self.live_labels = self.next_label
+        self._roots = None
+
+    def update(self, image, rects=None):
+        """Brings the index up to date with image, relabelling only tiles that intersect rects."""
+        if self.keys is None or self.keys.shape != (image.height, image.width) or rects is None:
+            self.rebuild(image)
+            return
+        tiles = set()
+        for rect in rects:
+            tiles |= self._tiles_in(rect)
+        if not tiles:
+            return
+        if len(tiles) * self.tile_size ** 2 > self.keys.size // 2:
+            self.rebuild(image)  # Most of the image changed; one whole pass is cheaper
+            return
+        labels = [self.fragment_tile]
+        for index in sorted(tiles):
+            x1, y1, x2, y2 = self._tile_box(index)
+            keys = pack_rgb(np.asarray(image.crop((x1, y1, x2, y2))))
+            fragments, count = label_fragments(keys, self.tile_size)
+            self.keys[y1:y2, x1:x2] = keys
+            self.fragments[y1:y2, x1:x2] = fragments + self.next_label
+            labels.append(np.full(count, index, dtype=self.fragment_tile.dtype))
+            self.next_label += count
+            self.live_labels += count - self._tile_counts[index]
+            self._tile_counts[index] = count
+        self.fragment_tile = np.concatenate(labels)
+        self._roots = None
+        if self.next_label > 2 * self.live_labels + 65536:
+            self.rebuild(image)  # Too many dead labels from relabelled tiles; compact them
+
+    def _stitch(self):
+        height, width = self.keys.shape
+        a, b = [], []
+        columns = np.arange(self.tile_size, width, self.tile_size)
+        if len(columns):
+            same = self.keys[:, columns - 1] == self.keys[:, columns]
+            a.append(self.fragments[:, columns - 1][same])
+            b.append(self.fragments[:, columns][same])
+        rows = np.arange(self.tile_size, height, self.tile_size)
+        if len(rows):
+            same = self.keys[rows - 1] == self.keys[rows]
+            a.append(self.fragments[rows - 1][same])
+            b.append(self.fragments[rows][same])
+        if not a:
+            return np.arange(self.next_label, dtype=np.int64)
+        pairs = np.unique(np.concatenate(a) * np.int64(self.next_label) + np.concatenate(b))
+        return connect(self.next_label, pairs // self.next_label, pairs % self.next_label)
+
+    def region(self, x, y):
+        """Returns ((x1, y1, x2, y2), mask) for the region containing pixel (x, y); mask is a bool array over the box."""
+        if self._roots is None:
+            self._roots = self._stitch()
+        members = np.flatnonzero(self._roots == self._roots[self.fragments[y, x]])
+        boxes = [self._tile_box(index) for index in np.unique(self.fragment_tile[members])]
+        left, top = min(box[0] for box in boxes), min(box[1] for box in boxes)
+        right, bottom = max(box[2] for box in boxes), max(box[3] for box in boxes)
+        mask = np.zeros((bottom - top, right - left), dtype=bool)
+        for x1, y1, x2, y2 in boxes:
+            mask[y1 - top:y2 - top, x1 - left:x2 - left] = np.isin(self.fragments[y1:y2, x1:x2], members)
+        rows, columns = np.flatnonzero(mask.any(axis=1)), np.flatnonzero(mask.any(axis=0))
+        mask = mask[rows[0]:rows[-1] + 1, columns[0]:columns[-1] + 1]
+        return (left + columns[0], top + rows[0], left + columns[-1] + 1, top + rows[-1] + 1), mask
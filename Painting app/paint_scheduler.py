@@ -0,0 +1,192 @@
+import heapq
+import itertools
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 10
+PRIORITY_LOW = 20
+SLICE_MS = 8  # Tk-thread work per slice before input gets a turn again
+POLL_MS = 20  # How often finished pool jobs are collected while any are out
+
+
+class Task:
+    """A scheduled piece of background work; cancel() stops it wherever it is."""
+
+    __slots__ = ("name", "priority", "steps", "call", "future", "started", "on_done", "on_error", "cancelled")
+
+    def __init__(self, name, priority, steps=None, call=None, on_done=None, on_error=None):
+        self.name = name
+        self.priority = priority
+        self.steps = steps  # Iterator run a step at a time on the Tk thread
+        self.call = call  # (executor kind, fn, args) run in a pool instead
+        self.future = None
+        self.started = None  # When the pool job went out
+        self.on_done = on_done
+        self.on_error = on_error
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+        if self.future is not None:
+            self.future.cancel()  # A job already running finishes, but its result is dropped
+        if hasattr(self.steps, "close"):
+            self.steps.close()
+
+
+class IdleScheduler:
+    """Runs background tasks in short slices on the Tk event loop, so input is never blocked for long.
+
+    add() takes an iterator, usually a generator that yields between chunks of
+    work; each slice advances the ready tasks, lowest priority value first, until
+    slice_ms is spent. submit() hands a CPU-heavy call to a thread or process pool
+    instead; its result comes back through on_done on the Tk thread. Tasks of equal
+    priority take turns.
+    """
+
+    def __init__(self, master, slice_ms=SLICE_MS, max_workers=None):
+        self.master = master
+        self.slice = slice_ms / 1000
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._ready = []  # Heap of (priority, sequence, task) stepping on the Tk thread
+        self._waiting = []  # Heap of (priority, sequence, task) for the pools
+        self._running = []  # Tasks whose pool job is out
+        self._sequence = itertools.count()
+        self._job = None
+        self._pools = {}
+        self.task_stats = {}  # Task name -> counters, see stats()
+
+    def add(self, steps, name, priority=PRIORITY_NORMAL, on_done=None, on_error=None):
+        """Schedules an iterator; on_done gets a generator's return value when it finishes."""
+        task = Task(name, priority, steps=iter(steps), on_done=on_done, on_error=on_error)
+        heapq.heappush(self._ready, (priority, next(self._sequence), task))
+        self._wake()
+        return task
+
+    def submit(self, fn, *args, name, priority=PRIORITY_NORMAL, on_done=None, on_error=None, process=False):
+        """Schedules fn(*args) in a thread pool, or a process pool if process (fn and args must pickle)."""
+        task = Task(name, priority, call=("process" if process else "thread", fn, args),
+                    on_done=on_done, on_error=on_error)
+        heapq.heappush(self._waiting, (priority, next(self._sequence), task))
+        self._wake()
+        return task
+
+    def stats(self):
+        """Queue depth and per-task counters: runs, seconds spent, longest single run, completions, failures.
+
+        For pool jobs a run is the whole job, timed from launch until its result was collected.
+        """
+        return {
+            "queued": sum(1 for _, _, task in self._ready + self._waiting if not task.cancelled),
+            "in_pool": len(self._running),
+            "tasks": {name: dict(counters) for name, counters in self.task_stats.items()},
+        }
+
+    def shutdown(self):
+        for _, _, task in self._ready + self._waiting:
+            task.cancel()
+        for task in self._running:
+            task.cancel()
+        self._ready, self._waiting, self._running = [], [], []
+        if self._job is not None:
+            self.master.after_cancel(self._job)
+            self._job = None
+        for pool in self._pools.values():
+            pool.shutdown(wait=False, cancel_futures=True)
+        self._pools.clear()
+
+    # --- Internals; all on the Tk thread ---
+    def _counters(self, name):
+        counters = self.task_stats.get(name)
+        if counters is None:
+            counters = self.task_stats[name] = {"runs": 0, "seconds": 0.0, "longest": 0.0,
+                                                "completed": 0, "failed": 0, "cancelled": 0}
+        return counters
+
+    def _wake(self):
+        if self._job is None:
+            self._job = self.master.after_idle(self._tick)
+
+    def _tick(self):
+        self._job = None
+        deadline = time.perf_counter() + self.slice
+        self._collect()
+        self._launch()
+        while self._ready and time.perf_counter() < deadline:
+            _, _, task = heapq.heappop(self._ready)
+            counters = self._counters(task.name)
+            if task.cancelled:
+                counters["cancelled"] += 1
+                continue
+            start = time.perf_counter()
+            try:
+                next(task.steps)
+            except StopIteration as stop:
+                self._finish(task, counters, start, stop.value)
+            except Exception as e:
+                self._fail(task, counters, start, e)
+            else:
+                self._record(counters, start)
+                heapq.heappush(self._ready, (task.priority, next(self._sequence), task))
+        if self._ready:
+            self._job = self.master.after(1, self._tick)  # Let pending input in before the next slice
+        elif self._running or self._waiting:
+            self._job = self.master.after(POLL_MS, self._tick)
+
+    def _launch(self):
+        while self._waiting and len(self._running) < self.max_workers:
+            _, _, task = heapq.heappop(self._waiting)
+            if task.cancelled:
+                self._counters(task.name)["cancelled"] += 1
+                continue
+            kind, fn, args = task.call
+            task.started = time.perf_counter()
+            task.future = self._pool(kind).submit(fn, *args)
+            self._running.append(task)
+
+    def _collect(self):
+        for task in [task for task in self._running if task.future.done()]:
+            self._running.remove(task)
+            counters = self._counters(task.name)
+            if task.cancelled or task.future.cancelled():
+                counters["cancelled"] += 1
+            elif task.future.exception() is not None:
+                self._fail(task, counters, task.started, task.future.exception())
+            else:
+                self._finish(task, counters, task.started, task.future.result())
+
+    def _pool(self, kind):
+        pool = self._pools.get(kind)
+        if pool is None:
+            if kind == "process":
+                # Spawned rather than forked workers, so the pool is safe to start from a GUI process
+                pool = ProcessPoolExecutor(self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+            else:
+                pool = ThreadPoolExecutor(self.max_workers, thread_name_prefix="idle-scheduler")
+            self._pools[kind] = pool
+        return pool
+
+    def _record(self, counters, start):
+        elapsed = time.perf_counter() - start
+        counters["runs"] += 1
+        counters["seconds"] += elapsed
+        counters["longest"] = max(counters["longest"], elapsed)
+
+    def _finish(self, task, counters, start, result):
+        self._record(counters, start)
+        counters["completed"] += 1
+        if task.on_done is not None:
+            try:
+                task.on_done(result)
+            except Exception as e:
+                print(f"Background task {task.name} callback failed: {e}")
+
+    def _fail(self, task, counters, start, error):
+        self._record(counters, start)
+        counters["failed"] += 1
+        if task.on_error is not None:
+            task.on_error(error)
+        else:
+            print(f"Background task {task.name} failed: {error}")
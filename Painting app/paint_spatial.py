@@ -0,0 +1,108 @@
+import math
+
+
+class SpatialIndex:
+    """Uniform-grid index of canvas items by bounding box.
+
+    Every item is registered in each grid cell its bbox touches, so point and
+    rectangle queries only look at the handful of cells they cover instead of
+    every item on the canvas. Results come back in insertion order, which
+    matches the canvas stacking order (topmost item last).
+    """
+
+    def __init__(self, cell_size=64):
+        self.cell_size = cell_size
+        self._cells = {}  # (col, row) -> set of items
+        self._bboxes = {}  # item -> (x1, y1, x2, y2)
+        self._order = {}  # item -> insertion sequence number
+        self._next_order = 0
+
+    def __len__(self):
+        return len(self._bboxes)
+
+    def __contains__(self, item):
+        return item in self._bboxes
+
+    def _cell_range(self, bbox):
+        x1, y1, x2, y2 = bbox
+        size = self.cell_size
+        return (math.floor(min(x1, x2) / size), math.floor(min(y1, y2) / size),
+                math.floor(max(x1, x2) / size), math.floor(max(y1, y2) / size))
+
+    def _cells_for(self, bbox):
+        col1, row1, col2, row2 = self._cell_range(bbox)
+        for col in range(col1, col2 + 1):
+            for row in range(row1, row2 + 1):
+                yield (col, row)
+
+    def insert(self, item, bbox):
+        """Adds an item, or re-registers it if it is already indexed (keeping its stacking order)."""
+        if item in self._bboxes:
+            self._unlink(item)
+        else:
+            self._order[item] = self._next_order
+            self._next_order += 1
+        bbox = tuple(bbox)
+        self._bboxes[item] = bbox
+        for cell in self._cells_for(bbox):
+            self._cells.setdefault(cell, set()).add(item)
+
+    def update(self, item, bbox):
+        self.insert(item, bbox)
+
+    def move(self, item, dx, dy):
+        bbox = self._bboxes.get(item)
+        if bbox is not None:
+            x1, y1, x2, y2 = bbox
+            self.insert(item, (x1 + dx, y1 + dy, x2 + dx, y2 + dy))
+
+    def remove(self, item):
+        if item in self._bboxes:
+            self._unlink(item)
+            del self._bboxes[item]
+            del self._order[item]
+
+    def _unlink(self, item):
+        for cell in self._cells_for(self._bboxes[item]):
+            members = self._cells.get(cell)
+            if members is not None:
+                members.discard(item)
+                if not members:
+                    del self._cells[cell]
+
+    def clear(self):
+        self._cells.clear()
+        self._bboxes.clear()
+        self._order.clear()
+
+    def bbox(self, item):
+        return self._bboxes.get(item)
+
+    def items(self):
+        return sorted(self._bboxes, key=self._order.__getitem__)
+
+    def query_point(self, x, y):
+        """Items whose bbox contains (x, y), bottom to top."""
+        cell = (math.floor(x / self.cell_size), math.floor(y / self.cell_size))
+        hits = [item for item in self._cells.get(cell, ())
+                if self._bboxes[item][0] <= x <= self._bboxes[item][2]
+                and self._bboxes[item][1] <= y <= self._bboxes[item][3]]
+        return sorted(hits, key=self._order.__getitem__)
+
+    def query_rect(self, bbox):
+        """Items whose bbox intersects the rectangle (x1, y1, x2, y2), bottom to top."""
+        x1, y1, x2, y2 = min(bbox[0], bbox[2]), min(bbox[1], bbox[3]), max(bbox[0], bbox[2]), max(bbox[1], bbox[3])
+        candidates = set()
+        col1, row1, col2, row2 = self._cell_range((x1, y1, x2, y2))
+        if (col2 - col1 + 1) * (row2 - row1 + 1) > len(self._cells):
+            # Large query: walking the occupied cells is cheaper than walking the covered ones
+            for (col, row), members in self._cells.items():
+                if col1 <= col <= col2 and row1 <= row <= row2:
+                    candidates.update(members)
+        else:
+            for cell in self._cells_for((x1, y1, x2, y2)):
+                candidates.update(self._cells.get(cell, ()))
+        hits = [item for item in candidates
+                if self._bboxes[item][0] <= x2 and self._bboxes[item][2] >= x1
+                and self._bboxes[item][1] <= y2 and self._bboxes[item][3] >= y1]
+        return sorted(hits, key=self._order.__getitem__)
@@ -0,0 +1,304 @@
+import atexit
+import itertools
+import lzma
+import mmap
+import os
+import shutil
+import tempfile
+import threading
+import zlib
+from collections import OrderedDict
+
+from PIL import Image
+
+SCRATCH_PREFIX = "paint-scratch-"
+DEFAULT_BUDGET = 256 * 1024 * 1024  # Bytes of tile pixels kept in RAM before spilling
+GROW_STEP = 64 * 1024 * 1024  # The scratch file grows in steps of at least this much
+
+# Codec name -> (compress, decompress). zlib at level 1 is the fast default; lzma packs
+# paint states several times tighter again, at a cost only worth paying for cold tiles.
+CODECS = {
+    "zlib": (lambda data: zlib.compress(data, 1), zlib.decompress),
+    "lzma": (lambda data: lzma.compress(data, preset=6), lzma.decompress),
+}
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def sweep_stale_scratch(root=None):
+    """Deletes scratch directories left behind by sessions that crashed. Returns how many were removed."""
+    root = root or tempfile.gettempdir()
+    removed = 0
+    for name in os.listdir(root):
+        if not name.startswith(SCRATCH_PREFIX):
+            continue
+        pid = name[len(SCRATCH_PREFIX):].split("-", 1)[0]
+        if not pid.isdigit() or int(pid) == os.getpid():
+            continue
+        # os.kill(pid, 0) would terminate the process on Windows; there a live session's
+        # mapped scratch file simply cannot be deleted, so rmtree leaves it alone.
+        if os.name != "nt" and _process_alive(int(pid)):
+            continue
+        shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+        removed += 1
+    return removed
+
+
+class Packed:
+    """A tile's pixels compressed with one of CODECS."""
+
+    __slots__ = ("codec", "mode", "size", "data")
+
+    def __init__(self, codec, mode, size, data):
+        self.codec = codec
+        self.mode = mode
+        self.size = size
+        self.data = data
+
+    @classmethod
+    def pack(cls, image, codec):
+        return cls(codec, image.mode, image.size, CODECS[codec][0](image.tobytes()))
+
+    def unpack(self):
+        return Image.frombytes(self.mode, self.size, CODECS[self.codec][1](self.data))
+
+
+class SpillStore:
+    """Keeps image tiles in RAM up to a byte budget and spills the least recently used to a scratch file.
+
+    put() returns a key; get(key) returns the tile, paging it back in from the
+    memory-mapped scratch file if it was spilled. Tiles are treated as immutable,
+    so a tile that was spilled once keeps its disk copy and can be dropped from
+    RAM again without another write.
+
+    compress(key, codec) swaps a tile for its compressed form, in RAM or on disk.
+    It is meant to run on a worker thread; get() decompresses on demand.
+
+    put_mapped() adopts a tile that lives in someone else's read-only mapping
+    (a saved workspace); it is read from there like a spilled tile.
+    """
+
+    def __init__(self, budget=DEFAULT_BUDGET, directory=None):
+        self.budget = budget
+        self.directory = directory
+        self._resident = OrderedDict()  # key -> image or Packed, least recently used first
+        self._spilled = {}  # key -> (offset, length, codec or None, mode, size)
+        self._mapped = {}  # key -> (buffer, offset, length, codec or None, mode, size)
+        self._free = []  # (offset, length) holes in the scratch file
+        self._keys = itertools.count()
+        self._lock = threading.Lock()
+        self._file = None
+        self._map = None
+        self._end = 0  # Scratch bytes handed out so far, holes included
+        self.resident_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.spills = 0
+        self.compressions = 0
+        atexit.register(self.close)
+
+    def __contains__(self, key):
+        return key in self._resident or key in self._spilled or key in self._mapped
+
+    def put(self, image):
+        with self._lock:
+            key = next(self._keys)
+            self._resident[key] = image
+            self.resident_bytes += _nbytes(image)
+            self._enforce_budget(keep=key)
+            return key
+
+    def put_mapped(self, buffer, offset, length, codec, mode, size):
+        with self._lock:
+            key = next(self._keys)
+            self._mapped[key] = (buffer, offset, length, codec, mode, size)
+            return key
+
+    def packed(self, key, codec):
+        """The tile as a Packed, reusing its compressed form if it has one; for copying it elsewhere."""
+        with self._lock:
+            entry = self._resident.get(key)
+            if entry is None:
+                entry = self._read(key)
+        return entry if isinstance(entry, Packed) else Packed.pack(entry, codec)
+
+    def detach_mapped(self):
+        """Copies every tile still read from a foreign mapping into the store, so that mapping can close."""
+        with self._lock:
+            for key in list(self._mapped):
+                entry = self._read(key)
+                del self._mapped[key]
+                if key not in self._resident:
+                    self._resident[key] = entry
+                    self._resident.move_to_end(key, last=False)
+                    self.resident_bytes += _nbytes(entry)
+            self._enforce_budget(keep=None)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._resident.get(key)
+            if entry is not None:
+                self._resident.move_to_end(key)
+                self.hits += 1
+            else:
+                entry = self._read(key)
+                self.misses += 1
+                self._resident[key] = entry
+                self.resident_bytes += _nbytes(entry)
+                self._enforce_budget(keep=key)
+        # Compressed tiles stay compressed in the store; callers get a fresh image
+        return entry.unpack() if isinstance(entry, Packed) else entry
+
+    def compress(self, key, codec):
+        """Replaces a tile with its compressed form. Returns False if it was gone or already packed that way."""
+        with self._lock:
+            entry = self._resident.get(key)
+            if entry is None:
+                if key not in self._spilled and key not in self._mapped:
+                    return False
+                entry = self._read(key)
+        if isinstance(entry, Packed):
+            if entry.codec == codec:
+                return False
+            entry = entry.unpack()
+        packed = Packed.pack(entry, codec)  # zlib and lzma release the GIL while they work
+        with self._lock:
+            if key not in self:
+                return False  # Discarded while we were compressing
+            self._drop(key)
+            self._resident[key] = packed
+            self._resident.move_to_end(key, last=False)  # Compressed tiles are cold; spill them first
+            self.resident_bytes += _nbytes(packed)
+            self.compressions += 1
+            self._enforce_budget(keep=None)
+            return True
+
+    def discard(self, key):
+        with self._lock:
+            self._drop(key)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "spills": self.spills,
+                "resident_tiles": len(self._resident),
+                "spilled_tiles": len(self._spilled),
+                "mapped_tiles": len(self._mapped),
+                "compressed_tiles": sum(1 for entry in self._resident.values() if isinstance(entry, Packed)),
+                "compressions": self.compressions,
+                "resident_bytes": self.resident_bytes,
+                "spilled_bytes": sum(slot[1] for slot in self._spilled.values()),
+                "file_bytes": len(self._map) if self._map is not None else 0,
+            }
+
+    def close(self):
+        """Unmaps and deletes the scratch file. Safe to call more than once."""
+        with self._lock:
+            if self._map is not None:
+                self._map.close()
+                self._map = None
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+                shutil.rmtree(self._scratch_dir, ignore_errors=True)
+            self._spilled.clear()
+            self._free.clear()
+            self._end = 0
+
+    # --- Internals; callers hold the lock ---
+    def _drop(self, key):
+        entry = self._resident.pop(key, None)
+        if entry is not None:
+            self.resident_bytes -= _nbytes(entry)
+        slot = self._spilled.pop(key, None)
+        if slot is not None:
+            self._release(slot[0], slot[1])
+        self._mapped.pop(key, None)
+
+    def _read(self, key):
+        if key in self._spilled:
+            buffer, (offset, length, codec, mode, size) = self._map, self._spilled[key]
+        else:
+            buffer, offset, length, codec, mode, size = self._mapped[key]
+        data = buffer[offset:offset + length]
+        return Image.frombytes(mode, size, data) if codec is None else Packed(codec, mode, size, data)
+
+    def _enforce_budget(self, keep):
+        for key in list(self._resident):
+            if self.resident_bytes <= self.budget:
+                break
+            if key == keep:
+                continue
+            entry = self._resident.pop(key)
+            if key not in self._spilled and key not in self._mapped:
+                self._write(key, entry)
+            self.resident_bytes -= _nbytes(entry)
+
+    def _write(self, key, entry):
+        if isinstance(entry, Packed):
+            data, codec = entry.data, entry.codec
+        else:
+            data, codec = entry.tobytes(), None
+        offset = self._allocate(len(data))
+        self._map[offset:offset + len(data)] = data
+        self._spilled[key] = (offset, len(data), codec, entry.mode, entry.size)
+        self.spills += 1
+
+    def _allocate(self, length):
+        for i, (offset, size) in enumerate(self._free):
+            if size >= length:
+                if size == length:
+                    del self._free[i]
+                else:
+                    self._free[i] = (offset + length, size - length)
+                return offset
+        if self._map is None:
+            self._open()
+        if self._end + length > len(self._map):
+            self._grow(self._end + length)
+        offset, self._end = self._end, self._end + length
+        return offset
+
+    def _release(self, offset, length):
+        self._free.append((offset, length))
+        self._free.sort()
+        merged = [self._free[0]]
+        for start, size in self._free[1:]:
+            last_start, last_size = merged[-1]
+            if last_start + last_size == start:
+                merged[-1] = (last_start, last_size + size)
+            else:
+                merged.append((start, size))
+        # A hole at the end just gives the space back to the bump allocator
+        if merged and merged[-1][0] + merged[-1][1] == self._end:
+            self._end = merged.pop()[0]
+        self._free = merged
+
+    def _open(self):
+        sweep_stale_scratch(self.directory)
+        self._scratch_dir = tempfile.mkdtemp(prefix=f"{SCRATCH_PREFIX}{os.getpid()}-", dir=self.directory)
+        self._file = open(os.path.join(self._scratch_dir, "tiles.bin"), "w+b")
+        self._file.truncate(GROW_STEP)
+        self._map = mmap.mmap(self._file.fileno(), GROW_STEP)
+
+    def _grow(self, needed):
+        size = max(needed, len(self._map) + GROW_STEP)
+        self._map.close()
+        self._file.truncate(size)
+        self._map = mmap.mmap(self._file.fileno(), size)
+
+
+def _nbytes(entry):
+    if isinstance(entry, Packed):
+        return len(entry.data)
+    return entry.width * entry.height * len(entry.getbands())
@@ -0,0 +1,91 @@
+import math
+
+DEFAULT_SPACING = 2.0  # Pixels between resampled points
+DEFAULT_TOLERANCE = 0.75  # Max deviation, in pixels, allowed when simplifying a finished stroke
+
+
+def resample(points, spacing=DEFAULT_SPACING):
+    """Resamples a polyline [(x, y), ...] to points spaced evenly along its arc length.
+
+    The first and last input points are always kept.
+    """
+    if len(points) < 2 or spacing <= 0:
+        return list(points)
+    result = [points[0]]
+    carried = 0.0  # Arc length walked since the last emitted point
+    for (x1, y1), (x2, y2) in zip(points, points[1:]):
+        segment = math.hypot(x2 - x1, y2 - y1)
+        distance = spacing - carried
+        while distance <= segment:
+            t = distance / segment
+            result.append((x1 + (x2 - x1) * t, y1 + (y2 - y1) * t))
+            distance += spacing
+        carried = segment - (distance - spacing)
+    if result[-1] != points[-1]:
+        result.append(points[-1])
+    return result
+
+
+def simplify(points, tolerance=DEFAULT_TOLERANCE):
+    """Ramer-Douglas-Peucker simplification of a polyline [(x, y), ...].
+
+    Iterative, so very long strokes cannot hit the recursion limit.
+    """
+    if len(points) < 3 or tolerance <= 0:
+        return list(points)
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        (x1, y1), (x2, y2) = points[first], points[last]
+        dx, dy = x2 - x1, y2 - y1
+        length = math.hypot(dx, dy)
+        max_distance, index = -1.0, first
+        for i in range(first + 1, last):
+            px, py = points[i]
+            if length:
+                distance = abs(dy * (px - x1) - dx * (py - y1)) / length
+            else:
+                distance = math.hypot(px - x1, py - y1)
+            if distance > max_distance:
+                max_distance, index = distance, i
+        if max_distance > tolerance:
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+    return [p for p, kept in zip(points, keep) if kept]
+
+
+class StrokeBuilder:
+    """Turns raw motion samples into evenly spaced points for drawing while the stroke is in progress."""
+
+    def __init__(self, x, y, spacing=DEFAULT_SPACING, tolerance=DEFAULT_TOLERANCE):
+        self.spacing = spacing
+        self.tolerance = tolerance
+        self.raw_count = 1
+        self.points = [(x, y)]  # Resampled points emitted so far
+        self._previous = (x, y)  # Last raw sample
+        self._carried = 0.0  # Arc length walked since the last emitted point
+
+    def add(self, x, y):
+        """Feeds one motion sample. Returns the newly emitted points (possibly none)."""
+        self.raw_count += 1
+        x1, y1 = self._previous
+        segment = math.hypot(x - x1, y - y1)
+        fresh = []
+        distance = self.spacing - self._carried
+        while segment and distance <= segment:
+            t = distance / segment
+            fresh.append((x1 + (x - x1) * t, y1 + (y - y1) * t))
+            distance += self.spacing
+        self._carried = segment - (distance - self.spacing)
+        self._previous = (x, y)
+        self.points.extend(fresh)
+        return fresh
+
+    def finish(self):
+        """Ends the stroke and returns its simplified points for storage."""
+        if self._previous != self.points[-1]:
+            self.points.append(self._previous)
+        return simplify(self.points, self.tolerance)
@@ -0,0 +1,57 @@
+import functools
+import os
+
+from PIL import Image, ImageDraw, ImageFont
+
+FONTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fonts")
+
+# Bold face files tried for each family, first in FONTS_DIR and then through the system font path.
+FONT_FILES = {
+    "Inter": ["Inter-Bold.ttf", "Inter-Bold.otf", "InterDisplay-Bold.ttf"],
+    "Arial": ["arialbd.ttf", "Arial Bold.ttf", "Arial-BoldMT.ttf"],
+    "DejaVu Sans": ["DejaVuSans-Bold.ttf"],
+}
+
+_measure_draw = ImageDraw.Draw(Image.new("RGBA", (1, 1)))
+
+
+@functools.lru_cache(maxsize=32)
+def load_font(font_name, size):
+    """Loads a bold face of font_name at a pixel size.
+
+    Fonts shipped in FONTS_DIR win over system fonts. If nothing matches, Pillow's
+    embedded default font is used, so text renders the same on every machine that
+    lacks the family.
+    """
+    size = max(1, int(size))
+    candidates = FONT_FILES.get(font_name, []) + [f"{font_name}.ttf", font_name]
+    for filename in candidates:
+        for path in (os.path.join(FONTS_DIR, filename), filename):
+            try:
+                return ImageFont.truetype(path, size)
+            except OSError:
+                continue
+    return ImageFont.load_default(size)
+
+
+def text_extent(text, font_name, size):
+    """(width, height) of the rendered text run, measured from its top-left anchor."""
+    return render_text(text, font_name, size, "black").size
+
+
+@functools.lru_cache(maxsize=512)
+def render_text(text, font_name, size, color):
+    """Rasterizes a run of text to an RGBA image whose top-left is the text anchor.
+
+    Results are cached by (text, font, size, color); the returned image is shared
+    and must not be modified by callers.
+    """
+    font = load_font(font_name, size)
+    left, top, right, bottom = _measure_draw.multiline_textbbox((0, 0), text, font=font)
+    image = Image.new("RGBA", (max(1, right - min(0, left)), max(1, bottom - min(0, top))), (0, 0, 0, 0))
+    ImageDraw.Draw(image).multiline_text((-min(0, left), -min(0, top)), text, font=font, fill=color)
+    return image
+
+
+def cache_info():
+    return {"fonts": load_font.cache_info(), "text_runs": render_text.cache_info()}
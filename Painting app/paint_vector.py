@@ -0,0 +1,237 @@
+import base64
+import io
+import math
+from xml.sax.saxutils import escape
+
+from PIL import Image, ImageColor, ImageDraw
+
+from paint_brush import coverage_to_image, stroke_coverage
+from paint_text import render_text, text_extent
+
+SHAPE_KINDS = ("line", "rectangle", "circle", "triangle", "star", "text", "stroke")
+
+
+def _svg_color(color):
+    return color if color else "none"
+
+
+def _svg_number(value):
+    return f"{value:.2f}".rstrip("0").rstrip(".")
+
+
+class VectorShape:
+    """One editable shape or text object in document coordinates (zoom 1.0).
+
+    Geometry and style are changed through set_geometry/set_style, which bump
+    the version and drop the cached rasterizations, so a raster is only ever
+    rebuilt after the object itself changed.
+    """
+
+    __slots__ = ("kind", "points", "outline", "fill", "width", "text", "font_name", "font_size",
+                 "cap", "item", "version", "_rasters")
+
+    def __init__(self, kind, points, outline="black", fill="", width=1, text="", font_name="Inter", font_size=14,
+                 cap="round"):
+        if kind not in SHAPE_KINDS:
+            raise ValueError(f"Unknown shape kind: {kind}")
+        self.kind = kind
+        self.points = [float(v) for v in points]
+        self.outline = outline
+        self.fill = fill or ""
+        self.width = width
+        self.text = text
+        self.font_name = font_name
+        self.font_size = font_size
+        self.cap = cap  # Tk capstyle: "round", "butt" or "projecting"; freehand strokes follow the brush type
+        self.item = None  # Canvas item currently showing this object
+        self.version = 0
+        self._rasters = {}  # scale -> (origin, RGBA image)
+
+    def _changed(self):
+        self.version += 1
+        self._rasters.clear()
+
+    def set_geometry(self, points):
+        self.points = [float(v) for v in points]
+        self._changed()
+
+    def set_style(self, outline=None, fill=None, width=None, text=None, font_size=None):
+        if outline is not None:
+            self.outline = outline
+        if fill is not None:
+            self.fill = fill
+        if width is not None:
+            self.width = width
+        if text is not None:
+            self.text = text
+        if font_size is not None:
+            self.font_size = font_size
+        self._changed()
+
+    def move(self, dx, dy):
+        self.set_geometry([v + (dx if i % 2 == 0 else dy) for i, v in enumerate(self.points)])
+
+    def copy(self):
+        clone = VectorShape(self.kind, self.points, self.outline, self.fill, self.width,
+                            self.text, self.font_name, self.font_size, self.cap)
+        clone._rasters = dict(self._rasters)  # Rasters are immutable once built, so they can be shared
+        return clone
+
+    def to_dict(self):
+        """The object's model as plain JSON-friendly values; from_dict() rebuilds it."""
+        return {"kind": self.kind, "points": self.points, "outline": self.outline, "fill": self.fill,
+                "width": self.width, "text": self.text, "font_name": self.font_name,
+                "font_size": self.font_size, "cap": self.cap}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+    def bbox(self):
+        """(x1, y1, x2, y2) including half the stroke width."""
+        if self.kind == "text":
+            x, y = self.points[:2]
+            width, height = text_extent(self.text, self.font_name, self.font_size)
+            return (x, y, x + width, y + height)
+        xs, ys = self.points[0::2], self.points[1::2]
+        pad = self.width / 2 * (math.sqrt(2) if self.cap == "projecting" else 1)  # Square caps reach out diagonally
+        return (min(xs) - pad, min(ys) - pad, max(xs) + pad, max(ys) + pad)
+
+    def rasterize(self, scale=1.0):
+        """Returns ((x, y), RGBA image) for this object at the given scale, cached until it changes."""
+        cached = self._rasters.get(scale)
+        if cached is not None:
+            return cached
+        x1, y1, x2, y2 = (v * scale for v in self.bbox())
+        origin = (math.floor(x1) - 1, math.floor(y1) - 1)
+        size = (max(1, math.ceil(x2) - origin[0] + 2), max(1, math.ceil(y2) - origin[1] + 2))
+        image = Image.new("RGBA", size, (0, 0, 0, 0))
+        draw = ImageDraw.Draw(image)
+        pts = [(self.points[i] * scale - origin[0], self.points[i + 1] * scale - origin[1])
+               for i in range(0, len(self.points) - 1, 2)]
+        width = max(1, round(self.width * scale))
+        outline = self.outline or None
+        fill = self.fill or None
+        if self.kind in ("line", "stroke"):
+            if outline:  # Anti-aliased, with round joins and the canvas capstyle at both ends
+                image = coverage_to_image(stroke_coverage(pts, max(1.0, self.width * scale), self.cap, (0, 0), size),
+                                          outline)
+        elif self.kind in ("rectangle", "circle"):
+            box = (min(pts[0][0], pts[1][0]), min(pts[0][1], pts[1][1]), max(pts[0][0], pts[1][0]), max(pts[0][1], pts[1][1]))
+            if outline:  # Pillow strokes inside the box; Tk and SVG center the stroke on it
+                half = width // 2
+                box = (box[0] - half, box[1] - half, box[2] + half, box[3] + half)
+            draw_shape = draw.rectangle if self.kind == "rectangle" else draw.ellipse
+            draw_shape(box, fill=fill, outline=outline, width=width)
+        elif self.kind in ("triangle", "star"):
+            draw.polygon(pts, fill=fill)
+            if outline:  # Centered on the edges with round joins, as Tk and SVG draw polygons
+                coverage = stroke_coverage(pts + pts[:1], max(1.0, self.width * scale), "round", (0, 0), size)
+                image.alpha_composite(coverage_to_image(coverage, outline))
+        elif self.kind == "text":
+            run = render_text(self.text, self.font_name, max(1, round(self.font_size * scale)), self.outline)
+            image.alpha_composite(run, (round(pts[0][0]), round(pts[0][1])))
+        result = (origin, image)
+        self._rasters[scale] = result
+        return result
+
+    def pixel_box(self, scale=1.0):
+        """(x1, y1, x2, y2) of the pixels rasterize() covers, for damage tracking."""
+        (x, y), image = self.rasterize(scale)
+        return (x, y, x + image.width, y + image.height)
+
+    def to_svg(self):
+        stroke = f'stroke="{_svg_color(self.outline)}" stroke-width="{_svg_number(self.width)}"'
+        fill = f'fill="{_svg_color(self.fill)}"'
+        p = [_svg_number(v) for v in self.points]
+        if self.kind == "line":
+            return f'<line x1="{p[0]}" y1="{p[1]}" x2="{p[2]}" y2="{p[3]}" {stroke} stroke-linecap="round"/>'
+        if self.kind == "rectangle":
+            x1, y1, x2, y2 = self.points[:4]
+            return (f'<rect x="{_svg_number(min(x1, x2))}" y="{_svg_number(min(y1, y2))}" '
+                    f'width="{_svg_number(abs(x2 - x1))}" height="{_svg_number(abs(y2 - y1))}" {fill} {stroke}/>')
+        if self.kind == "circle":
+            x1, y1, x2, y2 = self.points[:4]
+            return (f'<ellipse cx="{_svg_number((x1 + x2) / 2)}" cy="{_svg_number((y1 + y2) / 2)}" '
+                    f'rx="{_svg_number(abs(x2 - x1) / 2)}" ry="{_svg_number(abs(y2 - y1) / 2)}" {fill} {stroke}/>')
+        if self.kind == "stroke":
+            coords = " ".join(f"{p[i]},{p[i + 1]}" for i in range(0, len(p) - 1, 2))
+            return (f'<polyline points="{coords}" fill="none" {stroke} '
+                    f'stroke-linecap="{"square" if self.cap == "projecting" else self.cap}" stroke-linejoin="round"/>')
+        if self.kind in ("triangle", "star"):
+            coords = " ".join(f"{p[i]},{p[i + 1]}" for i in range(0, len(p) - 1, 2))
+            return f'<polygon points="{coords}" {fill} {stroke} stroke-linejoin="round"/>'
+        return (f'<text x="{p[0]}" y="{p[1]}" font-family="{escape(self.font_name)}" font-size="{self.font_size}" '
+                f'font-weight="bold" dominant-baseline="text-before-edge" fill="{_svg_color(self.outline)}">{escape(self.text)}</text>')
+
+
+class VectorLayer:
+    """Retained, ordered collection of VectorShape objects drawn above the raster."""
+
+    def __init__(self):
+        self.objects = []
+        self._by_item = {}
+
+    def __len__(self):
+        return len(self.objects)
+
+    def __iter__(self):
+        return iter(self.objects)
+
+    def add(self, obj):
+        self.objects.append(obj)
+        if obj.item is not None:
+            self._by_item[obj.item] = obj
+        return obj
+
+    def bind_item(self, obj, item):
+        if obj.item is not None:
+            self._by_item.pop(obj.item, None)
+        obj.item = item
+        if item is not None:
+            self._by_item[item] = obj
+
+    def remove(self, obj):
+        self.objects.remove(obj)
+        self._by_item.pop(obj.item, None)
+
+    def find_by_item(self, item):
+        return self._by_item.get(item)
+
+    def clear(self):
+        self.objects.clear()
+        self._by_item.clear()
+
+    def render(self, base, scale=1.0):
+        """Composites every object's cached raster over a copy of base (an RGB or RGBA image)."""
+        result = base.convert("RGBA")
+        self.composite_into(result, (0, 0) + result.size, scale)
+        return result.convert(base.mode)
+
+    def composite_into(self, image, box, scale=1.0, objects=None):
+        """Composites the objects overlapping box onto image, an RGBA image covering exactly box.
+
+        objects, if given, is the bottom-to-top subset to consider, e.g. from a spatial query.
+        """
+        left, top, right, bottom = box
+        for obj in self.objects if objects is None else objects:
+            (x, y), raster = obj.rasterize(scale)
+            if x >= right or y >= bottom or x + raster.width <= left or y + raster.height <= top:
+                continue
+            dx, dy = x - left, y - top
+            image.alpha_composite(raster, (max(0, dx), max(0, dy)), (max(0, -dx), max(0, -dy)))
+
+    def to_svg(self, width, height, background=None, base_image=None):
+        """Serializes the layer as an SVG document. base_image, if given, is embedded as a PNG underneath."""
+        parts = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" viewBox="0 0 {width} {height}">']
+        if background:
+            r, g, b = ImageColor.getrgb(background)[:3]
+            parts.append(f'<rect width="100%" height="100%" fill="#{r:02x}{g:02x}{b:02x}"/>')
+        if base_image is not None:
+            buffer = io.BytesIO()
+            base_image.save(buffer, format="PNG")
+            data = base64.b64encode(buffer.getvalue()).decode("ascii")
+            parts.append(f'<image width="{base_image.width}" height="{base_image.height}" href="data:image/png;base64,{data}"/>')
+        parts.extend(obj.to_svg() for obj in self.objects)
+        parts.append("</svg>")
+        return "\n".join(parts)
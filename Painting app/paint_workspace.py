@@ -0,0 +1,127 @@
+import json
+import mmap
+import os
+import struct
+
+from paint_history import HistoryStep, Patch
+from paint_spill import Packed
+
+WORKSPACE_FILE = "paint_workspace.bin"
+WORKSPACE_VERSION = 1
+MAGIC = b"PAINTWS1"
+TRAILER = struct.Struct("<Q8s")  # Header length, magic
+TILE_SIZE = 256
+
+
+class WorkspaceWriter:
+    """Streams compressed blobs into a workspace file and finishes it with a JSON header.
+
+    Layout: magic, blobs back to back, the header, then a trailer holding the
+    header's length. Blobs are written as they come, so saving never holds the
+    whole document and history in memory at once.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "wb")
+        self._file.write(MAGIC)
+        self.blobs = []  # [offset, length, codec, mode, width, height]
+
+    def add(self, packed):
+        """Writes a Packed tile and returns its blob index."""
+        offset = self._file.tell()
+        self._file.write(packed.data)
+        self.blobs.append([offset, len(packed.data), packed.codec, packed.mode, packed.size[0], packed.size[1]])
+        return len(self.blobs) - 1
+
+    def finish(self, header):
+        header = dict(header, version=WORKSPACE_VERSION, blobs=self.blobs)
+        data = json.dumps(header, separators=(",", ":")).encode("utf-8")
+        self._file.write(data)
+        self._file.write(TRAILER.pack(len(data), MAGIC))
+        self._file.close()
+
+    def abort(self):
+        self._file.close()
+        os.remove(self.path)
+
+
+class Workspace:
+    """A saved workspace, memory-mapped so tiles and history are read only when needed."""
+
+    def __init__(self, path):
+        self._file = open(path, "rb")
+        try:
+            self.map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            length, magic = TRAILER.unpack(self.map[-TRAILER.size:])
+            if magic != MAGIC or self.map[:len(MAGIC)] != MAGIC:
+                raise ValueError("Not a workspace file")
+            start = len(self.map) - TRAILER.size - length
+            self.header = json.loads(self.map[start:start + length].decode("utf-8"))
+            if self.header.get("version") != WORKSPACE_VERSION:
+                raise ValueError(f"Unsupported workspace version: {self.header.get('version')}")
+        except Exception:
+            self.close()
+            raise
+
+    def blob(self, index):
+        """(offset, length, codec, mode, size) of a blob, the form SpillStore.put_mapped takes."""
+        offset, length, codec, mode, width, height = self.header["blobs"][index]
+        return offset, length, codec, mode, (width, height)
+
+    def read_tile(self, index):
+        offset, length, codec, mode, size = self.blob(index)
+        return Packed(codec, mode, size, self.map[offset:offset + length]).unpack()
+
+    def tiles_by_distance(self, visible):
+        """The document tiles [(x, y, blob), ...] ordered so those overlapping visible come first."""
+        x1, y1, x2, y2 = visible
+        tile_size = self.header["tile_size"]
+
+        def distance(tile):
+            x, y = tile[0] + tile_size / 2, tile[1] + tile_size / 2
+            return max(x1 - x, x - x2, 0) + max(y1 - y, y - y2, 0)
+
+        return sorted(self.header["tiles"], key=distance)
+
+    def close(self):
+        if getattr(self, "map", None) is not None:
+            self.map.close()
+            self.map = None
+        self._file.close()
+
+
+def write_tiles(writer, image, codec, tile_size=TILE_SIZE):
+    """Writes the non-empty tiles of an RGBA image and returns [[x, y, blob], ...]."""
+    tiles = []
+    for y in range(0, image.height, tile_size):
+        for x in range(0, image.width, tile_size):
+            tile = image.crop((x, y, min(x + tile_size, image.width), min(y + tile_size, image.height)))
+            if tile.getbbox() is None:
+                continue  # Fully transparent; the restored document starts out that way
+            tiles.append([x, y, writer.add(Packed.pack(tile, codec))])
+    return tiles
+
+
+def write_history(writer, stack, store, codec):
+    """Writes a history stack's patches and returns its JSON description."""
+    steps = []
+    for step in stack:
+        patches = []
+        for patch in step.patches:
+            packed = store.packed(patch.key, codec) if patch.key is not None else Packed.pack(patch.image, codec)
+            patches.append([list(patch.box), writer.add(packed)])
+        steps.append({"size": list(step.size), "patches": patches})
+    return steps
+
+
+def read_history(workspace, steps, store):
+    """Rebuilds a history stack whose patches stay in the workspace mapping until they are used."""
+    stack = []
+    for entry in steps:
+        step = HistoryStep(tuple(entry["size"]), store)
+        for box, blob in entry["patches"]:
+            key = store.put_mapped(workspace.map, *workspace.blob(blob))
+            step.patches.append(Patch.stored(tuple(box), store, key))
+        stack.append(step)
+    return stack